@@ -16,12 +16,53 @@ class Settings(BaseSettings):
         "https://65906d3e-61df-4f08-a529-69b0151d25b5-00-2xvkklizfouhp.riker.replit.dev/",
     )
 
+    # Uploads are streamed to disk in chunks and rejected above this size
+    MAX_UPLOAD_BYTES: int = int(os.getenv("MAX_UPLOAD_BYTES", str(250 * 1024 * 1024)))
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+    # Device CSV rows sent to PostgreSQL per COPY call
+    DEVICE_COPY_BATCH_SIZE: int = int(os.getenv("DEVICE_COPY_BATCH_SIZE", "5000"))
+
+    # Seconds IDF writes are coalesced before the health rollup view is refreshed
+    HEALTH_ROLLUP_REFRESH_DELAY: float = float(os.getenv("HEALTH_ROLLUP_REFRESH_DELAY", "2"))
+
+    # Rendered public IDF responses: "memory" (per process), "redis" or "off"
+    RESPONSE_CACHE_BACKEND: str = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+    RESPONSE_CACHE_URL: str = os.getenv("RESPONSE_CACHE_URL", "redis://localhost:6379/0")
+    RESPONSE_CACHE_TTL_SECONDS: int = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2048"))
+
+    # LISTEN/NOTIFY evictions of in-process caches across workers
+    CACHE_EVENTS_ENABLED: bool = os.getenv("CACHE_EVENTS_ENABLED", "true").lower() in ("1", "true", "yes")
+    CACHE_EVENTS_RECONNECT_DELAY: float = float(os.getenv("CACHE_EVENTS_RECONNECT_DELAY", "5"))
+
+    # Render JSON responses with orjson (optional dependency) instead of the stdlib
+    ORJSON_RESPONSES: bool = os.getenv("ORJSON_RESPONSES", "false").lower() in ("1", "true", "yes")
+
+    # Worker processes for image derivatives and QR rendering
+    MEDIA_WORKERS: int = int(os.getenv("MEDIA_WORKERS", "2"))
+
+    # Rendered QR codes (memory LRU + up to QR_CACHE_MAX_FILES files under
+    # QR_CACHE_DIR, which must not be served as static files)
+    QR_CACHE_DIR: str = os.getenv("QR_CACHE_DIR", "var/qr-cache")
+    QR_CACHE_MAX_FILES: int = int(os.getenv("QR_CACHE_MAX_FILES", "4096"))
+    QR_CACHE_MAX_ENTRIES: int = int(os.getenv("QR_CACHE_MAX_ENTRIES", "512"))
+    QR_CACHE_TTL_SECONDS: int = int(os.getenv("QR_CACHE_TTL_SECONDS", "86400"))
+    QR_CACHE_MAX_AGE: int = int(os.getenv("QR_CACHE_MAX_AGE", "86400"))
+
     # JWT Configuration
     JWT_SECRET: str = os.getenv("JWT_SECRET", "change_me_in_production")
     JWT_ALGORITHM: str = os.getenv("JWT_ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(
         os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "120"))
 
+    # Authenticated-user cache used by get_current_user
+    USER_CACHE_TTL_SECONDS: int = int(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+    USER_CACHE_MAX_SIZE: int = int(os.getenv("USER_CACHE_MAX_SIZE", "1024"))
+
+    # Worker threads for bcrypt hashing/verification
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+
     # Default user credentials
     DEFAULT_USER_EMAIL: str = os.getenv(
         "DEFAULT_USER_EMAIL",
@@ -0,0 +1,136 @@
+"""Streaming CSV and XLSX writers for tabular exports.
+
+Both writers consume an async iterator of rows and yield encoded chunks, so
+an export never holds more than one buffer of rows in memory regardless of
+how many rows the query returns.
+"""
+from __future__ import annotations
+
+import csv
+import io
+import re
+from typing import Any, AsyncIterable, AsyncIterator, Sequence
+from xml.sax.saxutils import escape
+
+from app.core.zipstream import stream_zip
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Rows buffered before a chunk is handed to the response
+ROWS_PER_CHUNK = 500
+
+# Characters XML 1.0 does not allow even when escaped
+_INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+# ---------------------------------------------------------------------------
+# CSV
+# ---------------------------------------------------------------------------
+
+async def stream_csv(
+    header: Sequence[str], rows: AsyncIterable[Sequence[Any]]
+) -> AsyncIterator[bytes]:
+    """Yield a UTF-8 CSV (with BOM, so Excel detects the encoding)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    yield b"\xef\xbb\xbf" + buffer.getvalue().encode("utf-8")
+    buffer.seek(0)
+    buffer.truncate()
+
+    pending = 0
+    async for row in rows:
+        writer.writerow(["" if value is None else value for value in row])
+        pending += 1
+        if pending >= ROWS_PER_CHUNK:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue().encode("utf-8")
+
+
+# ---------------------------------------------------------------------------
+# XLSX
+# ---------------------------------------------------------------------------
+
+_CONTENT_TYPES = b"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+</Types>"""
+
+_ROOT_RELS = b"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+
+_WORKBOOK_RELS = b"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+</Relationships>"""
+
+_WORKBOOK = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>
+</workbook>"""
+
+_SHEET_START = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_END = b"</sheetData></worksheet>"
+
+
+def _xlsx_cell(value: Any) -> str:
+    if value is None or value == "":
+        return "<c/>"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"<c><v>{value}</v></c>"
+    text = _INVALID_XML_CHARS.sub("", str(value))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(text)}</t></is></c>'
+
+
+def _xlsx_row(values: Sequence[Any]) -> str:
+    return "<row>" + "".join(_xlsx_cell(value) for value in values) + "</row>"
+
+
+async def _sheet_xml(
+    header: Sequence[str], rows: AsyncIterable[Sequence[Any]]
+) -> AsyncIterator[bytes]:
+    yield _SHEET_START + _xlsx_row(header).encode("utf-8")
+    parts = []
+    async for row in rows:
+        parts.append(_xlsx_row(row))
+        if len(parts) >= ROWS_PER_CHUNK:
+            yield "".join(parts).encode("utf-8")
+            parts.clear()
+    yield "".join(parts).encode("utf-8") + _SHEET_END
+
+
+async def stream_xlsx(
+    header: Sequence[str],
+    rows: AsyncIterable[Sequence[Any]],
+    sheet_name: str = "Export",
+) -> AsyncIterator[bytes]:
+    """Yield a single-sheet workbook using inline strings (no shared-string table)."""
+    workbook = _WORKBOOK.format(name=escape(sheet_name[:31], {'"': "&quot;"}))
+
+    async def entries():
+        yield "[Content_Types].xml", _CONTENT_TYPES
+        yield "_rels/.rels", _ROOT_RELS
+        yield "xl/workbook.xml", workbook.encode("utf-8")
+        yield "xl/_rels/workbook.xml.rels", _WORKBOOK_RELS
+        yield "xl/worksheets/sheet1.xml", _sheet_xml(header, rows)
+
+    async for chunk in stream_zip(entries()):
+        yield chunk
+
+
+__all__ = ["EXPORT_MEDIA_TYPES", "stream_csv", "stream_xlsx"]
@@ -0,0 +1,68 @@
+"""Sparse fieldsets: the ``fields=`` query parameter of the IDF endpoints.
+
+``fields=title,logo`` asks for a subset of the response keys. Handlers map the
+requested keys to the columns they need, so unrequested media, tables and
+health are neither read nor processed. Omitting ``fields`` returns the full
+representation.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, FrozenSet, Iterable, Mapping, Optional, Sequence
+
+from fastapi import HTTPException
+
+
+def parse_fields(
+    value: Optional[str], allowed: Sequence[str], always: Iterable[str] = ()
+) -> Optional[FrozenSet[str]]:
+    """Requested keys plus ``always``, or None when ``value`` is empty.
+
+    Raises a 400 error naming any key the endpoint does not return.
+    """
+    if value is None:
+        return None
+    requested = {name.strip() for name in value.split(",") if name.strip()}
+    if not requested:
+        return None
+
+    unknown = requested.difference(allowed)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return frozenset(requested.union(always))
+
+
+def wants(fields: Optional[FrozenSet[str]], name: str) -> bool:
+    return fields is None or name in fields
+
+
+def fields_key(fields: Optional[FrozenSet[str]]) -> str:
+    """Stable cache-key fragment for a fieldset."""
+    return "*" if fields is None else ",".join(sorted(fields))
+
+
+def projection(
+    fields: Optional[FrozenSet[str]],
+    columns: Mapping[str, Sequence[str]],
+    base: Sequence[str] = (),
+) -> str:
+    """SELECT list for ``fields``: ``base`` plus the columns of each key, deduplicated."""
+    selected: Dict[str, None] = dict.fromkeys(base)
+    for name, needed in columns.items():
+        if wants(fields, name):
+            selected.update(dict.fromkeys(needed))
+    return ", ".join(selected)
+
+
+def select_fields(payload: Dict[str, Any], fields: Optional[FrozenSet[str]]) -> Dict[str, Any]:
+    if fields is None:
+        return payload
+    return {key: value for key, value in payload.items() if key in fields}
+
+
+__all__ = [
+    "fields_key",
+    "parse_fields",
+    "projection",
+    "select_fields",
+    "wants",
+]
@@ -0,0 +1,104 @@
+"""Health computation for IDF patch tables.
+
+Health is derived from the ``status`` column of the patch table rows and is
+materialized into the ``health_*`` columns of ``idfs`` whenever the table is
+written, so listings only need to read a handful of integers.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Mapping, Optional
+
+STATUS_KEYS = ("ok", "revision", "falla", "libre", "reservado")
+
+HEALTH_COLUMNS = (
+    "health_level",
+    "health_ok",
+    "health_revision",
+    "health_falla",
+    "health_libre",
+    "health_reservado",
+)
+
+
+def _empty_counts() -> Dict[str, int]:
+    return {key: 0 for key in STATUS_KEYS}
+
+
+def level_from_counts(counts: Mapping[str, int]) -> str:
+    """Derive the traffic-light level from status counts."""
+    if counts["falla"] > 0:
+        return "red"
+    if counts["revision"] > 0:
+        return "yellow"
+    if counts["ok"] > 0:
+        return "green"
+    return "gray"
+
+
+def compute_health(table_data: Optional[Dict[str, Any]]):
+    """Compute health status based on table data status values"""
+    if not table_data or not isinstance(table_data, dict):
+        return {"level": "gray", "counts": _empty_counts()}
+
+    rows = table_data.get("rows", [])
+    counts = _empty_counts()
+    for row in rows:
+        status = (row.get("status") or "").lower()
+        if status in counts:
+            counts[status] += 1
+
+    return health_from_counts(counts, len(rows))
+
+
+def health_from_counts(counts: Mapping[str, int], total: int) -> Dict[str, Any]:
+    """Health of a table with ``total`` rows and the given per-status counts."""
+    if not total:
+        return {
+            "level": "green",
+            "counts": {"ok": 1, "revision": 0, "falla": 0, "libre": 0, "reservado": 0}
+        }
+
+    counts = {key: int(counts[key] or 0) for key in STATUS_KEYS}
+    return {"level": level_from_counts(counts), "counts": counts}
+
+
+def health_to_columns(health: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Flatten a health dict into ``idfs.health_*`` column values."""
+    if health is None:
+        return {column: None for column in HEALTH_COLUMNS}
+
+    counts = health["counts"]
+    return {
+        "health_level": health["level"],
+        **{f"health_{key}": counts[key] for key in STATUS_KEYS},
+    }
+
+
+def health_columns_for_table(table_data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Column values to store for a table; ``None`` table means no health."""
+    if not table_data or not isinstance(table_data, dict):
+        return health_to_columns(None)
+    return health_to_columns(compute_health(table_data))
+
+
+def health_from_columns(row: Mapping[str, Any]) -> Optional[Dict[str, Any]]:
+    """Rebuild the health dict from materialized columns, if present."""
+    level = row.get("health_level")
+    if level is None:
+        return None
+    return {
+        "level": level,
+        "counts": {key: row.get(f"health_{key}") or 0 for key in STATUS_KEYS},
+    }
+
+
+__all__ = [
+    "HEALTH_COLUMNS",
+    "STATUS_KEYS",
+    "compute_health",
+    "health_columns_for_table",
+    "health_from_columns",
+    "health_from_counts",
+    "health_to_columns",
+    "level_from_counts",
+]
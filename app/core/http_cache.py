@@ -0,0 +1,66 @@
+"""Helpers for HTTP validators (ETag) and conditional requests."""
+from __future__ import annotations
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag derived from the values that determine a representation."""
+    digest = hashlib.sha256("|".join(str(part) for part in parts).encode("utf-8"))
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True when ``If-None-Match`` lists ``etag`` (weak comparison, per RFC 9110)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates
+
+
+def http_date(value: datetime) -> str:
+    """Format a timestamp for ``Last-Modified``."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def is_not_modified(
+    request: Request, etag: str, last_modified: Optional[datetime] = None
+) -> bool:
+    """Evaluate the request preconditions for a GET.
+
+    ``If-None-Match`` wins when present; otherwise ``If-Modified-Since`` is
+    compared at the one-second resolution of HTTP dates.
+    """
+    if request.headers.get("if-none-match"):
+        return etag_matches(request, etag)
+
+    since_header = request.headers.get("if-modified-since")
+    if not since_header or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(since_header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) <= since
+
+
+def not_modified(headers: Dict[str, str]) -> Response:
+    """Empty 304 carrying the validators and caching headers."""
+    return Response(status_code=304, headers=headers)
+
+
+__all__ = ["etag_matches", "http_date", "is_not_modified", "make_etag", "not_modified"]
@@ -0,0 +1,111 @@
+"""Responsive WebP derivatives for uploaded images.
+
+Derivatives are written next to the stored blob as
+``<blob name>.<variant>.webp`` (e.g. ``<sha>.jpg.thumb.webp``, so blobs that
+only differ by extension never share derivatives) and recorded on the media item under
+``variants`` so the detail endpoint can build a ``srcset``.
+"""
+from __future__ import annotations
+
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from app.core.config import settings
+from app.core.workers import run_in_process
+
+# Variant name -> maximum width in pixels
+VARIANT_WIDTHS: Dict[str, int] = {"thumb": 320, "medium": 1024}
+
+_RASTER_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tif", ".tiff", ".webp"}
+
+
+def variant_relative_path(relative_path: str, variant: str) -> str:
+    path = Path(relative_path)
+    return str(path.with_name(f"{path.name}.{variant}.webp"))
+
+
+def derivative_paths(relative_path: str) -> List[str]:
+    """Every derivative path that may exist for a stored blob."""
+    return [variant_relative_path(relative_path, variant) for variant in VARIANT_WIDTHS]
+
+
+def _render_variants(source: str, targets: Dict[str, str]) -> Dict[str, str]:
+    """Write each WebP variant; runs inside the worker process."""
+    written: Dict[str, str] = {}
+    try:
+        with Image.open(source) as original:
+            image = ImageOps.exif_transpose(original)
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+            for variant, destination in targets.items():
+                width = VARIANT_WIDTHS[variant]
+                resized = image.copy()
+                # Bound only the width; thumbnail() never upscales
+                resized.thumbnail((width, width * 10), Image.Resampling.LANCZOS)
+                # Unique temp file per render: the same blob may be rendered concurrently
+                handle, temp_path = tempfile.mkstemp(
+                    dir=os.path.dirname(destination), prefix=".variant-", suffix=".tmp"
+                )
+                os.close(handle)
+                try:
+                    resized.save(temp_path, format="WEBP", quality=80, method=4)
+                    os.replace(temp_path, destination)
+                except BaseException:
+                    Path(temp_path).unlink(missing_ok=True)
+                    raise
+                written[variant] = destination
+    except (UnidentifiedImageError, OSError):
+        return written
+    return written
+
+
+async def generate_variants(relative_path: str) -> Dict[str, str]:
+    """Create missing derivatives for a stored image.
+
+    Returns ``{variant: "/static/..."}``; empty for non-raster files (PDFs,
+    SVGs) or images Pillow cannot decode.
+    """
+    if Path(relative_path).suffix.lower() not in _RASTER_EXTENSIONS:
+        return {}
+
+    static_root = Path(settings.STATIC_DIR)
+    variants: Dict[str, str] = {}
+    targets: Dict[str, str] = {}
+    for variant in VARIANT_WIDTHS:
+        variant_path = variant_relative_path(relative_path, variant)
+        variants[variant] = f"/static/{variant_path}"
+        # Content-addressed blobs share derivatives, so only render what is missing
+        if not (static_root / variant_path).exists():
+            targets[variant] = str(static_root / variant_path)
+
+    if targets:
+        written = await run_in_process(_render_variants, str(static_root / relative_path), targets)
+        if set(written) != set(targets):
+            return {}
+    return variants
+
+
+def build_srcset(variants: Optional[Dict[str, str]]) -> Optional[str]:
+    """``srcset`` attribute value for the recorded variants."""
+    if not variants:
+        return None
+    entries = [
+        f"{variants[name]} {width}w"
+        for name, width in VARIANT_WIDTHS.items()
+        if variants.get(name)
+    ]
+    return ", ".join(entries) or None
+
+
+__all__ = [
+    "VARIANT_WIDTHS",
+    "build_srcset",
+    "derivative_paths",
+    "generate_variants",
+    "variant_relative_path",
+]
@@ -0,0 +1,191 @@
+"""Canonical form of the IDF media columns.
+
+``images``, ``documents``, ``diagrams`` and ``dfo`` are JSONB arrays of media
+items and ``location`` is a single item (or NULL)::
+
+    {"url": "/static/<path>", "name": "...", "kind": "image|document|diagram",
+     "title": "...", "variants": {...}, "srcset": "..."}
+
+``title`` is only present on documents; ``variants``/``srcset`` only on images
+with derivatives. ``logo`` stays a plain path relative to ``STATIC_DIR``.
+
+Every write goes through :func:`media_bind_values` (or the per-field
+helpers), so rows stamped with ``media_version = MEDIA_VERSION`` are served
+as stored. Older rows may still hold any legacy encoding: TEXT[] of bare
+paths, JSON strings, stringified Python dicts or absolute ``replit.dev``
+URLs; :func:`canonical_media` normalizes those on read until they have been
+migrated.
+"""
+from __future__ import annotations
+
+import ast
+import json
+from pathlib import PurePosixPath
+from typing import Any, Dict, List, Mapping, Optional
+
+from app.core.imaging import build_srcset
+
+# Bump when the canonical item shape changes; rows below it are re-normalized
+MEDIA_VERSION = 1
+
+MEDIA_LIST_FIELDS = ("images", "documents", "diagrams", "dfo")
+
+# Every column normalized here, in the order they are stored
+MEDIA_COLUMNS = (*MEDIA_LIST_FIELDS, "location", "logo")
+
+DEFAULT_KINDS = {
+    "images": "image",
+    "documents": "document",
+    "diagrams": "diagram",
+    "dfo": "diagram",
+    "location": "image",
+}
+
+_ITEM_KEYS = ("url", "name", "kind", "title", "variants")
+
+STATIC_PREFIX = "/static/"
+
+
+def static_url(value: str) -> Optional[str]:
+    """Repair a stored reference into a ``/static/...`` URL.
+
+    Absolute URLs that point into ``/static/`` (e.g. an old preview host) are
+    made relative; other absolute URLs are kept as external links.
+    """
+    value = value.strip()
+    if not value:
+        return None
+    if value.startswith(("http://", "https://")):
+        marker = value.find(STATIC_PREFIX)
+        return value[marker:] if marker >= 0 else value
+    if value.startswith(STATIC_PREFIX):
+        return value
+    return STATIC_PREFIX + value.lstrip("/").removeprefix("static/")
+
+
+def _decode(value: Any) -> Any:
+    """Undo JSON strings and stringified dicts, possibly nested."""
+    for _ in range(3):
+        if not isinstance(value, str):
+            return value
+        text = value.strip()
+        if not text or text[0] not in "[{\"":
+            return text
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError:
+            try:
+                value = ast.literal_eval(text)  # "{'url': ...}" written by str(dict)
+            except (ValueError, SyntaxError):
+                return text
+    return value
+
+
+def normalize_item(item: Any, kind: str) -> Optional[Dict[str, Any]]:
+    """Canonical media item, or None when nothing usable is left."""
+    item = _decode(item)
+    if hasattr(item, "model_dump"):
+        item = item.model_dump(exclude_none=True)
+    if isinstance(item, str):
+        item = {"url": item}
+    if not isinstance(item, Mapping):
+        return None
+
+    url = item.get("url")
+    if isinstance(url, str) and "{" in url:
+        # A whole item serialized into the URL, e.g. "https://host/static/{'url': ...}"
+        url = _decode(url[url.index("{"):])
+    if isinstance(url, Mapping):
+        return normalize_item(url, kind)
+    url = static_url(url) if isinstance(url, str) else None
+    if url is None:
+        return None
+
+    result: Dict[str, Any] = {key: item[key] for key in _ITEM_KEYS if item.get(key) is not None}
+    result["url"] = url
+    result.setdefault("name", PurePosixPath(url).name)
+    result.setdefault("kind", kind)
+    if kind == "document":
+        result.setdefault("title", "")
+    srcset = build_srcset(result.get("variants"))
+    if srcset:
+        result["srcset"] = srcset
+    return result
+
+
+def normalize_media_list(value: Any, field: str) -> List[Dict[str, Any]]:
+    """Canonical list for one of :data:`MEDIA_LIST_FIELDS` (or ``location``)."""
+    value = _decode(value)
+    if value is None or value == "":
+        return []
+    items = value if isinstance(value, (list, tuple)) else [value]
+    kind = DEFAULT_KINDS[field]
+    return [item for item in (normalize_item(entry, kind) for entry in items) if item]
+
+
+def normalize_location(value: Any) -> Optional[Dict[str, Any]]:
+    items = normalize_media_list(value, "location")
+    return items[0] if items else None
+
+
+def normalize_logo(value: Any) -> Optional[str]:
+    """Logo path relative to ``STATIC_DIR``."""
+    items = normalize_media_list(value, "images")
+    if not items:
+        return None
+    return items[0]["url"].removeprefix(STATIC_PREFIX)
+
+
+def normalize_media_fields(row: Mapping[str, Any]) -> Dict[str, Any]:
+    """Canonical values of every media column present in ``row``."""
+    result: Dict[str, Any] = {}
+    for field in MEDIA_LIST_FIELDS:
+        if field in row:
+            result[field] = normalize_media_list(row[field], field)
+    if "location" in row:
+        result["location"] = normalize_location(row["location"])
+    if "logo" in row:
+        result["logo"] = normalize_logo(row["logo"])
+    return result
+
+
+def media_json(value: Any, field: str) -> Optional[str]:
+    """Bind value for one media column."""
+    if field == "logo":
+        return normalize_logo(value)
+    if field == "location":
+        location = normalize_location(value)
+        return json.dumps(location) if location else None
+    return json.dumps(normalize_media_list(value, field))
+
+
+def media_bind_values(row: Mapping[str, Any]) -> Dict[str, Any]:
+    """Bind values for every media column present in ``row``."""
+    return {field: media_json(row[field], field) for field in MEDIA_COLUMNS if field in row}
+
+
+def canonical_media(row: Mapping[str, Any]) -> Dict[str, Any]:
+    """Media columns of an ``idfs`` row, normalizing only rows not yet migrated."""
+    if (row.get("media_version") or 0) < MEDIA_VERSION:
+        return normalize_media_fields(row)
+    media = {field: row[field] for field in MEDIA_COLUMNS if field in row}
+    for field in MEDIA_LIST_FIELDS:
+        if field in media and media[field] is None:
+            media[field] = []
+    return media
+
+
+__all__ = [
+    "MEDIA_COLUMNS",
+    "MEDIA_LIST_FIELDS",
+    "MEDIA_VERSION",
+    "canonical_media",
+    "media_bind_values",
+    "media_json",
+    "normalize_item",
+    "normalize_location",
+    "normalize_logo",
+    "normalize_media_fields",
+    "normalize_media_list",
+    "static_url",
+]
@@ -0,0 +1,42 @@
+"""Opaque keyset-pagination cursors shared by listing endpoints."""
+from __future__ import annotations
+
+import base64
+import json
+from typing import Any, List, Sequence
+
+from fastapi import HTTPException
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode the sort key of the last returned row as an opaque token."""
+    raw = json.dumps(list(values), separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Decode a cursor produced by :func:`encode_cursor`.
+
+    Raises a 400 error when the token is malformed or does not carry ``size``
+    key values, so clients never silently restart from the first page.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+__all__ = [
+    "NEXT_CURSOR_HEADER",
+    "TOTAL_COUNT_HEADER",
+    "decode_cursor",
+    "encode_cursor",
+]
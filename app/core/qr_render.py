@@ -0,0 +1,85 @@
+"""QR code rendering, kept free of app state so it can run in worker processes."""
+from __future__ import annotations
+
+import io
+from typing import List, Sequence, Tuple
+
+import qrcode
+import qrcode.image.svg
+from PIL import Image, ImageDraw, ImageFont
+
+QR_MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+# Label sheets are laid out on A4 at 150 DPI
+SHEET_SIZE = (1240, 1754)
+SHEET_MARGIN = 60
+CAPTION_HEIGHT = 48
+
+
+def render_qr(url: str, fmt: str, box_size: int = 10, border: int = 4) -> bytes:
+    """Render ``url`` as a PNG or SVG QR code."""
+    qr = qrcode.QRCode(version=1, box_size=box_size, border=border)
+    qr.add_data(url)
+    qr.make(fit=True)
+
+    if fmt == "svg":
+        return qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).to_string()
+
+    img = qr.make_image(fill_color="black", back_color="white")
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def render_label_page(
+    labels: Sequence[Tuple[str, str]],
+    columns: int,
+    rows: int,
+) -> bytes:
+    """Render one sheet of ``(url, caption)`` labels as a PNG page."""
+    page = Image.new("RGB", SHEET_SIZE, "white")
+    draw = ImageDraw.Draw(page)
+    font = ImageFont.load_default(size=28)
+
+    cell_width = (SHEET_SIZE[0] - 2 * SHEET_MARGIN) // columns
+    cell_height = (SHEET_SIZE[1] - 2 * SHEET_MARGIN) // rows
+    qr_side = max(1, min(cell_width, cell_height - CAPTION_HEIGHT) - 16)
+
+    for index, (url, caption) in enumerate(labels[: columns * rows]):
+        left = SHEET_MARGIN + (index % columns) * cell_width
+        top = SHEET_MARGIN + (index // columns) * cell_height
+
+        qr = qrcode.QRCode(version=1, box_size=10, border=2)
+        qr.add_data(url)
+        qr.make(fit=True)
+        code_image = qr.make_image(fill_color="black", back_color="white").get_image()
+        code_image = code_image.convert("RGB").resize((qr_side, qr_side), Image.Resampling.NEAREST)
+        page.paste(code_image, (left + (cell_width - qr_side) // 2, top))
+
+        text_width = draw.textlength(caption, font=font)
+        draw.text(
+            (left + (cell_width - text_width) / 2, top + qr_side + 8),
+            caption,
+            fill="black",
+            font=font,
+        )
+
+    buf = io.BytesIO()
+    page.save(buf, format="PNG", dpi=(150, 150))
+    return buf.getvalue()
+
+
+def assemble_pdf(pages: List[bytes]) -> bytes:
+    """Combine PNG pages produced by :func:`render_label_page` into one PDF."""
+    images = [Image.open(io.BytesIO(page)).convert("RGB") for page in pages]
+    buf = io.BytesIO()
+    images[0].save(buf, format="PDF", save_all=True, append_images=images[1:], resolution=150.0)
+    return buf.getvalue()
+
+
+__all__ = [
+    "QR_MEDIA_TYPES",
+    "assemble_pdf",
+    "render_label_page",
+    "render_qr",
+]
@@ -0,0 +1,212 @@
+"""Shared cache for rendered public IDF responses.
+
+Entries are namespaced by ``cluster/project`` and a generation number. Every
+mutating handler calls :func:`invalidate_responses`, which bumps the
+generation of its project: entries written under an older generation are
+never read again and age out through the TTL/LRU limits. A miss returns the
+slot (key plus the generation read at lookup) the rendered response must be
+stored under, so a response rendered while a write was in flight lands in
+the old generation and can never mask the write.
+
+``RESPONSE_CACHE_BACKEND`` selects the store:
+
+* ``memory`` (default): a per-process :class:`~app.core.cache.TTLCache`;
+  invalidations reach the other workers as ``"idfs"`` cache events
+  (see :mod:`app.db.cache_events`).
+* ``redis``: a Redis-compatible server at ``RESPONSE_CACHE_URL`` shared by all
+  workers; needs the optional ``redis`` package.
+* ``off``: every lookup misses.
+"""
+from __future__ import annotations
+
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.db.cache_events import on_cache_event, publish_cache_event
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedResponse:
+    """A rendered JSON body plus the headers it was sent with."""
+
+    body: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    last_modified: Optional[str] = None  # ISO timestamp behind Last-Modified
+
+    def dumps(self) -> str:
+        return json.dumps(
+            {"body": self.body, "headers": self.headers, "last_modified": self.last_modified}
+        )
+
+    @classmethod
+    def loads(cls, raw: str | bytes) -> "CachedResponse":
+        return cls(**json.loads(raw))
+
+
+class MemoryBackend:
+    shared = False
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.generations: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[str]:
+        return self.entries.get(key)
+
+    async def set(self, key: str, value: str) -> None:
+        self.entries.set(key, value)
+
+    async def generation(self, scope: str) -> int:
+        return self.generations.get(scope, 0)
+
+    async def bump(self, scope: str) -> None:
+        self.generations[scope] = self.generations.get(scope, 0) + 1
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", **self.entries.stats()}
+
+
+class RedisBackend:
+    shared = True
+
+    def __init__(self, url: str, ttl: float) -> None:
+        import redis.asyncio as redis  # optional dependency
+
+        self.client = redis.from_url(url)
+        self.ttl = max(1, int(ttl))
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self.client.get(f"response:{key}")
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        await self.client.set(f"response:{key}", value, ex=self.ttl)
+
+    async def generation(self, scope: str) -> int:
+        return int(await self.client.get(f"generation:{scope}") or 0)
+
+    async def bump(self, scope: str) -> None:
+        await self.client.incr(f"generation:{scope}")
+
+    def clear(self) -> None:
+        pass  # shared by every worker, nothing is held locally
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "redis", "ttl_seconds": self.ttl, "hits": self.hits, "misses": self.misses}
+
+
+class ResponseCache:
+    def __init__(self, backend: Optional[Any]) -> None:
+        self.backend = backend
+
+    @staticmethod
+    def scope(cluster: str, project: str) -> str:
+        return f"{cluster}/{project}"
+
+    async def _key(self, cluster: str, project: str, key: str) -> str:
+        scope = self.scope(cluster, project)
+        return f"{scope}:{await self.backend.generation(scope)}:{key}"
+
+    async def get(
+        self, cluster: str, project: str, key: str
+    ) -> Tuple[Optional[CachedResponse], Optional[str]]:
+        """Cached entry and the slot a miss must be stored under.
+
+        The slot pins the generation read here, before the handler queries the
+        database: an invalidation that lands while the response is rendered
+        moves readers to a new generation, so the body stored afterwards is
+        never served. The slot is None when nothing should be stored.
+        """
+        if self.backend is None:
+            return None, None
+        try:
+            slot = await self._key(cluster, project, key)
+            raw = await self.backend.get(slot)
+        except Exception:  # a cache outage must not fail the request
+            logger.warning("Response cache read failed", exc_info=True)
+            return None, None
+        return (CachedResponse.loads(raw) if raw is not None else None), slot
+
+    async def set(self, slot: Optional[str], entry: CachedResponse) -> None:
+        """Store a response under the slot returned by :meth:`get`."""
+        if self.backend is None or slot is None:
+            return
+        try:
+            await self.backend.set(slot, entry.dumps())
+        except Exception:
+            logger.warning("Response cache write failed", exc_info=True)
+
+    async def invalidate(self, cluster: str, project: str) -> None:
+        if self.backend is None:
+            return
+        try:
+            await self.backend.bump(self.scope(cluster, project))
+        except Exception:
+            logger.warning("Response cache invalidation failed", exc_info=True)
+
+    def clear(self) -> None:
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        if self.backend is None:
+            return {"backend": "off"}
+        return self.backend.stats()
+
+
+def _build_backend() -> Optional[Any]:
+    backend = settings.RESPONSE_CACHE_BACKEND.lower()
+    ttl = settings.RESPONSE_CACHE_TTL_SECONDS
+    if backend == "off":
+        return None
+    if backend == "redis":
+        try:
+            return RedisBackend(settings.RESPONSE_CACHE_URL, ttl)
+        except ImportError:
+            logger.warning("redis is not installed; falling back to the in-process response cache")
+    return MemoryBackend(settings.RESPONSE_CACHE_MAX_ENTRIES, ttl)
+
+
+response_cache = ResponseCache(_build_backend())
+
+
+async def invalidate_responses(cluster: str, project: str) -> None:
+    """Drop every cached response of a project (``project`` as stored in the DB)."""
+    await response_cache.invalidate(cluster, project)
+    if response_cache.backend is not None and not response_cache.backend.shared:
+        await publish_cache_event("idfs", [cluster, project])
+
+
+async def _on_idfs_event(key: Optional[Any]) -> None:
+    if key is None:
+        response_cache.clear()
+    else:
+        await response_cache.invalidate(*key)
+
+
+on_cache_event("idfs", _on_idfs_event)
+
+
+__all__ = [
+    "CachedResponse",
+    "MemoryBackend",
+    "RedisBackend",
+    "ResponseCache",
+    "invalidate_responses",
+    "response_cache",
+]
@@ -1,10 +1,20 @@
 
+import asyncio
 import bcrypt
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Callable, Optional
 import jwt
 from app.core.config import settings
 
+# bcrypt releases the GIL while hashing, so a small thread pool keeps login
+# bursts off the event loop; the pool size caps concurrent hashes per worker.
+_password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="bcrypt",
+)
+_password_jobs = {"in_flight": 0, "completed": 0}
+
 
 def hash_password(password: str) -> str:
     """Hash a password using bcrypt"""
@@ -16,6 +26,38 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
 
+async def _run_password_job(func: Callable[..., Any], *args: Any) -> Any:
+    loop = asyncio.get_running_loop()
+    _password_jobs["in_flight"] += 1
+    try:
+        return await loop.run_in_executor(_password_executor, func, *args)
+    finally:
+        _password_jobs["in_flight"] -= 1
+        _password_jobs["completed"] += 1
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password on the bcrypt worker pool"""
+    return await _run_password_job(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the bcrypt worker pool"""
+    return await _run_password_job(verify_password, plain_password, hashed_password)
+
+
+def password_pool_stats() -> dict:
+    """Report bcrypt pool usage; queue_depth counts jobs waiting for a thread"""
+    workers = settings.PASSWORD_HASH_WORKERS
+    in_flight = _password_jobs["in_flight"]
+    return {
+        "max_workers": workers,
+        "in_flight": in_flight,
+        "queue_depth": max(0, in_flight - workers),
+        "completed": _password_jobs["completed"],
+    }
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
     to_encode = data.copy()
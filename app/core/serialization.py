@@ -0,0 +1,166 @@
+"""JSON rendering for API responses.
+
+FastAPI validates a handler's return value into its Pydantic model, runs
+``jsonable_encoder`` over the result and renders it with the stdlib ``json``.
+For an IDF with a few thousand patch-table rows most of the request goes into
+those passes, although every value was already validated when it was written.
+Hot handlers therefore build the response dicts below straight from the rows
+(same keys as :class:`~app.models.idf_models.IdfPublic` /
+:class:`~app.models.idf_models.IdfIndex`) and render them with :func:`dumps`.
+
+``ORJSON_RESPONSES`` opts into ``orjson`` (an optional dependency) for
+:func:`dumps` and for the app's default response class; without it the
+stdlib encoder produces the same bytes as ``JSONResponse``.
+"""
+from __future__ import annotations
+
+import json
+import logging
+from datetime import date, datetime, time
+from decimal import Decimal
+from pathlib import PurePath
+from typing import Any, Dict, Mapping, Optional, Type
+from uuid import UUID
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.models.idf_models import MediaItem, TableColumn
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+MEDIA_ITEM_FIELDS = tuple(MediaItem.model_fields)
+TABLE_COLUMN_FIELDS = tuple(TableColumn.model_fields)
+
+
+def use_orjson() -> bool:
+    return settings.ORJSON_RESPONSES and orjson is not None
+
+
+def _default(value: Any) -> Any:
+    # Only what jsonable_encoder would have converted for us
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (UUID, PurePath)):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Render ``content`` as a compact UTF-8 JSON body."""
+    if use_orjson():
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content,
+        default=_default,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """``JSONResponse`` rendered through :func:`dumps`."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def json_response_class() -> Type[JSONResponse]:
+    """Default response class of the app."""
+    if not settings.ORJSON_RESPONSES:
+        return JSONResponse
+    if orjson is None:
+        logger.warning("orjson is not installed; responses are rendered with the stdlib json")
+        return JSONResponse
+    return FastJSONResponse
+
+
+# ---------------------------------------------------------------------------
+# Response payloads
+# ---------------------------------------------------------------------------
+
+def media_item_payload(item: Any) -> Any:
+    if isinstance(item, Mapping):
+        return {key: item.get(key) for key in MEDIA_ITEM_FIELDS}
+    return item
+
+
+def table_payload(table: Optional[Mapping[str, Any]]) -> Optional[Dict[str, Any]]:
+    if table is None:
+        return None
+    return {
+        "columns": [
+            {key: column.get(key) for key in TABLE_COLUMN_FIELDS} for column in table["columns"]
+        ],
+        "rows": table["rows"],
+    }
+
+
+def idf_public_payload(
+    row: Mapping[str, Any],
+    media: Mapping[str, Any],
+    table: Optional[Mapping[str, Any]],
+    health: Optional[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """``IdfPublic`` body of an ``idfs`` row whose media is in canonical form."""
+    location = media.get("location")
+    return {
+        "cluster": row["cluster"],
+        "project": row["project"],
+        "code": row["code"],
+        "title": row.get("title", ""),
+        "description": row.get("description"),
+        "site": row.get("site", ""),
+        "room": row.get("room", ""),
+        **{
+            field: [media_item_payload(item) for item in media.get(field) or []]
+            for field in ("images", "documents", "diagrams")
+        },
+        "location": media_item_payload(location) if location else None,
+        "dfo": [media_item_payload(item) for item in media.get("dfo") or []],
+        "logo": media.get("logo"),
+        "table": table_payload(table),
+        "health": health,
+    }
+
+
+def idf_index_payload(
+    row: Mapping[str, Any], logo: Optional[str], health: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """``IdfIndex`` body of a listing row."""
+    return {
+        "cluster": row["cluster"],
+        "project": row["project"],
+        "code": row["code"],
+        "title": row.get("title", ""),
+        "site": row.get("site", ""),
+        "room": row.get("room", ""),
+        "health": health,
+        "logo": logo,
+        "hasContent": bool(row.get("has_content")),
+    }
+
+
+__all__ = [
+    "FastJSONResponse",
+    "dumps",
+    "idf_index_payload",
+    "idf_public_payload",
+    "json_response_class",
+    "media_item_payload",
+    "table_payload",
+    "use_orjson",
+]
@@ -0,0 +1,253 @@
+"""Content-addressed storage for uploaded IDF assets.
+
+Uploads are stored once under ``STATIC_DIR/cas/<aa>/<bb>/<sha256><ext>`` and
+shared by every IDF that references them. ``asset_blobs`` keeps a reference
+count per stored path; a file (and its image derivatives) is only unlinked
+when its last reference from the ``images/documents/diagrams/dfo/location/logo``
+fields is released.
+Paths written before the store existed have no reference count (one file
+may be shared by several IDFs), so they are never unlinked.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+from collections import Counter
+from pathlib import Path
+from typing import IO, Any, Iterable, List
+
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.imaging import derivative_paths
+from app.db.database import database
+
+STATIC_ROOT = Path(settings.STATIC_DIR)
+CAS_DIR = "cas"
+
+# idfs columns that reference stored files
+MEDIA_FIELDS = ("images", "documents", "diagrams", "location", "dfo", "logo")
+
+_STATIC_URL_RE = re.compile(r"/static/([^'\"}]+)")
+
+
+# ---------------------------------------------------------------------------
+# Path helpers
+# ---------------------------------------------------------------------------
+
+def blob_relative_path(digest: str, extension: str) -> str:
+    """Sharded location of a blob, relative to ``STATIC_DIR``."""
+    return f"{CAS_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{extension.lower()}"
+
+
+def _path_from_item(item: Any) -> str | None:
+    if isinstance(item, dict):
+        item = item.get("url")
+    if not isinstance(item, str) or not item.strip():
+        return None
+    match = _STATIC_URL_RE.search(item)
+    if match:
+        return match.group(1)
+    return item.strip().lstrip("/")
+
+
+def media_paths(value: Any) -> List[str]:
+    """Relative paths referenced by a stored media field in any legacy format."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            pass
+    items = value if isinstance(value, list) else [value]
+    return [path for path in (_path_from_item(item) for item in items) if path]
+
+
+# ---------------------------------------------------------------------------
+# Streaming writes
+# ---------------------------------------------------------------------------
+
+def _upload_too_large(file: UploadFile) -> HTTPException:
+    limit_mb = settings.MAX_UPLOAD_BYTES // (1024 * 1024)
+    return HTTPException(
+        status_code=413,
+        detail=f"File {file.filename} exceeds the {limit_mb} MB upload limit",
+    )
+
+
+def _write_chunk(handle: IO[bytes], digest: "hashlib._Hash", chunk: bytes) -> None:
+    handle.write(chunk)
+    digest.update(chunk)
+
+
+def _commit_temp_file(handle: IO[bytes], destination: Path) -> None:
+    handle.flush()
+    os.fsync(handle.fileno())
+    handle.close()
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(handle.name, destination)
+
+
+def _discard_temp_file(handle: IO[bytes]) -> None:
+    handle.close()
+    Path(handle.name).unlink(missing_ok=True)
+
+
+def _place_blob(handle: IO[bytes], destination: Path) -> None:
+    if destination.exists():
+        _discard_temp_file(handle)
+    else:
+        _commit_temp_file(handle, destination)
+
+
+async def _stream_to_temp(file: UploadFile) -> tuple[IO[bytes], str, int]:
+    """Copy an upload into a temp file in fixed-size chunks, hashing as it goes."""
+    if file.size is not None and file.size > settings.MAX_UPLOAD_BYTES:
+        raise _upload_too_large(file)
+
+    temp_dir = STATIC_ROOT / CAS_DIR / ".tmp"
+    temp_dir.mkdir(parents=True, exist_ok=True)
+    handle = await run_in_threadpool(
+        tempfile.NamedTemporaryFile, dir=temp_dir, prefix=".upload-", delete=False
+    )
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+            written += len(chunk)
+            if written > settings.MAX_UPLOAD_BYTES:
+                raise _upload_too_large(file)
+            await run_in_threadpool(_write_chunk, handle, digest, chunk)
+    except BaseException:
+        await run_in_threadpool(_discard_temp_file, handle)
+        raise
+    return handle, digest.hexdigest(), written
+
+
+# ---------------------------------------------------------------------------
+# Reference counting
+# ---------------------------------------------------------------------------
+
+async def _lock_path(relative_path: str) -> None:
+    # Serializes acquire/release of one blob so a concurrent delete can never
+    # unlink a file that an upload has just started referencing.
+    await database.execute(
+        "SELECT pg_advisory_xact_lock(hashtext(:path))", {"path": relative_path}
+    )
+
+
+async def store_upload(file: UploadFile, extension: str) -> str:
+    """Store an upload in the content-addressed store and take one reference.
+
+    Returns the path relative to ``STATIC_DIR``. Identical content uploaded
+    again (to any IDF) reuses the existing file.
+    """
+    handle, digest, size = await _stream_to_temp(file)
+    relative_path = blob_relative_path(digest, extension)
+    try:
+        async with database.transaction():
+            await _lock_path(relative_path)
+            await database.execute(
+                """
+                INSERT INTO asset_blobs (path, sha256, size, ref_count)
+                VALUES (:path, :sha256, :size, 1)
+                ON CONFLICT (path) DO UPDATE SET ref_count = asset_blobs.ref_count + 1
+                """,
+                {"path": relative_path, "sha256": digest, "size": size},
+            )
+            await run_in_threadpool(_place_blob, handle, STATIC_ROOT / relative_path)
+    except BaseException:
+        await run_in_threadpool(_discard_temp_file, handle)
+        raise
+    return relative_path
+
+
+async def retain_assets(paths: Iterable[str]) -> None:
+    """Take an extra reference on already stored blobs (e.g. copied media)."""
+    for path, count in Counter(paths).items():
+        await database.execute(
+            "UPDATE asset_blobs SET ref_count = ref_count + :count WHERE path = :path",
+            {"path": path, "count": count},
+        )
+
+
+def _inside_static_root(relative_path: str) -> bool:
+    root = STATIC_ROOT.resolve()
+    return (root / relative_path).resolve().is_relative_to(root)
+
+
+async def release_asset(relative_path: str) -> bool:
+    """Drop one reference and unlink the file once nothing references it.
+
+    Only blobs tracked in ``asset_blobs`` are ever removed; legacy paths and
+    paths resolving outside ``STATIC_DIR`` are left alone. Returns True when
+    the file was removed from disk.
+    """
+    if not _inside_static_root(relative_path):
+        return False
+
+    async with database.transaction():
+        await _lock_path(relative_path)
+        row = await database.fetch_one(
+            """
+            UPDATE asset_blobs SET ref_count = ref_count - 1
+             WHERE path = :path
+            RETURNING ref_count
+            """,
+            {"path": relative_path},
+        )
+        if row is None or row["ref_count"] > 0:
+            return False
+        await database.execute(
+            "DELETE FROM asset_blobs WHERE path = :path", {"path": relative_path}
+        )
+
+    # Unlink only once the delete has committed, so a failed commit never
+    # leaves a row without its file. The path is locked again in case the
+    # same content was uploaded in between.
+    async with database.transaction():
+        await _lock_path(relative_path)
+        if await database.fetch_one(
+            "SELECT 1 FROM asset_blobs WHERE path = :path", {"path": relative_path}
+        ):
+            return False
+        try:
+            (STATIC_ROOT / relative_path).unlink(missing_ok=True)
+            for derivative in derivative_paths(relative_path):
+                (STATIC_ROOT / derivative).unlink(missing_ok=True)
+        except OSError:
+            return False
+    return True
+
+
+async def release_assets(paths: Iterable[str]) -> None:
+    for path in paths:
+        await release_asset(path)
+
+
+async def sync_asset_references(old_values: Iterable[Any], new_values: Iterable[Any]) -> None:
+    """Adjust reference counts after media fields are rewritten wholesale."""
+    old_paths = Counter(path for value in old_values for path in media_paths(value))
+    new_paths = Counter(path for value in new_values for path in media_paths(value))
+
+    await retain_assets((new_paths - old_paths).elements())
+    await release_assets((old_paths - new_paths).elements())
+
+
+__all__ = [
+    "CAS_DIR",
+    "MEDIA_FIELDS",
+    "STATIC_ROOT",
+    "blob_relative_path",
+    "media_paths",
+    "release_asset",
+    "release_assets",
+    "retain_assets",
+    "store_upload",
+    "sync_asset_references",
+]
@@ -0,0 +1,61 @@
+"""Write ZIP archives incrementally so responses can stream them."""
+from __future__ import annotations
+
+import zipfile
+from typing import AsyncIterable, AsyncIterator, List, Tuple, Union
+
+# An entry's data is either complete bytes or an async stream of chunks
+EntryData = Union[bytes, AsyncIterable[bytes]]
+
+
+class ZipSink:
+    """Write-only, unseekable file object that buffers bytes until drained.
+
+    ``zipfile`` falls back to data descriptors on unseekable outputs, so an
+    archive can be emitted chunk by chunk without holding it all in memory.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def stream_zip(
+    entries: AsyncIterable[Tuple[str, EntryData]],
+    compression: int = zipfile.ZIP_DEFLATED,
+) -> AsyncIterator[bytes]:
+    """Yield a ZIP archive built from ``(name, data)`` entries as they arrive.
+
+    Streamed entries are compressed chunk by chunk, so a single member can be
+    far larger than what is ever held in memory.
+    """
+    sink = ZipSink()
+    with zipfile.ZipFile(sink, mode="w", compression=compression) as archive:
+        async for name, data in entries:
+            if isinstance(data, (bytes, bytearray)):
+                archive.writestr(name, data)
+            else:
+                with archive.open(name, mode="w", force_zip64=True) as member:
+                    async for part in data:
+                        member.write(part)
+                        chunk = sink.drain()
+                        if chunk:
+                            yield chunk
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    yield sink.drain()
+
+
+__all__ = ["EntryData", "ZipSink", "stream_zip"]
@@ -0,0 +1,138 @@
+"""Cross-worker cache invalidation over PostgreSQL ``LISTEN/NOTIFY``.
+
+Writers call :func:`publish_cache_event` with an event kind (``"idfs"``,
+``"users"``) and the affected key. Every worker keeps one dedicated
+connection listening on ``CACHE_EVENTS_CHANNEL`` and hands the events sent by
+*other* workers to the handlers registered for their kind with
+:func:`on_cache_event`; the writer has already evicted its own entries.
+
+Events are only delivered while the listener is connected, so after every
+(re)connect the handlers are called with ``None`` to drop everything that may
+have changed in the meantime.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+import asyncpg
+
+from app.core.config import settings
+from app.db.postgres import database
+
+logger = logging.getLogger(__name__)
+
+CACHE_EVENTS_CHANNEL = "qartha_cache_events"
+
+# Identifies this process in the payload so it can skip its own events
+WORKER_ID = uuid.uuid4().hex
+
+CacheEventHandler = Callable[[Optional[Any]], Optional[Awaitable[None]]]
+
+_handlers: Dict[str, List[CacheEventHandler]] = {}
+_listener_task: Optional[asyncio.Task] = None
+_pending: Set[asyncio.Task] = set()
+
+
+def on_cache_event(kind: str, handler: CacheEventHandler) -> None:
+    """Register ``handler(key)`` for events of ``kind``; ``key`` None means all."""
+    _handlers.setdefault(kind, []).append(handler)
+
+
+async def publish_cache_event(kind: str, key: Any = None) -> None:
+    """Tell the other workers that ``key`` of ``kind`` changed.
+
+    Sent through the shared pool, so inside a transaction it is delivered on
+    commit only. A failed NOTIFY never fails the write that triggered it.
+    """
+    if not settings.CACHE_EVENTS_ENABLED:
+        return
+    payload = json.dumps({"origin": WORKER_ID, "kind": kind, "key": key})
+    try:
+        await database.execute(
+            "SELECT pg_notify(:channel, :payload)",
+            {"channel": CACHE_EVENTS_CHANNEL, "payload": payload},
+        )
+    except Exception:
+        logger.warning("Cache event publish failed", exc_info=True)
+
+
+async def _run_handlers(kind: str, key: Any) -> None:
+    for handler in _handlers.get(kind, []):
+        try:
+            result = handler(key)
+            if result is not None:
+                await result
+        except Exception:
+            logger.warning("Cache event handler for %r failed", kind, exc_info=True)
+
+
+def _dispatch(payload: str) -> None:
+    try:
+        event = json.loads(payload)
+    except json.JSONDecodeError:
+        return
+    if not isinstance(event, dict) or event.get("origin") == WORKER_ID:
+        return
+    task = asyncio.get_running_loop().create_task(_run_handlers(event.get("kind"), event.get("key")))
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+
+
+def _listener_dsn() -> str:
+    # asyncpg does not understand the SQLAlchemy-style driver suffix
+    return settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
+async def _listen_forever() -> None:
+    while True:
+        connection = None
+        try:
+            connection = await asyncpg.connect(_listener_dsn())
+            closed = asyncio.Event()
+            connection.add_termination_listener(lambda _connection: closed.set())
+            await connection.add_listener(
+                CACHE_EVENTS_CHANNEL, lambda _connection, _pid, _channel, payload: _dispatch(payload)
+            )
+            # Anything written while we were not listening may be cached
+            for kind in list(_handlers):
+                await _run_handlers(kind, None)
+            await closed.wait()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.warning("Cache event listener disconnected", exc_info=True)
+        finally:
+            if connection is not None and not connection.is_closed():
+                await connection.close()
+        await asyncio.sleep(settings.CACHE_EVENTS_RECONNECT_DELAY)
+
+
+def start_cache_listener() -> None:
+    """Start the background listener (called from the app lifespan)."""
+    global _listener_task
+    if settings.CACHE_EVENTS_ENABLED and _listener_task is None:
+        _listener_task = asyncio.get_running_loop().create_task(_listen_forever())
+
+
+async def stop_cache_listener() -> None:
+    global _listener_task
+    task, _listener_task = _listener_task, None
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+__all__ = [
+    "CACHE_EVENTS_CHANNEL",
+    "on_cache_event",
+    "publish_cache_event",
+    "start_cache_listener",
+    "stop_cache_listener",
+]
@@ -4,6 +4,9 @@ from .postgres import (
     ensure_indexes,
     seed_data,
     close_database,
+    IDF_SEARCH_EXPRESSION,
+    PORT_SEARCH_EXPRESSION,
+    search_capabilities,
 )
 
 __all__ = [
@@ -12,4 +15,7 @@ __all__ = [
     "ensure_indexes",
     "seed_data",
     "close_database",
+    "IDF_SEARCH_EXPRESSION",
+    "PORT_SEARCH_EXPRESSION",
+    "search_capabilities",
 ]
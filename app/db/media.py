@@ -0,0 +1,54 @@
+"""Batched normalization of the ``idfs`` media columns.
+
+Rows written before the canonical media schema (``app.core.media``) carry
+``media_version < MEDIA_VERSION``. They are rewritten here in batches, one
+transaction each; the read path normalizes such rows on the fly until then.
+Each batch is locked while it is rewritten, so a write that lands meanwhile
+(an upload, a PUT, another worker migrating) is never overwritten with the
+copy read before it.
+"""
+from __future__ import annotations
+
+from app.core.media import MEDIA_COLUMNS, MEDIA_VERSION, media_bind_values
+from app.db.postgres import database
+
+UPDATE_MEDIA_QUERY = (
+    "UPDATE idfs SET "
+    + ", ".join(f"{column} = :{column}" for column in MEDIA_COLUMNS)
+    + ", media_version = :media_version"
+    " WHERE id = :id AND media_version < :media_version"
+)
+
+
+async def migrate_media_fields(batch_size: int = 200) -> int:
+    """Normalize every row below ``MEDIA_VERSION``; returns the rows rewritten.
+
+    Safe to re-run: migrated rows are stamped with the current version.
+    """
+    migrated = 0
+    last_id = 0
+    while True:
+        async with database.transaction():
+            rows = await database.fetch_all(
+                f"""
+                SELECT id, {', '.join(MEDIA_COLUMNS)} FROM idfs
+                 WHERE id > :last_id AND media_version < :media_version
+                 ORDER BY id
+                 LIMIT :limit
+                 FOR UPDATE
+                """,
+                {"last_id": last_id, "media_version": MEDIA_VERSION, "limit": batch_size},
+            )
+            if not rows:
+                return migrated
+
+            values = [
+                {"id": row["id"], **media_bind_values(dict(row)), "media_version": MEDIA_VERSION}
+                for row in rows
+            ]
+            await database.execute_many(UPDATE_MEDIA_QUERY, values)
+        migrated += len(rows)
+        last_id = rows[-1]["id"]
+
+
+__all__ = ["UPDATE_MEDIA_QUERY", "migrate_media_fields"]
@@ -0,0 +1,322 @@
+"""Patch-panel ports stored one row per port in ``idf_ports``.
+
+``idfs.table_data`` keeps only the column definitions of a patch table; its
+rows live in ``idf_ports`` so a status edit touches a single row and ports can
+be queried across IDFs. The ``tray``/``panel``/``port``/``status`` fields have
+their own text columns for filtering, sorting and search, and every other key
+is kept in the ``extra`` JSONB overflow. A port field whose value is not a
+string (a number, a boolean, ``null``) is also kept in ``extra`` with its JSON
+type, and that copy wins when the row is rebuilt.
+
+IDFs whose ``table_data`` still carries ``rows`` have not been migrated yet
+and are read from the blob as before.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+from app.core.health import STATUS_KEYS, health_from_counts, health_to_columns
+from app.db.postgres import PORT_SEARCH_EXPRESSION, database
+
+PORT_FIELDS = ("tray", "panel", "port", "status")
+
+PORT_COLUMNS = ("position", *PORT_FIELDS, "extra")
+
+INSERT_PORT_QUERY = """
+    INSERT INTO idf_ports (idf_id, position, tray, panel, port, status, extra)
+    VALUES (:idf_id, :position, :tray, :panel, :port, :status, :extra)
+"""
+
+# Same split as split_row(), done in SQL for the blob migration; ->> renders
+# non-string JSON values exactly like json.dumps does, and only string port
+# fields are dropped from extra.
+MIGRATE_ROWS_QUERY = """
+    INSERT INTO idf_ports (idf_id, position, tray, panel, port, status, extra)
+    SELECT i.id, r.position - 1,
+           r.row_data->>'tray', r.row_data->>'panel', r.row_data->>'port', r.row_data->>'status',
+           r.row_data - ARRAY(
+               SELECT field FROM unnest(ARRAY['tray', 'panel', 'port', 'status']) AS field
+                WHERE jsonb_typeof(r.row_data->field) = 'string'
+           )
+      FROM idfs i
+     CROSS JOIN LATERAL jsonb_array_elements(
+            CASE WHEN jsonb_typeof(i.table_data->'rows') = 'array'
+                 THEN i.table_data->'rows' ELSE '[]'::jsonb END
+           ) WITH ORDINALITY AS r(row_data, position)
+     WHERE i.id = ANY(:ids) AND jsonb_typeof(r.row_data) = 'object'
+    ON CONFLICT (idf_id, position) DO NOTHING
+"""
+
+_NUMERIC_TEXT = r"'^\s*-?[0-9]+(\.[0-9]+)?\s*$'"
+
+HEALTH_COUNTS_QUERY = (
+    "SELECT COUNT(*) AS total, "
+    + ", ".join(f"COUNT(*) FILTER (WHERE lower(status) = '{key}') AS {key}" for key in STATUS_KEYS)
+    + " FROM idf_ports WHERE idf_id = :idf_id"
+)
+
+
+# ---------------------------------------------------------------------------
+# Row conversion
+# ---------------------------------------------------------------------------
+
+def _as_text(value: Any) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+def _in_extra(key: str, value: Any) -> bool:
+    # Port fields only leave extra when their text column holds them exactly
+    return key not in PORT_FIELDS or not isinstance(value, str)
+
+
+def split_row(position: int, row: Mapping[str, Any]) -> Dict[str, Any]:
+    """Bind values for one table row."""
+    extra = {key: value for key, value in row.items() if _in_extra(key, value)}
+    return {
+        "position": position,
+        **{field: _as_text(row.get(field)) for field in PORT_FIELDS},
+        "extra": json.dumps(extra),
+    }
+
+
+def _cast(value: str, column_type: Optional[str]) -> Any:
+    if column_type != "number":
+        return value
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            continue
+    return value
+
+
+def join_row(record: Mapping[str, Any], column_types: Mapping[str, str]) -> Dict[str, Any]:
+    """Rebuild the table row dict from an ``idf_ports`` record."""
+    extra = record["extra"]
+    row: Dict[str, Any] = dict(json.loads(extra) if isinstance(extra, str) else extra or {})
+    for field in PORT_FIELDS:
+        if field not in row and record[field] is not None:
+            # Typed values are in extra; the cast covers rows written before that
+            row[field] = _cast(record[field], column_types.get(field))
+    return row
+
+
+def order_by_column(key: str, column_type: Optional[str], descending: bool = False) -> str:
+    """ORDER BY clause for a table column; extra keys bind ``:sort_key``."""
+    value = key if key in PORT_FIELDS else "(extra->>:sort_key)"
+    direction = "DESC" if descending else "ASC"
+    terms = [f"{value} {direction} NULLS LAST"]
+    if column_type == "number":
+        # Numeric order for numbers, then text order for anything unparsable
+        terms.insert(
+            0, f"CASE WHEN {value} ~ {_NUMERIC_TEXT} THEN ({value})::numeric END {direction} NULLS LAST"
+        )
+    return "ORDER BY " + ", ".join(terms + ["position"])
+
+
+def table_definition(table: Optional[Mapping[str, Any]]) -> Optional[str]:
+    """``table_data`` value for a table whose rows are stored as ports."""
+    if not table:
+        return None
+    return json.dumps({key: value for key, value in table.items() if key != "rows"})
+
+
+def _load_json(value: Any) -> Any:
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            return None
+    return value
+
+
+# ---------------------------------------------------------------------------
+# Reads and writes
+# ---------------------------------------------------------------------------
+
+async def replace_ports(idf_id: int, rows: Iterable[Mapping[str, Any]]) -> None:
+    """Replace every port of an IDF; callers wrap this in their transaction."""
+    await database.execute("DELETE FROM idf_ports WHERE idf_id = :idf_id", {"idf_id": idf_id})
+    values = [
+        {"idf_id": idf_id, **split_row(position, row)}
+        for position, row in enumerate(rows)
+        if isinstance(row, Mapping)
+    ]
+    if values:
+        await database.execute_many(INSERT_PORT_QUERY, values)
+
+
+async def fetch_ports(idf_id: int) -> List[Mapping[str, Any]]:
+    return await database.fetch_all(
+        f"SELECT {', '.join(PORT_COLUMNS)} FROM idf_ports WHERE idf_id = :idf_id ORDER BY position",
+        {"idf_id": idf_id},
+    )
+
+
+async def load_table(idf_row: Mapping[str, Any]) -> Optional[Dict[str, Any]]:
+    """Assemble the ``IdfTable`` payload of an ``idfs`` row."""
+    table = _load_json(idf_row.get("table_data"))
+    if not isinstance(table, dict):
+        return None
+    if "rows" in table:
+        return table  # not migrated yet
+
+    column_types = {
+        column.get("key"): column.get("type")
+        for column in table.get("columns") or []
+        if isinstance(column, dict)
+    }
+    records = await fetch_ports(idf_row["id"])
+    return {**table, "rows": [join_row(record, column_types) for record in records]}
+
+
+# ---------------------------------------------------------------------------
+# Row-level edits (callers hold a transaction and a lock on the idfs row)
+# ---------------------------------------------------------------------------
+
+async def _shift_positions(idf_id: int, start: int, delta: int) -> None:
+    # Rows are first moved to distinct negative positions so the
+    # UNIQUE(idf_id, position) constraint holds after every single row update.
+    params = {"idf_id": idf_id, "start": start}
+    await database.execute(
+        "UPDATE idf_ports SET position = -position - 1 WHERE idf_id = :idf_id AND position >= :start",
+        params,
+    )
+    await database.execute(
+        "UPDATE idf_ports SET position = -position - 1 + :delta WHERE idf_id = :idf_id AND position < 0",
+        {"idf_id": idf_id, "delta": delta},
+    )
+
+
+async def update_port(idf_id: int, position: int, values: Mapping[str, Any]) -> bool:
+    """Merge ``values`` into one row; returns False when the row does not exist."""
+    params: Dict[str, Any] = {"idf_id": idf_id, "position": position}
+    assignments = []
+    for field in PORT_FIELDS:
+        if field in values:
+            assignments.append(f"{field} = :{field}")
+            params[field] = _as_text(values[field])
+    # String port fields replace a typed copy left in extra by an earlier value
+    dropped = [key for key, value in values.items() if not _in_extra(key, value)]
+    extra = {key: value for key, value in values.items() if _in_extra(key, value)}
+    if dropped or extra:
+        assignments.append("extra = (extra - CAST(:dropped AS TEXT[])) || CAST(:extra AS JSONB)")
+        params["dropped"] = dropped
+        params["extra"] = json.dumps(extra)
+
+    if assignments:
+        query = (
+            f"UPDATE idf_ports SET {', '.join(assignments)} "
+            "WHERE idf_id = :idf_id AND position = :position RETURNING id"
+        )
+    else:
+        query = "SELECT id FROM idf_ports WHERE idf_id = :idf_id AND position = :position"
+    return await database.fetch_one(query, params) is not None
+
+
+async def insert_port(idf_id: int, position: Optional[int], row: Mapping[str, Any]) -> int:
+    """Insert a row before ``position`` (appending past the end); returns its index."""
+    count = await database.fetch_val(
+        "SELECT COUNT(*) FROM idf_ports WHERE idf_id = :idf_id", {"idf_id": idf_id}
+    )
+    if position is None or position >= count:
+        position = count
+    else:
+        await _shift_positions(idf_id, position, 1)
+    await database.execute(INSERT_PORT_QUERY, {"idf_id": idf_id, **split_row(position, row)})
+    return position
+
+
+async def delete_port(idf_id: int, position: int) -> bool:
+    """Delete one row and close the gap; returns False when it does not exist."""
+    deleted = await database.fetch_one(
+        "DELETE FROM idf_ports WHERE idf_id = :idf_id AND position = :position RETURNING id",
+        {"idf_id": idf_id, "position": position},
+    )
+    if deleted is None:
+        return False
+    await _shift_positions(idf_id, position + 1, -1)
+    return True
+
+
+async def refresh_health(idf_id: int) -> Dict[str, Any]:
+    """Recount statuses in SQL and store them in the ``idfs.health_*`` columns."""
+    counts = await database.fetch_one(HEALTH_COUNTS_QUERY, {"idf_id": idf_id})
+    health = health_from_counts(counts, counts["total"])
+    await database.execute(
+        """
+        UPDATE idfs
+           SET health_level = :health_level,
+               health_ok = :health_ok,
+               health_revision = :health_revision,
+               health_falla = :health_falla,
+               health_libre = :health_libre,
+               health_reservado = :health_reservado
+         WHERE id = :idf_id
+        """,
+        {"idf_id": idf_id, **health_to_columns(health)},
+    )
+    return health
+
+
+# ---------------------------------------------------------------------------
+# Migration from table_data
+# ---------------------------------------------------------------------------
+
+async def migrate_idf_ports(ids: List[int]) -> None:
+    """Move the blob rows of the given IDFs; callers provide the transaction."""
+    await database.execute(MIGRATE_ROWS_QUERY, {"ids": ids})
+    await database.execute(
+        "UPDATE idfs SET table_data = table_data - 'rows' WHERE id = ANY(:ids)",
+        {"ids": ids},
+    )
+
+
+async def migrate_table_data_to_ports(batch_size: int = 200) -> int:
+    """Move ``table_data.rows`` of every IDF into ``idf_ports``.
+
+    Runs in batches of IDFs, one transaction each, and is safe to re-run: only
+    IDFs whose blob still has ``rows`` are touched. Returns the IDFs migrated.
+    """
+    migrated = 0
+    last_id = 0
+    while True:
+        rows = await database.fetch_all(
+            """
+            SELECT id FROM idfs
+             WHERE id > :last_id AND table_data->'rows' IS NOT NULL
+             ORDER BY id
+             LIMIT :limit
+            """,
+            {"last_id": last_id, "limit": batch_size},
+        )
+        if not rows:
+            return migrated
+
+        ids = [row["id"] for row in rows]
+        async with database.transaction():
+            await migrate_idf_ports(ids)
+        migrated += len(ids)
+        last_id = ids[-1]
+
+
+__all__ = [
+    "PORT_FIELDS",
+    "PORT_SEARCH_EXPRESSION",
+    "delete_port",
+    "fetch_ports",
+    "insert_port",
+    "join_row",
+    "load_table",
+    "migrate_idf_ports",
+    "migrate_table_data_to_ports",
+    "order_by_column",
+    "refresh_health",
+    "replace_ports",
+    "split_row",
+    "table_definition",
+    "update_port",
+]
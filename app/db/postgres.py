@@ -7,12 +7,27 @@ from typing import Any, Sequence
 from databases import Database
 
 from app.core.config import settings
+from app.core.health import health_columns_for_table
+from app.core.media import MEDIA_LIST_FIELDS, MEDIA_VERSION, media_bind_values
 
 # ----------------------------------------------------------------------------
 # Database connection
 # ----------------------------------------------------------------------------
 
-database = Database(settings.DATABASE_URL)
+
+def _encode_jsonb(value: Any) -> str:
+    # Callers mostly bind pre-serialized JSON text; pass it through unchanged
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+async def _init_connection(connection: Any) -> None:
+    """Decode JSONB to Python values on every pooled connection."""
+    await connection.set_type_codec(
+        "jsonb", schema="pg_catalog", encoder=_encode_jsonb, decoder=json.loads
+    )
+
+
+database = Database(settings.DATABASE_URL, init=_init_connection)
 
 
 # ----------------------------------------------------------------------------
@@ -43,13 +58,20 @@ CREATE TABLE IF NOT EXISTS idfs (
     description TEXT,
     site VARCHAR(255),
     room VARCHAR(255),
-    images TEXT[] DEFAULT ARRAY[]::TEXT[],
-    documents TEXT[] DEFAULT ARRAY[]::TEXT[],
-    diagrams TEXT[] DEFAULT ARRAY[]::TEXT[],
-    location TEXT,
-    dfo TEXT[] DEFAULT ARRAY[]::TEXT[],
+    images JSONB DEFAULT '[]'::jsonb,
+    documents JSONB DEFAULT '[]'::jsonb,
+    diagrams JSONB DEFAULT '[]'::jsonb,
+    location JSONB,
+    dfo JSONB DEFAULT '[]'::jsonb,
     logo TEXT,
+    media_version SMALLINT NOT NULL DEFAULT 0,
     table_data JSONB,
+    health_level VARCHAR(10),
+    health_ok INTEGER,
+    health_revision INTEGER,
+    health_falla INTEGER,
+    health_libre INTEGER,
+    health_reservado INTEGER,
     created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
     updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
     UNIQUE(cluster, project, code)
@@ -72,21 +94,238 @@ CREATE TABLE IF NOT EXISTS devices (
 );
 """
 
+CREATE_ASSET_BLOBS_TABLE = """
+CREATE TABLE IF NOT EXISTS asset_blobs (
+    path TEXT PRIMARY KEY,
+    sha256 CHAR(64) NOT NULL,
+    size BIGINT NOT NULL,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+"""
+
+# Patch-table rows, one per port; see app/db/ports.py
+CREATE_IDF_PORTS_TABLE = """
+CREATE TABLE IF NOT EXISTS idf_ports (
+    id BIGSERIAL PRIMARY KEY,
+    idf_id INTEGER NOT NULL REFERENCES idfs(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    tray TEXT,
+    panel TEXT,
+    port TEXT,
+    status TEXT,
+    extra JSONB NOT NULL DEFAULT '{}'::jsonb,
+    UNIQUE(idf_id, position)
+);
+"""
+
+# Per cluster/project/site IDF health levels and port status totals for the
+# dashboard; refreshed after IDF writes by app/db/rollup.py
+CREATE_HEALTH_ROLLUP_VIEW = """
+CREATE MATERIALIZED VIEW IF NOT EXISTS idf_health_rollup AS
+WITH port_counts AS (
+    SELECT idf_id,
+           COUNT(*) FILTER (WHERE lower(status) = 'ok') AS ok,
+           COUNT(*) FILTER (WHERE lower(status) = 'revision') AS revision,
+           COUNT(*) FILTER (WHERE lower(status) = 'falla') AS falla,
+           COUNT(*) FILTER (WHERE lower(status) = 'libre') AS libre,
+           COUNT(*) FILTER (WHERE lower(status) = 'reservado') AS reservado
+      FROM idf_ports
+     GROUP BY idf_id
+)
+SELECT i.cluster,
+       i.project,
+       COALESCE(i.site, '') AS site,
+       COUNT(*) AS idfs,
+       COUNT(*) FILTER (WHERE i.health_level = 'green') AS green,
+       COUNT(*) FILTER (WHERE i.health_level = 'yellow') AS yellow,
+       COUNT(*) FILTER (WHERE i.health_level = 'red') AS red,
+       COUNT(*) FILTER (WHERE i.health_level IS NULL OR i.health_level = 'gray') AS gray,
+       COALESCE(SUM(pc.ok), 0) AS ok,
+       COALESCE(SUM(pc.revision), 0) AS revision,
+       COALESCE(SUM(pc.falla), 0) AS falla,
+       COALESCE(SUM(pc.libre), 0) AS libre,
+       COALESCE(SUM(pc.reservado), 0) AS reservado
+  FROM idfs i
+  LEFT JOIN port_counts pc ON pc.idf_id = i.id
+ GROUP BY i.cluster, i.project, COALESCE(i.site, '');
+"""
+
+# Bumps idfs.updated_at on every UPDATE, whichever code path issues it; the
+# public endpoints derive their ETag/Last-Modified validators from it.
+CREATE_IDFS_UPDATED_AT_FUNCTION = """
+CREATE OR REPLACE FUNCTION idfs_touch_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+CREATE_IDFS_UPDATED_AT_TRIGGER = """
+CREATE TRIGGER idfs_touch_updated_at
+    BEFORE UPDATE ON idfs
+    FOR EACH ROW EXECUTE FUNCTION idfs_touch_updated_at();
+"""
+
+# Columns added after the initial schema; applied to existing databases.
+IDFS_COLUMN_MIGRATIONS: Sequence[str] = (
+    "ALTER TABLE idfs ADD COLUMN IF NOT EXISTS health_level VARCHAR(10)",
+    "ALTER TABLE idfs ADD COLUMN IF NOT EXISTS health_ok INTEGER",
+    "ALTER TABLE idfs ADD COLUMN IF NOT EXISTS health_revision INTEGER",
+    "ALTER TABLE idfs ADD COLUMN IF NOT EXISTS health_falla INTEGER",
+    "ALTER TABLE idfs ADD COLUMN IF NOT EXISTS health_libre INTEGER",
+    "ALTER TABLE idfs ADD COLUMN IF NOT EXISTS health_reservado INTEGER",
+    # Rows are re-normalized by app.db.media until they reach MEDIA_VERSION
+    "ALTER TABLE idfs ADD COLUMN IF NOT EXISTS media_version SMALLINT NOT NULL DEFAULT 0",
+)
+
+# Media columns created as TEXT/TEXT[] by older schemas are converted to JSONB
+# verbatim; the row contents are normalized afterwards in batches.
+MEDIA_JSONB_CONVERSIONS = {
+    "ARRAY": "to_jsonb({column})",
+    "text": "CASE WHEN btrim({column}) = '' THEN NULL ELSE to_jsonb({column}) END",
+    "character varying": "CASE WHEN btrim({column}) = '' THEN NULL ELSE to_jsonb({column}) END",
+    "json": "{column}::jsonb",
+}
+
 CREATE_DEVICES_INDEX = """
 CREATE INDEX IF NOT EXISTS idx_devices_cluster_project_idf
     ON devices(cluster, project, idf_code);
 """
 
+CREATE_DEVICES_LISTING_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_devices_cluster_project_id
+    ON devices(cluster, project, id);
+"""
+
+# A serial names one device per cluster; lookups by serial are per cluster too
+CREATE_DEVICES_SERIAL_INDEX = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_devices_cluster_serial
+    ON devices(cluster, serial) WHERE serial IS NOT NULL;
+"""
+
+# Used instead when existing inventories already contain duplicate serials
+CREATE_DEVICES_SERIAL_FALLBACK_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_devices_cluster_serial_lookup
+    ON devices(cluster, serial) WHERE serial IS NOT NULL;
+"""
+
+# Global serial indexes replaced by the per-cluster ones above
+DROP_DEVICES_GLOBAL_SERIAL_INDEXES = (
+    "DROP INDEX IF EXISTS idx_devices_serial",
+    "DROP INDEX IF EXISTS idx_devices_serial_lookup",
+)
+
+# Status filters compare case-insensitively ("OK" vs "ok")
+CREATE_IDF_PORTS_STATUS_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_idf_ports_status_lower
+    ON idf_ports(lower(status));
+"""
+
+DROP_IDF_PORTS_RAW_STATUS_INDEX = "DROP INDEX IF EXISTS idx_idf_ports_status"
+
+CREATE_IDF_PORTS_PANEL_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_idf_ports_panel
+    ON idf_ports(panel);
+"""
+
+# Required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE_HEALTH_ROLLUP_INDEX = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_idf_health_rollup_key
+    ON idf_health_rollup(cluster, project, site);
+"""
+
 CREATE_IDFS_LOOKUP_INDEX = """
 CREATE INDEX IF NOT EXISTS idx_idfs_cluster_project_code
     ON idfs(cluster, project, code);
 """
 
+CREATE_IDFS_LISTING_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_idfs_cluster_project_title_code
+    ON idfs(cluster, project, title, code);
+"""
+
+# MAX(updated_at) behind the listing validators without scanning the project
+CREATE_IDFS_UPDATED_AT_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_idfs_cluster_project_updated_at
+    ON idfs(cluster, project, updated_at);
+"""
+
+# Concatenated search text used by the ``q`` filter; the query must use this
+# exact expression for PostgreSQL to match it against the trigram index.
+IDF_SEARCH_EXPRESSION = (
+    "(coalesce(code, '')::text || ' ' || coalesce(title, '')::text || ' ' "
+    "|| coalesce(site, '')::text || ' ' || coalesce(room, '')::text)"
+)
+
+# Text matched by the ``q`` filter of patch-table port queries: cell values
+# only, so JSON key names in ``extra`` never match
+PORT_SEARCH_EXPRESSION = (
+    "(coalesce(tray, '') || ' ' || coalesce(panel, '') || ' ' || coalesce(port, '') "
+    "|| ' ' || coalesce(status, '') || ' ' || jsonb_path_query_array(extra, 'strict $.*')::text)"
+)
+
+CREATE_TRGM_EXTENSION = "CREATE EXTENSION IF NOT EXISTS pg_trgm"
+
+CREATE_IDFS_SEARCH_INDEX = f"""
+CREATE INDEX IF NOT EXISTS idx_idfs_search_trgm
+    ON idfs USING GIN ({IDF_SEARCH_EXPRESSION} gin_trgm_ops);
+"""
+
+CREATE_IDF_PORTS_SEARCH_INDEX = f"""
+CREATE INDEX IF NOT EXISTS idx_idf_ports_values_trgm
+    ON idf_ports USING GIN ({PORT_SEARCH_EXPRESSION} gin_trgm_ops);
+"""
+
+# Built over extra::text, which also matched key names
+DROP_IDF_PORTS_OLD_SEARCH_INDEX = "DROP INDEX IF EXISTS idx_idf_ports_search_trgm"
+
+# Features detected by ensure_indexes that query builders can rely on
+search_capabilities = {"trigram": False}
+
 
 async def _create_tables() -> None:
     await database.execute(CREATE_USERS_TABLE)
     await database.execute(CREATE_IDFS_TABLE)
     await database.execute(CREATE_DEVICES_TABLE)
+    await database.execute(CREATE_ASSET_BLOBS_TABLE)
+    for statement in IDFS_COLUMN_MIGRATIONS:
+        await database.execute(statement)
+    await database.execute(CREATE_IDFS_UPDATED_AT_FUNCTION)
+    trigger_exists = await database.fetch_val(
+        "SELECT 1 FROM pg_trigger WHERE tgname = 'idfs_touch_updated_at' AND tgrelid = 'idfs'::regclass"
+    )
+    if not trigger_exists:
+        await database.execute(CREATE_IDFS_UPDATED_AT_TRIGGER)
+    await _ensure_media_jsonb()
+    await database.execute(CREATE_IDF_PORTS_TABLE)
+    await database.execute(CREATE_HEALTH_ROLLUP_VIEW)
+
+
+async def _ensure_media_jsonb() -> None:
+    rows = await database.fetch_all(
+        """
+        SELECT column_name, data_type FROM information_schema.columns
+         WHERE table_schema = current_schema() AND table_name = 'idfs'
+           AND column_name = ANY(:columns)
+        """,
+        {"columns": [*MEDIA_LIST_FIELDS, "location"]},
+    )
+    for row in rows:
+        column, data_type = row["column_name"], row["data_type"]
+        conversion = MEDIA_JSONB_CONVERSIONS.get(data_type)
+        if conversion is None:
+            continue  # already JSONB
+        default = "NULL" if column == "location" else "'[]'::jsonb"
+        await database.execute(
+            f"""
+            ALTER TABLE idfs
+                ALTER COLUMN {column} DROP DEFAULT,
+                ALTER COLUMN {column} TYPE JSONB USING {conversion.format(column=column)},
+                ALTER COLUMN {column} SET DEFAULT {default}
+            """
+        )
 
 
 async def init_database() -> None:
@@ -103,7 +342,44 @@ async def ensure_indexes() -> None:
     if not database.is_connected:
         await database.connect()
     await database.execute(CREATE_DEVICES_INDEX)
+    await database.execute(CREATE_DEVICES_LISTING_INDEX)
+    await _ensure_serial_index()
+    await database.execute(CREATE_IDF_PORTS_STATUS_INDEX)
+    await database.execute(DROP_IDF_PORTS_RAW_STATUS_INDEX)
+    await database.execute(CREATE_IDF_PORTS_PANEL_INDEX)
+    await database.execute(CREATE_HEALTH_ROLLUP_INDEX)
     await database.execute(CREATE_IDFS_LOOKUP_INDEX)
+    await database.execute(CREATE_IDFS_LISTING_INDEX)
+    await database.execute(CREATE_IDFS_UPDATED_AT_INDEX)
+    await _ensure_search_index()
+
+
+async def _ensure_serial_index() -> None:
+    """Enforce unique device serials, or just index them while duplicates remain."""
+    await database.execute(
+        "UPDATE devices SET serial = NULL WHERE serial IS NOT NULL AND btrim(serial) = ''"
+    )
+    try:
+        await database.execute(CREATE_DEVICES_SERIAL_INDEX)
+    except Exception as exc:  # unique_violation on legacy data
+        print(f"Duplicate device serials found, serial index is not unique: {exc}")
+        await database.execute(CREATE_DEVICES_SERIAL_FALLBACK_INDEX)
+    for statement in DROP_DEVICES_GLOBAL_SERIAL_INDEXES:
+        await database.execute(statement)
+
+
+async def _ensure_search_index() -> None:
+    """Create the pg_trgm search indexes, degrading to plain ILIKE if unavailable."""
+    try:
+        await database.execute(CREATE_TRGM_EXTENSION)
+        await database.execute(CREATE_IDFS_SEARCH_INDEX)
+        await database.execute(CREATE_IDF_PORTS_SEARCH_INDEX)
+        await database.execute(DROP_IDF_PORTS_OLD_SEARCH_INDEX)
+    except Exception as exc:  # e.g. missing privileges to create extensions
+        print(f"pg_trgm unavailable, IDF search will not be indexed: {exc}")
+        search_capabilities["trigram"] = False
+        return
+    search_capabilities["trigram"] = True
 
 
 async def close_database() -> None:
@@ -202,15 +478,24 @@ async def _seed_idfs() -> None:
     insert_query = """
         INSERT INTO idfs (
             cluster, project, code, title, description, site, room,
-            images, documents, diagrams, location, dfo, logo, table_data
+            images, documents, diagrams, location, dfo, logo, media_version, table_data,
+            health_level, health_ok, health_revision, health_falla,
+            health_libre, health_reservado
         ) VALUES (
             :cluster, :project, :code, :title, :description, :site, :room,
-            :images, :documents, :diagrams, :location, :dfo, :logo, :table_data
+            :images, :documents, :diagrams, :location, :dfo, :logo, :media_version, :table_data,
+            :health_level, :health_ok, :health_revision, :health_falla,
+            :health_libre, :health_reservado
         )
     """
 
     for record in SEED_IDFS:
-        payload = {**record}
+        payload = {
+            **record,
+            **media_bind_values(record),
+            "media_version": MEDIA_VERSION,
+            **health_columns_for_table(record.get("table_data")),
+        }
         payload["table_data"] = (
             json.dumps(record.get("table_data")) if record.get("table_data") else None
         )
@@ -229,4 +514,7 @@ __all__ = [
     "ensure_indexes",
     "seed_data",
     "close_database",
+    "IDF_SEARCH_EXPRESSION",
+    "PORT_SEARCH_EXPRESSION",
+    "search_capabilities",
 ]
@@ -0,0 +1,62 @@
+"""Refreshing of the ``idf_health_rollup`` materialized view.
+
+IDF writes call :func:`schedule_rollup_refresh`, which coalesces bursts of
+writes into a single ``REFRESH MATERIALIZED VIEW CONCURRENTLY`` run in the
+background after ``HEALTH_ROLLUP_REFRESH_DELAY`` seconds. Readers are never
+blocked by a refresh and see the previous snapshot until it completes.
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Optional
+
+from app.core.config import settings
+from app.db.postgres import database
+
+REFRESH_ROLLUP_QUERY = "REFRESH MATERIALIZED VIEW CONCURRENTLY idf_health_rollup"
+
+_refresh_task: Optional[asyncio.Task] = None
+_refresh_requested = False
+
+
+async def refresh_health_rollup() -> None:
+    """Refresh the rollup view now."""
+    await database.execute(REFRESH_ROLLUP_QUERY)
+
+
+async def _refresh_worker() -> None:
+    global _refresh_requested, _refresh_task
+    try:
+        while _refresh_requested:
+            await asyncio.sleep(settings.HEALTH_ROLLUP_REFRESH_DELAY)
+            _refresh_requested = False
+            try:
+                await refresh_health_rollup()
+            except Exception as exc:  # the next write schedules another attempt
+                print(f"Health rollup refresh failed: {exc}")
+    finally:
+        _refresh_task = None
+
+
+def schedule_rollup_refresh() -> None:
+    """Ask for a refresh; writes arriving before it runs share the same one."""
+    global _refresh_requested, _refresh_task
+    _refresh_requested = True
+    if _refresh_task is None:
+        _refresh_task = asyncio.get_running_loop().create_task(_refresh_worker())
+
+
+async def cancel_rollup_refresh() -> None:
+    """Stop a pending refresh on shutdown."""
+    global _refresh_requested
+    _refresh_requested = False
+    task = _refresh_task
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+__all__ = ["cancel_rollup_refresh", "refresh_health_rollup", "schedule_rollup_refresh"]
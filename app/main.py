@@ -7,9 +7,15 @@ from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 
 from app.core.config import settings
+from app.core.serialization import json_response_class
+from app.core.workers import shutdown_process_pool
 from app.db import close_database, ensure_indexes, init_database, seed_data
+from app.db.cache_events import start_cache_listener, stop_cache_listener
 from app.db.database import database
-from app.routers import admin_idfs, assets, auth, devices, public_idfs, qr
+from app.db.media import migrate_media_fields
+from app.db.ports import migrate_table_data_to_ports
+from app.db.rollup import cancel_rollup_refresh, refresh_health_rollup
+from app.routers import admin_idfs, assets, auth, dashboard, devices, exports, public_idfs, qr
 
 
 @asynccontextmanager
@@ -20,8 +26,15 @@ async def lifespan(app: FastAPI):
     await init_database()
     await ensure_indexes()
     await seed_data()
+    await migrate_table_data_to_ports()
+    await migrate_media_fields()
+    await refresh_health_rollup()
+    start_cache_listener()
     yield
     # Shutdown
+    await stop_cache_listener()
+    await cancel_rollup_refresh()
+    shutdown_process_pool()
     await close_database()
 
 
@@ -29,7 +42,8 @@ app = FastAPI(
     title="Qartha Smart Inventory Network",
     description="Multi-tenant IDF directory management system",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=json_response_class(),
 )
 
 # CORS middleware
@@ -56,6 +70,8 @@ app.include_router(assets.router, prefix="/api")
 app.include_router(assets.admin_router, prefix="/api/admin")
 app.include_router(qr.router, prefix="/api")
 app.include_router(devices.router, prefix="/api")
+app.include_router(exports.router, prefix="/api")
+app.include_router(dashboard.router, prefix="/api")
 
 # Debug endpoint to check available IDFs
 @app.get("/api/debug/idfs")
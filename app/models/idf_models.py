@@ -1,15 +1,18 @@
 """Pydantic models for IDF and user domain objects."""
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Literal, Optional, Union
 
-from pydantic import BaseModel, Field, HttpUrl
+from pydantic import BaseModel, Field, HttpUrl, model_validator
 
 
 class MediaItem(BaseModel):
     url: str
     name: Optional[str] = None
     kind: Optional[str] = None
+    title: Optional[str] = None
+    variants: Optional[Dict[str, str]] = None  # "thumb" | "medium" -> URL
+    srcset: Optional[str] = None
 
 
 class TableColumn(BaseModel):
@@ -24,6 +27,40 @@ class IdfTable(BaseModel):
     rows: List[Dict[str, Any]]
 
 
+class TableOperation(BaseModel):
+    op: Literal["set", "insert", "delete"]
+    row: Optional[int] = Field(None, ge=0)  # row index; insert appends when omitted
+    values: Dict[str, Any] = Field(default_factory=dict)
+
+    @model_validator(mode="after")
+    def require_row(self):
+        if self.op != "insert" and self.row is None:
+            raise ValueError(f"'{self.op}' operations require a row index")
+        return self
+
+
+class TablePatch(BaseModel):
+    operations: List[TableOperation] = Field(..., min_length=1)
+
+
+class TableRow(BaseModel):
+    row: int  # index to address the row in TableOperation
+    values: Dict[str, Any]
+
+
+class IdfTablePage(BaseModel):
+    columns: List[TableColumn]
+    rows: List[TableRow]
+    total: Optional[int] = None  # not counted on cursor pages
+
+
+class PortMatch(BaseModel):
+    code: str  # IDF code
+    title: str = ""
+    row: int
+    values: Dict[str, Any]
+
+
 class HealthCounts(BaseModel):
     ok: int
     revision: int
@@ -37,6 +74,30 @@ class IdfHealth(BaseModel):
     counts: HealthCounts
 
 
+class LevelCounts(BaseModel):
+    green: int = 0
+    yellow: int = 0
+    red: int = 0
+    gray: int = 0
+
+
+class HealthRollup(BaseModel):
+    idfs: int = 0
+    levels: LevelCounts = Field(default_factory=LevelCounts)
+    ports: HealthCounts = Field(
+        default_factory=lambda: HealthCounts(ok=0, revision=0, falla=0, libre=0, reservado=0)
+    )
+
+
+class SiteRollup(HealthRollup):
+    site: str
+
+
+class ProjectRollup(HealthRollup):
+    project: str
+    sites: List[SiteRollup] = Field(default_factory=list)
+
+
 class IdfIndex(BaseModel):
     cluster: str
     project: str
@@ -60,7 +121,7 @@ class IdfPublic(BaseModel):
     images: List[Union[str, MediaItem]] = Field(default_factory=list)
     documents: List[Union[str, MediaItem]] = Field(default_factory=list)
     diagrams: List[Union[str, MediaItem]] = Field(default_factory=list)
-    location: Optional[Union[str, List[Union[str, MediaItem]]]] = None
+    location: Optional[Union[str, MediaItem, List[Union[str, MediaItem]]]] = None
     dfo: List[Union[str, MediaItem]] = Field(default_factory=list)
     logo: Optional[str] = None
     table: Optional[IdfTable] = None
@@ -75,7 +136,7 @@ class IdfUpsert(BaseModel):
     images: Optional[List[Union[str, MediaItem]]] = None
     documents: Optional[List[Union[str, MediaItem]]] = None
     diagrams: Optional[List[Union[str, MediaItem]]] = None
-    location: Optional[Union[str, List[Union[str, MediaItem]]]] = None
+    location: Optional[Union[str, MediaItem, List[Union[str, MediaItem]]]] = None
     dfo: Optional[List[Union[str, MediaItem]]] = None
     logo: Optional[str] = None
     table: Optional[IdfTable] = None
@@ -94,4 +155,8 @@ class Device(BaseModel):
     serial: Optional[str] = None
     rack: Optional[str] = None
     site: Optional[str] = None
-    notes: Optional[str] = None
\ No newline at end of file
+    notes: Optional[str] = None
+
+
+class DeviceRecord(Device):
+    id: int
@@ -19,6 +19,19 @@ class UserCreate(BaseModel):
         return v.lower()
 
 
+class UserUpdate(BaseModel):
+    full_name: Optional[str] = None
+    role: Optional[str] = None
+    is_active: Optional[bool] = None
+
+    @field_validator('role')
+    @classmethod
+    def validate_role(cls, v):
+        if v is not None and v not in ("admin", "visitor"):
+            raise ValueError('Role must be admin or visitor')
+        return v
+
+
 class UserPublic(BaseModel):
     id: int
     email: str
@@ -7,8 +7,29 @@ from typing import Any, Dict, Optional, List
 from fastapi import APIRouter, Depends, HTTPException
 
 from app.core.config import settings
+from app.core.health import HEALTH_COLUMNS, health_columns_for_table, health_from_columns
+from app.core.media import MEDIA_COLUMNS, MEDIA_VERSION, canonical_media, media_bind_values
+from app.core.response_cache import invalidate_responses
+from app.core.storage import (
+    MEDIA_FIELDS,
+    media_paths,
+    release_assets,
+    retain_assets,
+    sync_asset_references,
+)
 from app.db.database import database
-from app.models.idf_models import IdfCreate, IdfPublic, IdfUpsert
+from app.db.ports import (
+    delete_port,
+    insert_port,
+    load_table,
+    migrate_idf_ports,
+    refresh_health,
+    replace_ports,
+    table_definition,
+    update_port,
+)
+from app.db.rollup import schedule_rollup_refresh
+from app.models.idf_models import IdfCreate, IdfHealth, IdfPublic, IdfUpsert, TablePatch
 from app.routers.auth import get_current_admin
 
 router = APIRouter(tags=["admin"])
@@ -46,51 +67,26 @@ def map_url_project_to_db_project(project: str) -> str:
 
 
 def _serialize_table(table: Optional[Any]) -> Optional[str]:
+    # Rows are stored in idf_ports; table_data only keeps the column definitions
     if not table:
         return None
-    return json.dumps(table.model_dump())
-
-
-def _serialize_media_list(items: Any) -> str:
-    """Convert media items to JSON, handling both string and object formats."""
-    if not items:
-        return json.dumps([])
-
-    serialized_items = []
-    for item in items:
-        if isinstance(item, str):
-            serialized_items.append(item)
-        elif hasattr(item, 'model_dump'):
-            serialized_items.append(item.model_dump())
-        elif isinstance(item, dict):
-            serialized_items.append(item)
-        else:
-            serialized_items.append(str(item))
+    return table_definition(table.model_dump())
 
-    return json.dumps(serialized_items)
 
+def _table_rows(table: Optional[Any]) -> List[Dict[str, Any]]:
+    return list(table.rows) if table else []
 
-def _prepare_common_values(data: IdfUpsert) -> Dict[str, Any]:
-    # Handle location - keep as JSON string if it's a list, or convert to JSON
-    location_value = None
-    if data.location:
-        if isinstance(data.location, list):
-            location_value = _serialize_media_list(data.location)
-        else:
-            location_value = json.dumps([data.location])
 
+def _prepare_common_values(data: IdfUpsert) -> Dict[str, Any]:
     return {
         "title": data.title,
         "description": data.description,
         "site": data.site,
         "room": data.room,
-        "images": _serialize_media_list(data.images),
-        "documents": _serialize_media_list(data.documents),
-        "diagrams": _serialize_media_list(data.diagrams),
-        "location": location_value,
-        "dfo": _serialize_media_list(data.dfo),
-        "logo": data.logo,
+        **media_bind_values({field: getattr(data, field) for field in MEDIA_COLUMNS}),
+        "media_version": MEDIA_VERSION,
         "table_data": _serialize_table(data.table),
+        **health_columns_for_table(data.table.model_dump() if data.table else None),
     }
 
 
@@ -108,21 +104,8 @@ def _load_json(value: Any) -> Any:
     return value
 
 
-def _load_media_list(value: Any) -> List[Any]:
-    """Load and normalize media list, handling both string and object formats."""
-    loaded = _load_json(value)
-    if not loaded:
-        return []
-
-    if not isinstance(loaded, list):
-        return []
-
-    return loaded
-
-
-def _row_to_idf_public(row: Dict[str, Any]) -> IdfPublic:
-    table_data = _load_json(row.get("table_data"))
-    location_data = _load_json(row.get("location"))
+def _row_to_idf_public(row: Dict[str, Any], table_data: Optional[Dict[str, Any]]) -> IdfPublic:
+    media = canonical_media(row)
 
     return IdfPublic(
         cluster=row["cluster"],
@@ -132,16 +115,27 @@ def _row_to_idf_public(row: Dict[str, Any]) -> IdfPublic:
         description=row.get("description"),
         site=row.get("site"),
         room=row.get("room"),
-        images=_load_media_list(row.get("images")),
-        documents=_load_media_list(row.get("documents")),
-        diagrams=_load_media_list(row.get("diagrams")),
-        location=location_data,
-        dfo=_load_media_list(row.get("dfo")),
-        logo=row.get("logo"),
+        images=media.get("images", []),
+        documents=media.get("documents", []),
+        diagrams=media.get("diagrams", []),
+        location=media.get("location"),
+        dfo=media.get("dfo", []),
+        logo=media.get("logo"),
         table=table_data if isinstance(table_data, dict) else None,
+        health=health_from_columns(row),
     )
 
 
+async def _insert_idf(query: str, values: Dict[str, Any], table: Optional[Any]) -> IdfPublic:
+    async with database.transaction():
+        row = await database.fetch_one(query, values)
+        await replace_ports(row["id"], _table_rows(table))
+    schedule_rollup_refresh()
+    await invalidate_responses(values["cluster"], values["project"])
+    await retain_assets(path for field in MEDIA_FIELDS for path in media_paths(values[field]))
+    return _row_to_idf_public(dict(row), table.model_dump() if table else None)
+
+
 async def _fetch_idf(cluster: str, project: str, code: str) -> Dict[str, Any]:
     row = await database.fetch_one(
         "SELECT * FROM idfs WHERE cluster = :cluster AND project = :project AND code = :code",
@@ -184,15 +178,18 @@ async def create_idf_with_code(
     query = """
         INSERT INTO idfs (
             cluster, project, code, title, description, site, room,
-            images, documents, diagrams, location, dfo, logo, table_data
+            images, documents, diagrams, location, dfo, logo, media_version, table_data,
+            health_level, health_ok, health_revision, health_falla,
+            health_libre, health_reservado
         ) VALUES (
             :cluster, :project, :code, :title, :description, :site, :room,
-            :images, :documents, :diagrams, :location, :dfo, :logo, :table_data
+            :images, :documents, :diagrams, :location, :dfo, :logo, :media_version, :table_data,
+            :health_level, :health_ok, :health_revision, :health_falla,
+            :health_libre, :health_reservado
         )
         RETURNING *
     """
-    row = await database.fetch_one(query, values)
-    return _row_to_idf_public(dict(row))
+    return await _insert_idf(query, values, idf_data.table)
 
 
 @router.post("/{cluster}/{project}/idfs", response_model=IdfPublic, status_code=201)
@@ -221,15 +218,18 @@ async def create_idf(
     query = """
         INSERT INTO idfs (
             cluster, project, code, title, description, site, room,
-            images, documents, diagrams, location, dfo, logo, table_data
+            images, documents, diagrams, location, dfo, logo, media_version, table_data,
+            health_level, health_ok, health_revision, health_falla,
+            health_libre, health_reservado
         ) VALUES (
             :cluster, :project, :code, :title, :description, :site, :room,
-            :images, :documents, :diagrams, :location, :dfo, :logo, :table_data
+            :images, :documents, :diagrams, :location, :dfo, :logo, :media_version, :table_data,
+            :health_level, :health_ok, :health_revision, :health_falla,
+            :health_libre, :health_reservado
         )
         RETURNING *
     """
-    row = await database.fetch_one(query, values)
-    return _row_to_idf_public(dict(row))
+    return await _insert_idf(query, values, idf_data.table)
 
 
 @router.put("/{cluster}/{project}/idfs/{code}", response_model=IdfPublic)
@@ -261,65 +261,25 @@ async def update_idf(
     update_data["site"] = idf_data.site
     update_data["room"] = idf_data.room
 
-    # Check if media fields are actually provided in the request
-    # If they're empty lists, it means they should be preserved, not cleared
+    # Media fields are only replaced when provided and not empty; otherwise
+    # the stored value is kept (and normalized along with the rest)
     raw_data = idf_data.model_dump()
-    
-    # Only update media fields if they are explicitly provided and not empty
-    if 'images' in raw_data and raw_data['images']:
-        update_data["images"] = _serialize_media_list(idf_data.images)
-    else:
-        update_data["images"] = current_idf["images"]  # Preserve existing
-
-    if 'documents' in raw_data and raw_data['documents']:
-        update_data["documents"] = _serialize_media_list(idf_data.documents)
-    else:
-        update_data["documents"] = current_idf["documents"]  # Preserve existing
-
-    if 'diagrams' in raw_data and raw_data['diagrams']:
-        update_data["diagrams"] = _serialize_media_list(idf_data.diagrams)
-    else:
-        update_data["diagrams"] = current_idf["diagrams"]  # Preserve existing
-
-    if 'location' in raw_data and raw_data['location']:
-        if isinstance(idf_data.location, list):
-            update_data["location"] = _serialize_media_list(idf_data.location)
-        else:
-            update_data["location"] = json.dumps([idf_data.location])
-    else:
-        update_data["location"] = current_idf["location"]  # Preserve existing
-
-    if 'table' in raw_data and raw_data['table']:
+    update_data.update(media_bind_values({
+        field: getattr(idf_data, field) if raw_data.get(field) else current_idf[field]
+        for field in MEDIA_COLUMNS
+    }))
+    update_data["media_version"] = MEDIA_VERSION
+
+    replace_table = bool(raw_data.get('table'))
+    if replace_table:
         update_data["table_data"] = _serialize_table(idf_data.table)
+        update_data.update(health_columns_for_table(raw_data["table"]))
     else:
         update_data["table_data"] = current_idf["table_data"]  # Preserve existing
-
-    # Always preserve logo unless explicitly provided
-    if 'logo' in raw_data and raw_data['logo']:
-        update_data["logo"] = idf_data.logo
-    else:
-        update_data["logo"] = current_idf["logo"]  # Preserve existing
-    
-    # Handle DFO field - only update if explicitly provided
-    if 'dfo' in raw_data and raw_data['dfo']:
-        if isinstance(idf_data.dfo, list) and len(idf_data.dfo) > 0:
-            # Handle list of DFO items
-            dfo_data = []
-            for item in idf_data.dfo:
-                if isinstance(item, dict):
-                    clean_item = {
-                        "url": item["url"] if item["url"].startswith("/static/") else f"/static/{item['url']}",
-                        "name": item.get("name", "DFO"),
-                        "kind": item.get("kind", "diagram")
-                    }
-                    dfo_data.append(clean_item)
-            update_data["dfo"] = json.dumps(dfo_data)
+        if current_idf["health_level"] is not None:
+            update_data.update({column: current_idf[column] for column in HEALTH_COLUMNS})
         else:
-            # Preserve existing DFO when not provided
-            update_data["dfo"] = current_idf["dfo"]
-    else:
-        # Preserve existing DFO data when not provided in request
-        update_data["dfo"] = current_idf["dfo"]
+            update_data.update(health_columns_for_table(await load_table(current_idf)))
 
     # Update IDF data
     params = {
@@ -341,12 +301,87 @@ async def update_idf(
                location = :location,
                dfo = :dfo,
                logo = :logo,
-               table_data = :table_data
+               media_version = :media_version,
+               table_data = :table_data,
+               health_level = :health_level,
+               health_ok = :health_ok,
+               health_revision = :health_revision,
+               health_falla = :health_falla,
+               health_libre = :health_libre,
+               health_reservado = :health_reservado
          WHERE cluster = :cluster AND project = :project AND code = :code
         RETURNING *
     """
-    row = await database.fetch_one(query, params)
-    return _row_to_idf_public(dict(row))
+    async with database.transaction():
+        row = await database.fetch_one(query, params)
+        if replace_table:
+            await replace_ports(row["id"], _table_rows(idf_data.table))
+    schedule_rollup_refresh()
+    await invalidate_responses(cluster, db_project)
+    await sync_asset_references(
+        [current_idf[field] for field in MEDIA_FIELDS],
+        [update_data[field] for field in MEDIA_FIELDS],
+    )
+    table = raw_data["table"] if replace_table else await load_table(dict(row))
+    return _row_to_idf_public(dict(row), table)
+
+
+@router.patch("/{cluster}/{project}/idfs/{code}/table", response_model=IdfHealth)
+async def patch_idf_table(
+    patch: TablePatch,
+    cluster: str = Depends(validate_cluster),
+    project: str = "",
+    code: str = "",
+    _admin: dict = Depends(get_current_admin),
+):
+    """Apply row/cell operations to the patch table and return the new health.
+
+    Operations run in order inside one transaction and only touch the affected
+    ``idf_ports`` rows: ``set`` merges ``values`` into row ``row``, ``insert``
+    adds ``values`` as a new row before ``row`` (or at the end) and ``delete``
+    removes row ``row``. Row indexes refer to the table as left by the
+    previous operation.
+    """
+    db_project = map_url_project_to_db_project(project)
+
+    async with database.transaction():
+        # Row lock serializes concurrent edits of the same table
+        idf = await database.fetch_one(
+            """
+            SELECT id, table_data FROM idfs
+             WHERE cluster = :cluster AND project = :project AND code = :code
+             FOR UPDATE
+            """,
+            {"cluster": cluster, "project": db_project, "code": code},
+        )
+        if not idf:
+            raise HTTPException(status_code=404, detail="IDF not found")
+
+        table_data = _load_json(idf["table_data"])
+        if not isinstance(table_data, dict):
+            raise HTTPException(status_code=400, detail="IDF has no table")
+        if "rows" in table_data:
+            await migrate_idf_ports([idf["id"]])
+
+        for index, operation in enumerate(patch.operations):
+            if operation.op == "insert":
+                await insert_port(idf["id"], operation.row, operation.values)
+                continue
+            if operation.op == "set":
+                found = await update_port(idf["id"], operation.row, operation.values)
+            else:
+                found = await delete_port(idf["id"], operation.row)
+            if not found:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Operation {index}: row {operation.row} not found",
+                )
+
+        health = await refresh_health(idf["id"])
+
+    schedule_rollup_refresh()
+    await invalidate_responses(cluster, db_project)
+    return health
 
 
 @router.delete("/{cluster}/{project}/idfs/{code}")
@@ -357,12 +392,20 @@ async def delete_idf(
     _admin: dict = Depends(get_current_admin),
 ):
     db_project = map_url_project_to_db_project(project)
-    result = await database.execute(
-        "DELETE FROM idfs WHERE cluster = :cluster AND project = :project AND code = :code",
+    deleted = await database.fetch_one(
+        """
+        DELETE FROM idfs
+         WHERE cluster = :cluster AND project = :project AND code = :code
+        RETURNING images, documents, diagrams, location, dfo, logo
+        """,
         {"cluster": cluster, "project": db_project, "code": code},
     )
-    if result == 0:
+    if deleted is None:
         raise HTTPException(status_code=404, detail="IDF not found")
+
+    schedule_rollup_refresh()
+    await invalidate_responses(cluster, db_project)
+    await release_assets(path for field in MEDIA_FIELDS for path in media_paths(deleted[field]))
     return {"message": "IDF deleted successfully"}
 
 
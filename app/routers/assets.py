@@ -1,14 +1,16 @@
 """Asset management endpoints for media associated with IDFs."""
 from __future__ import annotations
 
-import json
-import time
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
 
 from app.core.config import settings
+from app.core.imaging import generate_variants
+from app.core.media import media_json, normalize_media_list
+from app.core.response_cache import invalidate_responses
+from app.core.storage import media_paths, release_assets, store_upload
 from app.db.database import database
 from app.routers.auth import get_current_admin, get_current_user
 
@@ -44,17 +46,6 @@ def map_url_project_to_db_project(project: str) -> str:
     return project_mapping.get(decoded_project, decoded_project)
 
 
-def map_db_project_to_folder_name(db_project_name: str) -> str:
-    folder_name_mapping = {
-        "Sabinas Project": "sabinas",
-        "Trinity": "trinity", 
-        "Monclova Project": "monclova",
-    }
-    return folder_name_mapping.get(
-        db_project_name, db_project_name.lower().replace(" ", "-")
-    )
-
-
 async def _get_idf(cluster: str, project: str, code: str) -> dict:
     row = await database.fetch_one(
         """
@@ -69,11 +60,28 @@ async def _get_idf(cluster: str, project: str, code: str) -> dict:
     return dict(row)
 
 
-async def _write_upload(file: UploadFile, destination: Path) -> str:
-    destination.parent.mkdir(parents=True, exist_ok=True)
-    content = await file.read()
-    destination.write_bytes(content)
-    return str(destination.relative_to(STATIC_ROOT))
+async def _store_uploads(uploads: List[Tuple[UploadFile, str]]) -> List[str]:
+    """Store ``(file, extension)`` pairs, releasing earlier ones if one fails."""
+    stored: List[str] = []
+    try:
+        for file, extension in uploads:
+            stored.append(await store_upload(file, extension))
+    except BaseException:
+        await release_assets(stored)
+        raise
+    return stored
+
+
+async def _with_variants(item: dict, relative_path: str) -> dict:
+    """Attach thumbnail/medium WebP derivatives to an image media item."""
+    try:
+        variants = await generate_variants(relative_path)
+    except Exception as exc:  # derivatives are an optimization, never fail the upload
+        print(f"Could not generate variants for {relative_path}: {exc}")
+        variants = {}
+    if variants:
+        item["variants"] = variants
+    return item
 
 
 # ---------------------------------------------------------------------------
@@ -89,38 +97,33 @@ async def upload_images(
     _admin: dict = Depends(get_current_admin),
 ):
     db_project = map_url_project_to_db_project(project)
-    folder_project = map_db_project_to_folder_name(db_project)
 
     idf = await _get_idf(cluster, db_project, code)
-    current_images = idf.get("images") or []
-
-    # Handle case where images might be stored as JSON string
-    if isinstance(current_images, str):
-        try:
-            current_images = json.loads(current_images)
-        except json.JSONDecodeError:
-            current_images = []
-    elif current_images is None:
-        current_images = []
+    current_images = normalize_media_list(idf.get("images"), "images")
 
-    new_paths = []
     for file in files:
         if not file.content_type or not file.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail="All files must be images")
 
-        extension = Path(file.filename or "image.jpg").suffix or ".jpg"
-        filename = f"{int(time.time() * 1000)}{extension}"
-        file_path = STATIC_ROOT / cluster / folder_project / code / "images" / filename
+    stored_paths = await _store_uploads(
+        [(file, Path(file.filename or "image.jpg").suffix or ".jpg") for file in files]
+    )
 
-        relative_path = await _write_upload(file, file_path)
-        new_paths.append(relative_path)
+    new_paths = []
+    for file, relative_path in zip(files, stored_paths):
+        new_paths.append(await _with_variants({
+            "url": f"/static/{relative_path}",
+            "name": file.filename or Path(relative_path).name,
+            "kind": "image"
+        }, relative_path))
 
     updated_images = current_images + new_paths
 
     await database.execute(
         "UPDATE idfs SET images = :images WHERE cluster = :cluster AND project = :project AND code = :code",
-        {"images": json.dumps(updated_images), "cluster": cluster, "project": db_project, "code": code},
+        {"images": media_json(updated_images, "images"), "cluster": cluster, "project": db_project, "code": code},
     )
+    await invalidate_responses(cluster, db_project)
 
     return {"paths": new_paths, "message": f"Uploaded {len(files)} images successfully"}
 
@@ -134,24 +137,13 @@ async def upload_documents(
     _admin: dict = Depends(get_current_admin),
 ):
     db_project = map_url_project_to_db_project(project)
-    folder_project = map_db_project_to_folder_name(db_project)
 
     idf = await _get_idf(cluster, db_project, code)
-    current_documents = idf.get("documents") or []
+    current_documents = normalize_media_list(idf.get("documents"), "documents")
 
-    # Handle case where documents might be stored as JSON string
-    if isinstance(current_documents, str):
-        try:
-            current_documents = json.loads(current_documents)
-        except json.JSONDecodeError:
-            current_documents = []
-    elif current_documents is None:
-        current_documents = []
-
-    new_documents = []
+    # Validate file types
+    allowed_extensions = ['.pdf', '.doc', '.docx', '.xls', '.xlsx', '.zip', '.rar']
     for file in files:
-        # Validate file types
-        allowed_extensions = ['.pdf', '.doc', '.docx', '.xls', '.xlsx', '.zip', '.rar']
         file_extension = Path(file.filename or "").suffix.lower()
 
         if file_extension not in allowed_extensions:
@@ -160,11 +152,13 @@ async def upload_documents(
                 detail=f"File {file.filename} has unsupported extension. Allowed: {', '.join(allowed_extensions)}"
             )
 
-        timestamp = int(time.time() * 1000)
-        filename = f"{timestamp}{file_extension}"
-        file_path = STATIC_ROOT / cluster / folder_project / code / "documents" / filename
+    stored_paths = await _store_uploads(
+        [(file, Path(file.filename or "").suffix.lower()) for file in files]
+    )
 
-        relative_path = await _write_upload(file, file_path)
+    new_documents = []
+    for file, relative_path in zip(files, stored_paths):
+        file_extension = Path(file.filename or "").suffix.lower()
 
         # Create document object with metadata
         new_documents.append({
@@ -178,8 +172,9 @@ async def upload_documents(
 
     await database.execute(
         "UPDATE idfs SET documents = :documents WHERE cluster = :cluster AND project = :project AND code = :code",
-        {"documents": json.dumps(updated_documents), "cluster": cluster, "project": db_project, "code": code},
+        {"documents": media_json(updated_documents, "documents"), "cluster": cluster, "project": db_project, "code": code},
     )
+    await invalidate_responses(cluster, db_project)
 
     return {"documents": new_documents, "message": f"Uploaded {len(files)} documents successfully"}
 
@@ -193,46 +188,36 @@ async def upload_diagrams(
     _admin: dict = Depends(get_current_admin),
 ):
     db_project = map_url_project_to_db_project(project)
-    folder_project = map_db_project_to_folder_name(db_project)
 
     idf = await _get_idf(cluster, db_project, code)
-    current_diagrams = idf.get("diagrams") or []
-
-    # Handle case where diagrams might be stored as JSON string
-    if isinstance(current_diagrams, str):
-        try:
-            current_diagrams = json.loads(current_diagrams)
-        except json.JSONDecodeError:
-            current_diagrams = []
-    elif current_diagrams is None:
-        current_diagrams = []
+    current_diagrams = normalize_media_list(idf.get("diagrams"), "diagrams")
 
-    new_paths = []
     for file in files:
         # Allow both images and PDFs for diagrams
         if not file.content_type or not (file.content_type.startswith("image/") or file.content_type == "application/pdf"):
             raise HTTPException(status_code=400, detail=f"File {file.filename} must be an image or PDF")
 
-        extension = Path(file.filename or "diagram.png").suffix or ".png"
-        filename = f"{int(time.time() * 1000)}{extension}"
-        file_path = STATIC_ROOT / cluster / folder_project / code / "diagrams" / filename
-
-        relative_path = await _write_upload(file, file_path)
+    stored_paths = await _store_uploads(
+        [(file, Path(file.filename or "diagram.png").suffix or ".png") for file in files]
+    )
 
+    new_paths = []
+    for relative_path in stored_paths:
         # Create media item object
         media_item = {
             "url": f"/static/{relative_path}",
             "name": f"Diagram {len(current_diagrams) + len(new_paths) + 1}",
             "kind": "diagram"
         }
-        new_paths.append(media_item)
+        new_paths.append(await _with_variants(media_item, relative_path))
 
     updated_diagrams = current_diagrams + new_paths
 
     await database.execute(
         "UPDATE idfs SET diagrams = :diagrams WHERE cluster = :cluster AND project = :project AND code = :code",
-        {"diagrams": json.dumps(updated_diagrams), "cluster": cluster, "project": db_project, "code": code},
+        {"diagrams": media_json(updated_diagrams, "diagrams"), "cluster": cluster, "project": db_project, "code": code},
     )
+    await invalidate_responses(cluster, db_project)
 
     return {"paths": new_paths, "message": f"Uploaded {len(files)} diagrams successfully"}
 
@@ -246,59 +231,37 @@ async def upload_dfo(
     _admin: dict = Depends(get_current_admin),
 ):
     db_project = map_url_project_to_db_project(project)
-    folder_project = map_db_project_to_folder_name(db_project)
 
-    uploaded_files = []
+    # Get current DFO to append to it, instead of overwriting
+    idf = await _get_idf(cluster, db_project, code)
+
     for file in files:
         # Allow both images and PDFs for DFO
         if not file.content_type or not (file.content_type.startswith("image/") or file.content_type == "application/pdf"):
             raise HTTPException(status_code=400, detail=f"File {file.filename} must be an image or PDF")
 
-        timestamp = int(time.time() * 1000)
-        extension = Path(file.filename or "dfo.png").suffix or ".png"
-        filename = f"{timestamp}{extension}"
-        file_path = STATIC_ROOT / cluster / folder_project / code / "dfo" / filename
-
-        relative_path = await _write_upload(file, file_path)
+    stored_paths = await _store_uploads(
+        [(file, Path(file.filename or "dfo.png").suffix or ".png") for file in files]
+    )
 
+    uploaded_files = []
+    for file, relative_path in zip(files, stored_paths):
         # Generate clean relative URL without absolute domain
-        uploaded_files.append({
-            "url": f"/static/{cluster}/{folder_project}/{code}/dfo/{filename}",
+        uploaded_files.append(await _with_variants({
+            "url": f"/static/{relative_path}",
             "name": file.filename or "DFO",
             "kind": "diagram" if file.content_type and file.content_type.startswith("image/") else "document"
-        })
+        }, relative_path))
 
-    # Get current DFO to append to it, instead of overwriting
-    idf = await _get_idf(cluster, db_project, code)
-    current_dfo = idf.get("dfo") or []
-    if isinstance(current_dfo, str):
-        try:
-            current_dfo = json.loads(current_dfo)
-        except json.JSONDecodeError:
-            current_dfo = []
-
-    # Ensure current_dfo contains only clean objects
-    clean_current_dfo = []
-    for item in current_dfo:
-        if isinstance(item, dict) and "url" in item:
-            # Clean up any existing malformed URLs
-            url = item["url"]
-            if url.startswith("/static/") and not ("{'url':" in url or "replit.dev" in url):
-                clean_current_dfo.append(item)
-        elif isinstance(item, str) and item.startswith("/static/"):
-            clean_current_dfo.append({
-                "url": item,
-                "name": "DFO",
-                "kind": "diagram"
-            })
-
-    updated_dfo = clean_current_dfo + uploaded_files
+    # The normalizer also repairs malformed URLs left by older uploads
+    updated_dfo = normalize_media_list(idf.get("dfo"), "dfo") + uploaded_files
 
     # Update database
     result = await database.execute(
         "UPDATE idfs SET dfo = :dfo WHERE cluster = :cluster AND project = :project AND code = :code",
-        {"dfo": json.dumps(updated_dfo), "cluster": cluster, "project": db_project, "code": code},
+        {"dfo": media_json(updated_dfo, "dfo"), "cluster": cluster, "project": db_project, "code": code},
     )
+    await invalidate_responses(cluster, db_project)
 
     return {"uploaded": uploaded_files, "count": len(uploaded_files)}
 
@@ -316,28 +279,32 @@ async def upload_location(
     _admin: dict = Depends(get_current_admin),
 ):
     db_project = map_url_project_to_db_project(project)
-    folder_project = map_db_project_to_folder_name(db_project)
 
     if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File must be an image")
 
-    extension = Path(file.filename or "location.jpg").suffix or ".jpg"
-    filename = f"location{extension}"
-    file_path = STATIC_ROOT / cluster / folder_project / code / "location" / filename
+    idf = await _get_idf(cluster, db_project, code)
 
-    relative_path = await _write_upload(file, file_path)
+    extension = Path(file.filename or "location.jpg").suffix or ".jpg"
+    relative_path = await store_upload(file, extension)
 
-    # Ensure we're using the correct format - just the relative path without /static/ prefix
-    clean_relative_path = relative_path.replace("static/", "") if relative_path.startswith("static/") else relative_path
+    location_item = await _with_variants({
+        "url": f"/static/{relative_path}",
+        "name": "Location Image",
+        "kind": "image"
+    }, relative_path)
 
     # Location is stored as JSONB, so we need to store it as JSON string
-    import json
     await database.execute(
         "UPDATE idfs SET location = :location WHERE cluster = :cluster AND project = :project AND code = :code",
-        {"location": json.dumps(clean_relative_path), "cluster": cluster, "project": db_project, "code": code},
+        {"location": media_json(location_item, "location"), "cluster": cluster, "project": db_project, "code": code},
     )
+    await invalidate_responses(cluster, db_project)
 
-    return {"path": relative_path, "message": "Location image uploaded successfully"}
+    # The previous location image is replaced, drop its reference
+    await release_assets(media_paths(idf.get("location")))
+
+    return {"path": relative_path, "location": location_item, "message": "Location image uploaded successfully"}
 
 
 @router.post("/{cluster}/{project}/assets/{code}/logo")
@@ -349,22 +316,24 @@ async def upload_logo(
     _admin: dict = Depends(get_current_admin),
 ):
     db_project = map_url_project_to_db_project(project)
-    folder_project = map_db_project_to_folder_name(db_project)
 
     if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File must be an image")
 
-    extension = Path(file.filename or "logo.png").suffix or ".png"
-    filename = f"logo{extension}"
-    file_path = STATIC_ROOT / cluster / folder_project / code / "logo" / filename
+    idf = await _get_idf(cluster, db_project, code)
 
-    relative_path = await _write_upload(file, file_path)
+    extension = Path(file.filename or "logo.png").suffix or ".png"
+    relative_path = await store_upload(file, extension)
 
     # Update database with the relative path
     result = await database.execute(
         "UPDATE idfs SET logo = :logo WHERE cluster = :cluster AND project = :project AND code = :code",
         {"logo": relative_path, "cluster": cluster, "project": db_project, "code": code},
     )
+    await invalidate_responses(cluster, db_project)
+
+    # The previous logo is replaced, drop its reference
+    await release_assets(media_paths(idf.get("logo")))
 
     # Verify the update happened
     updated_idf = await database.fetch_one(
@@ -410,6 +379,7 @@ async def get_idf_logo(
             "UPDATE idfs SET logo = NULL WHERE cluster = :cluster AND project = :project AND code = :code",
             {"cluster": cluster, "project": db_project, "code": code},
         )
+        await invalidate_responses(cluster, db_project)
         raise HTTPException(status_code=404, detail="Logo file not found")
 
     return {
@@ -432,32 +402,21 @@ async def delete_image(
 ):
     db_project = map_url_project_to_db_project(project)
     idf = await _get_idf(cluster, db_project, code)
-    images = idf.get("images") or []
-
-    # Handle case where images might be stored as JSON string
-    if isinstance(images, str):
-        try:
-            images = json.loads(images)
-        except json.JSONDecodeError:
-            images = []
-    elif images is None:
-        images = []
+    images = normalize_media_list(idf.get("images"), "images")
 
     if index < 0 or index >= len(images):
         raise HTTPException(status_code=404, detail="Image not found")
 
     removed_path = images.pop(index)
 
-    # Remove file from filesystem
-    try:
-        (STATIC_ROOT / removed_path).unlink(missing_ok=True)
-    except OSError:
-        pass
-
     await database.execute(
         "UPDATE idfs SET images = :images WHERE cluster = :cluster AND project = :project AND code = :code",
-        {"images": json.dumps(images), "cluster": cluster, "project": db_project, "code": code},
+        {"images": media_json(images, "images"), "cluster": cluster, "project": db_project, "code": code},
     )
+    await invalidate_responses(cluster, db_project)
+
+    # Remove file from filesystem once no IDF references it
+    await release_assets(media_paths(removed_path))
 
     return {"message": "Image deleted", "path": removed_path}
 
@@ -474,16 +433,7 @@ async def update_document_title(
     """Update only the title of a specific document without affecting other properties"""
     db_project = map_url_project_to_db_project(project)
     idf = await _get_idf(cluster, db_project, code)
-    documents = idf.get("documents") or []
-
-    # Handle case where documents might be stored as JSON string
-    if isinstance(documents, str):
-        try:
-            documents = json.loads(documents)
-        except json.JSONDecodeError:
-            documents = []
-    elif documents is None:
-        documents = []
+    documents = normalize_media_list(idf.get("documents"), "documents")
 
     if index < 0 or index >= len(documents):
         raise HTTPException(status_code=404, detail="Document not found")
@@ -503,8 +453,9 @@ async def update_document_title(
     # Update only the documents field in database
     await database.execute(
         "UPDATE idfs SET documents = :documents WHERE cluster = :cluster AND project = :project AND code = :code",
-        {"documents": json.dumps(documents), "cluster": cluster, "project": db_project, "code": code},
+        {"documents": media_json(documents, "documents"), "cluster": cluster, "project": db_project, "code": code},
     )
+    await invalidate_responses(cluster, db_project)
 
     return {"message": "Document title updated", "title": title, "index": index}
 
@@ -519,16 +470,7 @@ async def delete_document(
 ):
     db_project = map_url_project_to_db_project(project)
     idf = await _get_idf(cluster, db_project, code)
-    documents = idf.get("documents") or []
-
-    # Handle case where documents might be stored as JSON string
-    if isinstance(documents, str):
-        try:
-            documents = json.loads(documents)
-        except json.JSONDecodeError:
-            documents = []
-    elif documents is None:
-        documents = []
+    documents = normalize_media_list(idf.get("documents"), "documents")
 
     if index < 0 or index >= len(documents):
         raise HTTPException(status_code=404, detail="Document not found")
@@ -543,16 +485,14 @@ async def delete_document(
         removed_path = removed_item
         removed_title = "Document"
 
-    # Remove file from filesystem
-    try:
-        (STATIC_ROOT / removed_path).unlink(missing_ok=True)
-    except OSError:
-        pass
-
     await database.execute(
         "UPDATE idfs SET documents = :documents WHERE cluster = :cluster AND project = :project AND code = :code",
-        {"documents": json.dumps(documents), "cluster": cluster, "project": db_project, "code": code},
+        {"documents": media_json(documents, "documents"), "cluster": cluster, "project": db_project, "code": code},
     )
+    await invalidate_responses(cluster, db_project)
+
+    # Remove file from filesystem once no IDF references it
+    await release_assets(media_paths(removed_path))
 
     return {"message": "Document deleted", "path": removed_path, "title": removed_title}
 
@@ -567,16 +507,7 @@ async def delete_diagram(
 ):
     db_project = map_url_project_to_db_project(project)
     idf = await _get_idf(cluster, db_project, code)
-    diagrams = idf.get("diagrams") or []
-
-    # Handle case where diagrams might be stored as JSON string
-    if isinstance(diagrams, str):
-        try:
-            diagrams = json.loads(diagrams)
-        except json.JSONDecodeError:
-            diagrams = []
-    elif diagrams is None:
-        diagrams = []
+    diagrams = normalize_media_list(idf.get("diagrams"), "diagrams")
 
     if index < 0 or index >= len(diagrams):
         raise HTTPException(status_code=404, detail="Diagram not found")
@@ -589,16 +520,14 @@ async def delete_diagram(
     else:
         removed_path = removed_item
 
-    # Remove file from filesystem
-    try:
-        (STATIC_ROOT / removed_path).unlink(missing_ok=True)
-    except OSError:
-        pass
-
     await database.execute(
         "UPDATE idfs SET diagrams = :diagrams WHERE cluster = :cluster AND project = :project AND code = :code",
-        {"diagrams": json.dumps(diagrams), "cluster": cluster, "project": db_project, "code": code},
+        {"diagrams": media_json(diagrams, "diagrams"), "cluster": cluster, "project": db_project, "code": code},
     )
+    await invalidate_responses(cluster, db_project)
+
+    # Remove file from filesystem once no IDF references it
+    await release_assets(media_paths(removed_path))
 
     return {"message": "Diagram deleted", "path": removed_path}
 
@@ -613,16 +542,7 @@ async def delete_dfo(
 ):
     db_project = map_url_project_to_db_project(project)
     idf = await _get_idf(cluster, db_project, code)
-    dfo = idf.get("dfo") or []
-
-    # Handle case where dfo might be stored as JSON string
-    if isinstance(dfo, str):
-        try:
-            dfo = json.loads(dfo)
-        except json.JSONDecodeError:
-            dfo = []
-    elif dfo is None:
-        dfo = []
+    dfo = normalize_media_list(idf.get("dfo"), "dfo")
 
     if index < 0 or index >= len(dfo):
         raise HTTPException(status_code=404, detail="DFO file not found")
@@ -635,16 +555,14 @@ async def delete_dfo(
     else:
         removed_path = removed_item
 
-    # Remove file from filesystem
-    try:
-        (STATIC_ROOT / removed_path).unlink(missing_ok=True)
-    except OSError:
-        pass
-
     await database.execute(
         "UPDATE idfs SET dfo = :dfo WHERE cluster = :cluster AND project = :project AND code = :code",
-        {"dfo": json.dumps(dfo), "cluster": cluster, "project": db_project, "code": code},
+        {"dfo": media_json(dfo, "dfo"), "cluster": cluster, "project": db_project, "code": code},
     )
+    await invalidate_responses(cluster, db_project)
+
+    # Remove file from filesystem once no IDF references it
+    await release_assets(media_paths(removed_path))
 
     return {"message": "DFO file deleted", "path": removed_path}
 
@@ -668,16 +586,14 @@ async def delete_location(
     if index != 0:
         raise HTTPException(status_code=404, detail="Location image not found")
 
-    # Remove file from filesystem
-    try:
-        (STATIC_ROOT / location).unlink(missing_ok=True)
-    except OSError:
-        pass
-
     await database.execute(
         "UPDATE idfs SET location = :location WHERE cluster = :cluster AND project = :project AND code = :code",
         {"location": None, "cluster": cluster, "project": db_project, "code": code},
     )
+    await invalidate_responses(cluster, db_project)
+
+    # Remove file from filesystem once no IDF references it
+    await release_assets(media_paths(location))
 
     return {"message": "Location image deleted", "path": location}
 
@@ -696,16 +612,14 @@ async def delete_logo(
     if not logo:
         raise HTTPException(status_code=404, detail="Logo not found")
 
-    # Remove file from filesystem
-    try:
-        (STATIC_ROOT / logo).unlink(missing_ok=True)
-    except OSError:
-        pass
-
     await database.execute(
         "UPDATE idfs SET logo = NULL WHERE cluster = :cluster AND project = :project AND code = :code",
         {"cluster": cluster, "project": db_project, "code": code},
     )
+    await invalidate_responses(cluster, db_project)
+
+    # Remove file from filesystem once no IDF references it
+    await release_assets(media_paths(logo))
 
     return {"message": "Logo deleted", "path": logo}
 
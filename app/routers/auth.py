@@ -3,14 +3,41 @@ from fastapi.security import HTTPBearer
 from typing import Optional
 from datetime import timedelta
 import json
-from app.models.user_models import UserLogin, UserPublic, TokenPayload, UserCreate
-from app.core.security import verify_password, create_access_token, decode_access_token, hash_password
+from app.models.user_models import UserLogin, UserPublic, TokenPayload, UserCreate, UserUpdate
+from app.core.cache import TTLCache
+from app.core.security import (
+    create_access_token,
+    decode_access_token,
+    hash_password_async,
+    password_pool_stats,
+    verify_password_async,
+)
+from app.db.cache_events import on_cache_event, publish_cache_event
 from app.db.database import database
 from app.core.config import settings
 
 router = APIRouter(tags=["auth"])
 security = HTTPBearer(auto_error=False)
 
+# Active users keyed by id; the JWT is still decoded (and expiry checked) on
+# every request, only the users lookup is skipped on a hit.
+user_cache = TTLCache(
+    maxsize=settings.USER_CACHE_MAX_SIZE,
+    ttl=settings.USER_CACHE_TTL_SECONDS,
+)
+
+
+def invalidate_cached_user(user_id: Optional[int] = None) -> None:
+    """Drop a user (or every user when ``user_id`` is None) from the cache."""
+    if user_id is None:
+        user_cache.clear()
+    else:
+        user_cache.pop(int(user_id))
+
+
+# Users changed by another worker
+on_cache_event("users", invalidate_cached_user)
+
 
 async def get_current_user_from_token(token: str) -> Optional[dict]:
     """Get current user from JWT token"""
@@ -22,6 +49,10 @@ async def get_current_user_from_token(token: str) -> Optional[dict]:
     if user_id is None:
         return None
 
+    cached = user_cache.get(int(user_id))
+    if cached is not None:
+        return dict(cached)
+
     user = await database.fetch_one(
         "SELECT id, email, full_name, role, is_active, created_at, last_login_at FROM users WHERE id = :id AND is_active = true",
         {"id": int(user_id)}
@@ -30,6 +61,7 @@ async def get_current_user_from_token(token: str) -> Optional[dict]:
     if user is None:
         return None
 
+    user_cache.set(int(user_id), dict(user))
     return dict(user)
 
 
@@ -70,7 +102,7 @@ async def login(user_data: UserLogin, response: Response):
         print(f"Database error during login: {e}")
         raise HTTPException(status_code=500, detail="Database error")
 
-    if not user or not verify_password(user_data.password, user["password_hash"]):
+    if not user or not await verify_password_async(user_data.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     if not user["is_active"]:
@@ -81,6 +113,7 @@ async def login(user_data: UserLogin, response: Response):
         "UPDATE users SET last_login_at = NOW() WHERE id = :id",
         {"id": user["id"]}
     )
+    invalidate_cached_user(user["id"])
 
     # Create access token
     access_token = create_access_token(
@@ -136,7 +169,7 @@ async def register_user(
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Hash password
-    password_hash = hash_password(user_data.password)
+    password_hash = await hash_password_async(user_data.password)
     
     # Create user
     user_id = await database.fetch_val(
@@ -153,10 +186,52 @@ async def register_user(
         }
     )
     
+    invalidate_cached_user(user_id)
+    await publish_cache_event("users", user_id)
+
     # Fetch the created user
     new_user = await database.fetch_one(
         "SELECT id, email, full_name, role, is_active, created_at, last_login_at FROM users WHERE id = :id",
         {"id": user_id}
     )
     
-    return UserPublic(**dict(new_user))
\ No newline at end of file
+    return UserPublic(**dict(new_user))
+
+
+@router.patch("/auth/users/{user_id}", response_model=UserPublic)
+async def update_user(
+    user_id: int,
+    user_data: UserUpdate,
+    current_admin: dict = Depends(get_current_admin)
+):
+    """Change a user's name, role or active flag (admin only)"""
+    changes = {
+        field: value
+        for field, value in user_data.model_dump(exclude_unset=True).items()
+        if value is not None or field == "full_name"
+    }
+    if not changes:
+        raise HTTPException(status_code=400, detail="No fields to update")
+
+    assignments = ", ".join(f"{field} = :{field}" for field in changes)
+    updated_user = await database.fetch_one(
+        f"""
+        UPDATE users SET {assignments}, updated_at = NOW()
+         WHERE id = :id
+        RETURNING id, email, full_name, role, is_active, created_at, last_login_at
+        """,
+        {**changes, "id": user_id}
+    )
+
+    if updated_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    invalidate_cached_user(user_id)
+    await publish_cache_event("users", user_id)
+    return UserPublic(**dict(updated_user))
+
+
+@router.get("/auth/metrics")
+async def auth_metrics(current_admin: dict = Depends(get_current_admin)):
+    """Expose authentication cache and bcrypt pool counters (admin only)"""
+    return {"user_cache": user_cache.stats(), "password_pool": password_pool_stats()}
\ No newline at end of file
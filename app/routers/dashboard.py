@@ -0,0 +1,59 @@
+from typing import Any, Dict, List, Mapping, Optional
+
+from fastapi import APIRouter, Depends, Query
+
+from app.core.health import STATUS_KEYS
+from app.db.database import database
+from app.models.idf_models import HealthRollup, ProjectRollup, SiteRollup
+from app.routers.auth import get_current_user
+from app.routers.public_idfs import map_url_project_to_db_project, validate_cluster
+
+
+router = APIRouter(tags=["dashboard"])
+
+LEVELS = ("green", "yellow", "red", "gray")
+
+
+def _rollup_values(row: Mapping[str, Any]) -> Dict[str, Any]:
+    return {
+        "idfs": row["idfs"],
+        "levels": {level: row[level] for level in LEVELS},
+        "ports": {key: row[key] for key in STATUS_KEYS},
+    }
+
+
+def _add_rollup(total: HealthRollup, part: HealthRollup) -> None:
+    total.idfs += part.idfs
+    for level in LEVELS:
+        setattr(total.levels, level, getattr(total.levels, level) + getattr(part.levels, level))
+    for key in STATUS_KEYS:
+        setattr(total.ports, key, getattr(total.ports, key) + getattr(part.ports, key))
+
+
+@router.get("/{cluster}/health/rollup", response_model=List[ProjectRollup])
+async def get_health_rollup(
+    cluster: str = Depends(validate_cluster),
+    project: Optional[str] = Query(None, description="Only this project"),
+    _current_user: dict = Depends(get_current_user),
+):
+    """IDF health levels and port status totals per project and site.
+
+    Served from the ``idf_health_rollup`` materialized view, which is
+    refreshed a moment after IDF writes.
+    """
+    query = "SELECT * FROM idf_health_rollup WHERE cluster = :cluster"
+    params: Dict[str, Any] = {"cluster": cluster}
+    if project:
+        query += " AND project = :project"
+        params["project"] = map_url_project_to_db_project(project)
+
+    rows = await database.fetch_all(query + " ORDER BY project, site", params)
+
+    projects: Dict[str, ProjectRollup] = {}
+    for row in rows:
+        site = SiteRollup(site=row["site"], **_rollup_values(row))
+        summary = projects.setdefault(row["project"], ProjectRollup(project=row["project"]))
+        summary.sites.append(site)
+        _add_rollup(summary, site)
+
+    return list(projects.values())
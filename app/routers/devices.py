@@ -1,13 +1,18 @@
 import csv
 import io
-from typing import List
+import re
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from asyncpg.exceptions import UniqueViolationError
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Response, UploadFile
+from starlette.concurrency import run_in_threadpool
 
 from app.core.config import settings
 from app.db.database import database
-from app.models.idf_models import Device
-from app.routers.auth import get_current_admin
+from app.core.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from app.core.response_cache import invalidate_responses
+from app.models.idf_models import Device, DeviceRecord
+from app.routers.auth import get_current_admin, get_current_user
 
 
 router = APIRouter(tags=["devices"])
@@ -37,6 +42,98 @@ def map_url_project_to_db_project(project: str) -> str:
     return project_mapping.get(decoded_project, decoded_project)
 
 
+DEVICE_COLUMNS = ("cluster", "project", "idf_code", "name", "model", "serial", "rack", "site", "notes")
+
+# VARCHAR limits of the devices table
+DEVICE_FIELD_LIMITS = {"name": 255, "model": 255, "serial": 255, "rack": 255, "site": 255}
+
+# Validation errors reported back before giving up on an upload
+MAX_REPORTED_ERRORS = 100
+
+
+def _validate_device_row(
+    line: int, row: dict, errors: List[dict], serial_lines: Dict[str, int]
+) -> Optional[dict]:
+    """Normalize one CSV row, appending ``{line, field, error}`` entries on failure."""
+    if None in row:
+        errors.append({"line": line, "field": None, "error": "Row has more values than the header"})
+        return None
+
+    device = {}
+    for field in ("name", "model", "serial", "rack", "site", "notes"):
+        value = (row.get(field) or "").strip()
+        device[field] = value or None
+
+    valid = True
+    if not device["name"]:
+        errors.append({"line": line, "field": "name", "error": "Name is required"})
+        valid = False
+    for field, limit in DEVICE_FIELD_LIMITS.items():
+        if device[field] and len(device[field]) > limit:
+            errors.append({"line": line, "field": field, "error": f"Longer than {limit} characters"})
+            valid = False
+    if device["serial"]:
+        first_line = serial_lines.setdefault(device["serial"], line)
+        if first_line != line:
+            errors.append({"line": line, "field": "serial", "error": f"Duplicate of line {first_line}"})
+            valid = False
+    return device if valid else None
+
+
+def _read_batch(
+    reader: csv.DictReader, size: int, errors: List[dict], serial_lines: Dict[str, int]
+) -> Tuple[List[dict], bool]:
+    """Parse up to ``size`` valid rows; the flag is True once the file is exhausted."""
+    batch: List[dict] = []
+    try:
+        while len(batch) < size:
+            row = next(reader)
+            device = _validate_device_row(reader.line_num, row, errors, serial_lines)
+            if device is not None:
+                batch.append(device)
+    except StopIteration:
+        return batch, True
+    except (csv.Error, UnicodeDecodeError) as exc:
+        errors.append({"line": reader.line_num, "field": None, "error": f"Unreadable CSV: {exc}"})
+        return batch, True
+    return batch, False
+
+
+# "Key (cluster, serial)=(Trinity, ABC123) already exists."
+_DUPLICATE_SERIAL_RE = re.compile(r"=\([^,]*, (?P<serial>.*)\) already exists")
+
+
+def _duplicate_serial(
+    exc: UniqueViolationError, serial_lines: Optional[Dict[str, int]] = None
+) -> HTTPException:
+    """409 for a serial conflict, pointing at the CSV line when it is known."""
+    message = getattr(exc, "detail", None) or "A device with this serial already exists"
+    match = _DUPLICATE_SERIAL_RE.search(message)
+    line = (serial_lines or {}).get(match["serial"]) if match else None
+    if line is None:
+        return HTTPException(status_code=409, detail=message)
+    return HTTPException(
+        status_code=409,
+        detail={
+            "message": "CSV conflicts with existing devices; no devices were changed",
+            "errors": [{"line": line, "field": "serial", "error": message}],
+        },
+    )
+
+
+async def _copy_devices(connection, records: List[tuple]) -> None:
+    # asyncpg's binary COPY; other drivers fall back to a single executemany
+    raw = connection.raw_connection
+    if hasattr(raw, "copy_records_to_table"):
+        await raw.copy_records_to_table("devices", records=records, columns=list(DEVICE_COLUMNS))
+        return
+    await connection.execute_many(
+        f"INSERT INTO devices ({', '.join(DEVICE_COLUMNS)}) "
+        f"VALUES ({', '.join(':' + column for column in DEVICE_COLUMNS)})",
+        [dict(zip(DEVICE_COLUMNS, record)) for record in records],
+    )
+
+
 @router.post("/{cluster}/{project}/devices/upload_csv")
 async def upload_csv_devices(
     file: UploadFile = File(...),
@@ -45,7 +142,19 @@ async def upload_csv_devices(
     project: str = "",
     _admin: dict = Depends(get_current_admin),
 ):
-    """Upload devices from CSV file"""
+    """Replace the devices of an IDF with the rows of a CSV file.
+
+    Rows are validated and copied to PostgreSQL in batches inside one
+    transaction together with the delete of the previous devices, so a failed
+    upload leaves the existing inventory untouched. Invalid rows are reported
+    by line number with a 422.
+
+    Serials are unique per cluster. A device listed here is moved from
+    whichever IDF of the same project held it before, so the order in which
+    the project's IDFs are uploaded does not matter; the moved serials are
+    listed in the response. A serial held by another project is reported by
+    line number with a 409, as ``create_devices`` does.
+    """
     # Validate file type
     if not file.filename or not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="File must be a CSV")
@@ -53,52 +162,74 @@ async def upload_csv_devices(
     # Check if IDF exists
     db_project = map_url_project_to_db_project(project)
     idf = await database.fetch_one(
-        "SELECT * FROM idfs WHERE cluster = :cluster AND project = :project AND code = :code",
+        "SELECT 1 FROM idfs WHERE cluster = :cluster AND project = :project AND code = :code",
         {"cluster": cluster, "project": db_project, "code": code}
     )
     
     if not idf:
         raise HTTPException(status_code=404, detail="IDF not found")
-    
-    # Read and parse CSV
-    content = await file.read()
-    csv_content = content.decode('utf-8')
-    csv_reader = csv.DictReader(io.StringIO(csv_content))
-    
-    devices = []
-    for row in csv_reader:
-        device = {
-            "cluster": cluster,
-            "project": db_project,
-            "idf_code": code,
-            "name": row.get("name", ""),
-            "model": row.get("model"),
-            "serial": row.get("serial"),
-            "rack": row.get("rack"),
-            "site": row.get("site"),
-            "notes": row.get("notes")
-        }
-        devices.append(device)
-    
-    # Delete existing devices for this IDF
-    await database.execute(
-        "DELETE FROM devices WHERE cluster = :cluster AND project = :project AND idf_code = :idf_code",
-        {"cluster": cluster, "project": db_project, "idf_code": code}
-    )
 
-    # Insert new devices
-    if devices:
-        insert_query = """
-            INSERT INTO devices (
-                cluster, project, idf_code, name, model, serial, rack, site, notes
-            ) VALUES (
-                :cluster, :project, :idf_code, :name, :model, :serial, :rack, :site, :notes
-            )
-        """
-        for device in devices:
-            await database.execute(insert_query, device)
+    await file.seek(0)
+    text = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    reader = csv.DictReader(text)
+    errors: List[dict] = []
+    serial_lines: Dict[str, int] = {}
+    moved: List[str] = []
+    loaded = 0
 
-    return {"message": f"Uploaded {len(devices)} devices successfully"}
+    try:
+        async with database.connection() as connection:
+            async with connection.transaction():
+                await connection.execute(
+                    "DELETE FROM devices WHERE cluster = :cluster AND project = :project AND idf_code = :idf_code",
+                    {"cluster": cluster, "project": db_project, "idf_code": code}
+                )
+
+                done = False
+                while not done and len(errors) < MAX_REPORTED_ERRORS:
+                    batch, done = await run_in_threadpool(
+                        _read_batch, reader, settings.DEVICE_COPY_BATCH_SIZE, errors, serial_lines
+                    )
+                    # Keep validating after the first error so the client gets
+                    # every bad line at once, but stop sending rows
+                    if batch and not errors:
+                        serials = [device["serial"] for device in batch if device["serial"]]
+                        if serials:
+                            # This IDF's own devices are already gone, so what
+                            # matches here sits in another IDF of the project
+                            rows = await connection.fetch_all(
+                                """
+                                DELETE FROM devices
+                                 WHERE cluster = :cluster AND project = :project AND serial = ANY(:serials)
+                                RETURNING serial
+                                """,
+                                {"cluster": cluster, "project": db_project, "serials": serials},
+                            )
+                            moved.extend(row["serial"] for row in rows)
+                        await _copy_devices(
+                            connection,
+                            [
+                                (cluster, db_project, code, *(device[field] for field in DEVICE_COLUMNS[3:]))
+                                for device in batch
+                            ],
+                        )
+                        loaded += len(batch)
+
+                if errors:
+                    raise HTTPException(
+                        status_code=422,
+                        detail={
+                            "message": "CSV contains invalid rows; no devices were changed",
+                            "errors": errors[:MAX_REPORTED_ERRORS],
+                        },
+                    )
+    except UniqueViolationError as exc:
+        raise _duplicate_serial(exc, serial_lines)
+    finally:
+        text.detach()
+
+    await invalidate_responses(cluster, db_project)
+    return {"message": f"Uploaded {loaded} devices successfully", "moved": moved}
 
 
 @router.post("/{cluster}/{project}/devices")
@@ -119,20 +250,88 @@ async def create_devices(
         )
     """
 
-    for device in devices:
-        await database.execute(
-            insert_query,
-            {
-                "cluster": cluster,
-                "project": db_project,
-                "idf_code": device.idf_code,
-                "name": device.name,
-                "model": device.model,
-                "serial": device.serial,
-                "rack": device.rack,
-                "site": device.site,
-                "notes": device.notes,
-            },
-        )
+    values = [
+        {
+            "cluster": cluster,
+            "project": db_project,
+            "idf_code": device.idf_code,
+            "name": device.name,
+            "model": device.model,
+            "serial": (device.serial or "").strip() or None,
+            "rack": device.rack,
+            "site": device.site,
+            "notes": device.notes,
+        }
+        for device in devices
+    ]
+    if values:
+        try:
+            async with database.transaction():
+                await database.execute_many(insert_query, values)
+        except UniqueViolationError as exc:
+            raise _duplicate_serial(exc)
+        await invalidate_responses(cluster, db_project)
 
     return {"message": f"Created {len(devices)} devices successfully"}
+
+
+DEVICE_LIST_COLUMNS = "id, " + ", ".join(DEVICE_COLUMNS)
+
+
+@router.get("/{cluster}/{project}/devices", response_model=List[DeviceRecord])
+async def list_devices(
+    response: Response,
+    cluster: str = Depends(validate_cluster),
+    project: str = "",
+    idf_code: Optional[str] = Query(None, description="Only devices of this IDF"),
+    model: Optional[str] = Query(None),
+    serial: Optional[str] = Query(None),
+    rack: Optional[str] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor"),
+    _current_user: dict = Depends(get_current_user),
+):
+    """List devices of a project, optionally narrowed to one IDF.
+
+    Results are ordered by id; pass the ``X-Next-Cursor`` response header back
+    as ``cursor`` to fetch the next page.
+    """
+    db_project = map_url_project_to_db_project(project)
+
+    query = f"SELECT {DEVICE_LIST_COLUMNS} FROM devices WHERE cluster = :cluster AND project = :project"
+    params: Dict[str, Any] = {"cluster": cluster, "project": db_project, "limit": limit}
+
+    for column, value in (("idf_code", idf_code), ("model", model), ("serial", serial), ("rack", rack)):
+        if value:
+            query += f" AND {column} = :{column}"
+            params[column] = value
+
+    if cursor:
+        (after_id,) = decode_cursor(cursor, 1)
+        if not isinstance(after_id, int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query += " AND id > :after_id"
+        params["after_id"] = after_id
+
+    rows = await database.fetch_all(query + " ORDER BY id LIMIT :limit", params)
+
+    if len(rows) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([rows[-1]["id"]])
+    return [DeviceRecord(**dict(row)) for row in rows]
+
+
+@router.get("/{cluster}/devices/by-serial/{serial}", response_model=DeviceRecord)
+async def get_device_by_serial(
+    serial: str,
+    cluster: str = Depends(validate_cluster),
+    _current_user: dict = Depends(get_current_user),
+):
+    """Find a device by serial number across every project of the cluster"""
+    row = await database.fetch_one(
+        f"SELECT {DEVICE_LIST_COLUMNS} FROM devices WHERE serial = :serial AND cluster = :cluster "
+        "ORDER BY id LIMIT 1",
+        {"serial": serial.strip(), "cluster": cluster},
+    )
+    if not row:
+        raise HTTPException(status_code=404, detail="Device not found")
+    return DeviceRecord(**dict(row))
@@ -0,0 +1,144 @@
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import APIRouter, Depends, Path, Query
+from fastapi.responses import StreamingResponse
+
+from app.core.export import EXPORT_MEDIA_TYPES, stream_csv, stream_xlsx
+from app.db.database import database
+from app.db.ports import join_row
+from app.routers.auth import get_current_user
+from app.routers.devices import map_url_project_to_db_project, validate_cluster
+
+
+router = APIRouter(tags=["exports"])
+
+DEVICE_EXPORT_COLUMNS = ("project", "idf_code", "name", "model", "serial", "rack", "site", "notes")
+
+# One result row per port, in table order
+TABLE_ROWS_QUERY = """
+    SELECT i.code, i.title, p.tray, p.panel, p.port, p.status, p.extra
+      FROM idf_ports p
+      JOIN idfs i ON i.id = p.idf_id
+     WHERE {filters}
+     ORDER BY i.code, p.position
+"""
+
+
+def _export_response(
+    fmt: str, filename: str, header: Sequence[str], rows: AsyncIterator[Sequence[Any]]
+) -> StreamingResponse:
+    body = stream_csv(header, rows) if fmt == "csv" else stream_xlsx(header, rows, sheet_name=filename)
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
+
+
+def _scope_filters(
+    cluster: str, project: Optional[str], prefix: str = ""
+) -> Tuple[str, Dict[str, Any]]:
+    filters = f"{prefix}cluster = :cluster"
+    params: Dict[str, Any] = {"cluster": cluster}
+    if project:
+        filters += f" AND {prefix}project = :project"
+        params["project"] = map_url_project_to_db_project(project)
+    return filters, params
+
+
+async def _device_rows(query: str, params: Dict[str, Any]) -> AsyncIterator[Sequence[Any]]:
+    # database.iterate reads through a server-side cursor inside a transaction
+    async for row in database.iterate(query, params):
+        yield [row[column] for column in DEVICE_EXPORT_COLUMNS]
+
+
+def _devices_export(
+    fmt: str, cluster: str, project: Optional[str], idf_code: Optional[str]
+) -> StreamingResponse:
+    filters, params = _scope_filters(cluster, project)
+    if idf_code:
+        filters += " AND idf_code = :idf_code"
+        params["idf_code"] = idf_code
+
+    query = (
+        f"SELECT {', '.join(DEVICE_EXPORT_COLUMNS)} FROM devices WHERE {filters} "
+        "ORDER BY project, idf_code, id"
+    )
+    filename = "-".join(part for part in (cluster, project, idf_code, "devices") if part)
+    return _export_response(fmt, filename, DEVICE_EXPORT_COLUMNS, _device_rows(query, params))
+
+
+@router.get("/{cluster}/devices/export.{fmt}")
+async def export_cluster_devices(
+    fmt: str = Path(..., pattern="^(csv|xlsx)$"),
+    cluster: str = Depends(validate_cluster),
+    _current_user: dict = Depends(get_current_user),
+):
+    """Export every device of a cluster as CSV or XLSX"""
+    return _devices_export(fmt, cluster, None, None)
+
+
+@router.get("/{cluster}/{project}/devices/export.{fmt}")
+async def export_project_devices(
+    fmt: str = Path(..., pattern="^(csv|xlsx)$"),
+    cluster: str = Depends(validate_cluster),
+    project: str = "",
+    idf_code: Optional[str] = Query(None, description="Only devices of this IDF"),
+    _current_user: dict = Depends(get_current_user),
+):
+    """Export the devices of a project (or one IDF) as CSV or XLSX"""
+    return _devices_export(fmt, cluster, project, idf_code)
+
+
+def _parse_json(value: Any) -> Any:
+    return json.loads(value) if isinstance(value, str) else value
+
+
+async def _table_header(
+    filters: str, params: Dict[str, Any]
+) -> Tuple[List[str], List[str], Dict[str, str]]:
+    """Union of the table column definitions, in first-seen order."""
+    rows = await database.fetch_all(
+        f"SELECT i.table_data->'columns' AS columns FROM idfs i WHERE {filters} ORDER BY i.code",
+        params,
+    )
+    keys: List[str] = []
+    labels: List[str] = []
+    types: Dict[str, str] = {}
+    for row in rows:
+        for column in _parse_json(row["columns"]) or []:
+            if isinstance(column, dict) and column.get("key") and column["key"] not in keys:
+                keys.append(column["key"])
+                labels.append(column.get("label") or column["key"])
+                types[column["key"]] = column.get("type")
+    return keys, labels, types
+
+
+async def _table_rows(
+    filters: str, params: Dict[str, Any], keys: List[str], types: Dict[str, str]
+) -> AsyncIterator[Sequence[Any]]:
+    async for row in database.iterate(TABLE_ROWS_QUERY.format(filters=filters), params):
+        data = join_row(row, types)
+        yield [row["code"], row["title"], *(data.get(key) for key in keys)]
+
+
+@router.get("/{cluster}/{project}/patch-table/export.{fmt}")
+async def export_patch_tables(
+    fmt: str = Path(..., pattern="^(csv|xlsx)$"),
+    cluster: str = Depends(validate_cluster),
+    project: str = "",
+    code: Optional[str] = Query(None, description="Only the table of this IDF"),
+    _current_user: dict = Depends(get_current_user),
+):
+    """Export the patch table rows of a project (or one IDF) as CSV or XLSX"""
+    filters, params = _scope_filters(cluster, project, prefix="i.")
+    if code:
+        filters += " AND i.code = :code"
+        params["code"] = code
+
+    keys, labels, types = await _table_header(filters, params)
+    filename = "-".join(part for part in (cluster, project, code, "patch-table") if part)
+    return _export_response(
+        fmt, filename, ["IDF", "Title", *labels], _table_rows(filters, params, keys, types)
+    )
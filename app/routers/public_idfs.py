@@ -1,11 +1,41 @@
 import json
+from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
-
-from fastapi import APIRouter, Depends, HTTPException, Query
-
-from app.db.database import database
-from app.models.idf_models import IdfHealth, HealthCounts, IdfIndex, IdfPublic, MediaItem
+from typing import Any, Dict, FrozenSet, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+
+from app.core.fieldsets import fields_key, parse_fields, projection, select_fields, wants
+from app.core.health import HEALTH_COLUMNS, compute_health, health_from_columns
+from app.core.http_cache import http_date, is_not_modified, make_etag, not_modified
+from app.core.media import MEDIA_COLUMNS, canonical_media
+from app.core.pagination import (
+    NEXT_CURSOR_HEADER,
+    TOTAL_COUNT_HEADER,
+    decode_cursor,
+    encode_cursor,
+)
+from app.core.response_cache import CachedResponse, response_cache
+from app.core.serialization import FastJSONResponse, idf_index_payload, idf_public_payload
+from app.db.database import (
+    IDF_SEARCH_EXPRESSION,
+    PORT_SEARCH_EXPRESSION,
+    database,
+    search_capabilities,
+)
+from app.db.ports import (
+    PORT_FIELDS,
+    join_row,
+    load_table,
+    order_by_column,
+)
+from app.models.idf_models import (
+    IdfIndex,
+    IdfPublic,
+    IdfTablePage,
+    PortMatch,
+    TableRow,
+)
 from app.routers.auth import get_current_user
 from app.core.config import settings
 
@@ -42,211 +72,224 @@ def map_url_project_to_db_project(project: str) -> str:
     return project_mapping.get(decoded_project, decoded_project)
 
 
-def compute_health(table_data: Optional[Dict[str, Any]]):
-    """Compute health status based on table data status values"""
-    if not table_data:
-        return {
-            "level": "gray",
-            "counts": {"ok": 0, "revision": 0, "falla": 0, "libre": 0, "reservado": 0}
-        }
-
-    if not isinstance(table_data, dict):
-        return {
-            "level": "gray",
-            "counts": {"ok": 0, "revision": 0, "falla": 0, "libre": 0, "reservado": 0}
-        }
-
-    rows = table_data.get("rows", [])
-    if not rows:
-        return {
-            "level": "green",
-            "counts": {"ok": 1, "revision": 0, "falla": 0, "libre": 0, "reservado": 0}
-        }
-
-    counts = {"ok": 0, "revision": 0, "falla": 0, "libre": 0, "reservado": 0}
-
-    for row in rows:
-        status = row.get("status", "").lower()
-        if status in counts:
-            counts[status] += 1
-
-    if counts["falla"] > 0:
-        level = "red"
-    elif counts["revision"] > 0:
-        level = "yellow"
-    elif counts["ok"] > 0:
-        level = "green"
-    else:
-        level = "gray"
-
-    return {"level": level, "counts": counts}
-
-
-def has_content(idf_data: dict) -> bool:
-    """Check if IDF has any content in galleries, documents, diagrams, dfo, location, or table data"""
-    # Check for non-empty arrays/strings in various fields
-    content_fields = ["images", "documents", "diagrams", "dfo", "location"]
-    
-    for field in content_fields:
-        field_value = idf_data.get(field)
-        if field_value:
-            # Handle JSON strings
-            if isinstance(field_value, str):
-                try:
-                    parsed_value = json.loads(field_value)
-                    if isinstance(parsed_value, list) and len(parsed_value) > 0:
-                        return True
-                    elif isinstance(parsed_value, str) and parsed_value.strip():
-                        return True
-                except (json.JSONDecodeError, TypeError):
-                    # If not JSON, treat as string
-                    if field_value.strip():
-                        return True
-            # Handle lists
-            elif isinstance(field_value, list) and len(field_value) > 0:
-                return True
-            # Handle non-empty strings
-            elif isinstance(field_value, str) and field_value.strip():
-                return True
-    
-    # Check table data
-    table_data = idf_data.get("table_data")
-    if table_data:
-        try:
-            if isinstance(table_data, str):
-                parsed_table = json.loads(table_data)
-            else:
-                parsed_table = table_data
-            
-            if isinstance(parsed_table, dict) and parsed_table.get("rows"):
-                return True
-        except (json.JSONDecodeError, TypeError):
-            pass
-    
-    return False
+def _non_empty_sql(column: str) -> str:
+    """SQL predicate that is true when a JSONB media column holds an item.
 
+    Canonical rows hold ``[]``/NULL when empty; the other encodings cover rows
+    whose media has not been normalized yet.
+    """
+    return (
+        f"COALESCE({column} NOT IN ('[]'::jsonb, '{{}}'::jsonb, 'null'::jsonb, '\"\"'::jsonb, "
+        f"'\"[]\"'::jsonb), FALSE)"
+    )
 
-def convert_relative_to_absolute(paths, single_value=False):
-    """Convert relative paths to relative URLs for proper static file serving"""
-    if paths is None:
-        return None if single_value else []
 
-    if isinstance(paths, str):
-        if not paths:
-            return None if single_value else []
-        # Try to parse as JSON first
-        try:
-            parsed_paths = json.loads(paths)
-            # If it's a list, process each item
-            if isinstance(parsed_paths, list):
-                if single_value:
-                    # For single value fields, return first item or None
-                    return f"/static/{parsed_paths[0]}" if parsed_paths else None
-                else:
-                    return [f"/static/{path}" for path in parsed_paths if path]
-            # If it's a single string
-            elif isinstance(parsed_paths, str) and parsed_paths:
-                if single_value:
-                    return f"/static/{parsed_paths}"
-                else:
-                    return [f"/static/{parsed_paths}"]
-            return None if single_value else []
-        except (json.JSONDecodeError, TypeError):
-            # If not JSON, treat as single path
-            if single_value:
-                return f"/static/{paths}"
-            else:
-                return [f"/static/{paths}"]
-    elif isinstance(paths, list):
-        if not paths:  # Empty list
-            return None if single_value else []
-        if single_value:
-            # For single value fields, return first item or None
-            return f"/static/{paths[0]}" if paths else None
-        else:
-            return [f"/static/{path}" for path in paths if path]
-
-    return None if single_value else []
+# Evaluated in PostgreSQL so listings never transfer media or table payloads
+HAS_CONTENT_SQL = " OR ".join(
+    [_non_empty_sql(column) for column in ("images", "documents", "diagrams", "dfo", "location")]
+    + [
+        "EXISTS (SELECT 1 FROM idf_ports p WHERE p.idf_id = idfs.id)",
+        # IDFs whose patch table has not been moved to idf_ports yet
+        "COALESCE(jsonb_typeof(table_data->'rows') = 'array' "
+        "AND table_data->'rows' <> '[]'::jsonb, FALSE)",
+    ]
+)
+
+# Keys every response carries whatever ``fields`` asks for
+IDENTITY_FIELDS = ("cluster", "project", "code")
+
+LIST_FIELDS = tuple(IdfIndex.model_fields)
+IDF_FIELDS = tuple(IdfPublic.model_fields)
+
+# Columns behind each IdfIndex key; title/code are always read for the cursor
+LIST_BASE_COLUMNS = (*IDENTITY_FIELDS, "title")
+LIST_FIELD_COLUMNS = {
+    "site": ("site",),
+    "room": ("room",),
+    "health": HEALTH_COLUMNS,
+    "logo": ("logo", "media_version"),
+    "hasContent": (f"({HAS_CONTENT_SQL}) AS has_content",),
+}
+
+# Columns behind each IdfPublic key; id/updated_at feed the validators
+IDF_BASE_COLUMNS = ("id", "updated_at", *IDENTITY_FIELDS)
+IDF_FIELD_COLUMNS = {
+    "title": ("title",),
+    "description": ("description",),
+    "site": ("site",),
+    "room": ("room",),
+    **{field: (field, "media_version") for field in MEDIA_COLUMNS},
+    "table": ("table_data",),
+    # table_data is only loaded for rows whose health was never materialized
+    "health": (*HEALTH_COLUMNS, "table_data"),
+}
+
+FIELDS_DESCRIPTION = "Comma-separated response keys (default: all)"
+
+
+def _static_url(path: str) -> str:
+    return path if path.startswith("/static/") else f"/static/{path}"
+
+
+def _validators(etag: str, last_modified: Any) -> Dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def _cached_reply(request: Request, entry: CachedResponse) -> Response:
+    etag = entry.headers.get("ETag")
+    last_modified = datetime.fromisoformat(entry.last_modified) if entry.last_modified else None
+    if etag and is_not_modified(request, etag, last_modified):
+        return not_modified(entry.headers)
+    return Response(content=entry.body, media_type="application/json", headers=entry.headers)
+
+
+async def _cache_reply(
+    slot: Optional[str],
+    content: Any,
+    headers: Optional[Dict[str, str]] = None,
+    last_modified: Optional[datetime] = None,
+) -> Response:
+    # Handlers pass plain dicts/lists built from validated rows: no model or
+    # jsonable_encoder pass on the way out
+    reply = FastJSONResponse(content=content, headers=headers)
+    entry = CachedResponse(
+        body=reply.body.decode("utf-8"),
+        headers=dict(headers or {}),
+        last_modified=last_modified.isoformat() if last_modified else None,
+    )
+    await response_cache.set(slot, entry)
+    return reply
 
 
 @router.get("/{cluster}/{project}/idfs")
 async def list_idfs(
+    request: Request,
     cluster: str = Depends(validate_cluster),
     project: str = "",
     q: Optional[str] = Query(None, description="Search query"),
     limit: int = Query(50, ge=1, le=100),
     skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor"),
+    order: str = Query("title", pattern="^(title|relevance)$", description="Sort by title or search relevance"),
     include_health: int = Query(0, description="Include health computation"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
     _current_user: dict = Depends(get_current_user),
 ):
-    """Get list of IDFs for a cluster/project"""
+    """Get list of IDFs for a cluster/project.
+
+    Results are ordered by ``(title, code)``. Pass the ``X-Next-Cursor``
+    response header back as ``cursor`` to fetch the next page in constant
+    time; ``skip`` is kept for clients that still page by offset.
+
+    ``order=relevance`` ranks ``q`` matches by trigram similarity and pages by
+    offset only.
+
+    ``X-Total-Count`` is only sent on pages requested without ``cursor``;
+    cursor pages never count the whole match set.
+
+    The ETag covers the query, the match count and the newest ``updated_at``
+    (on cursor pages: the ids and newest ``updated_at`` of the page itself),
+    so an unchanged listing is answered with 304 after the summary query.
+    Rendered pages are kept in the shared response cache per query string.
+
+    ``fields`` limits each item to the given ``IdfIndex`` keys (plus
+    cluster/project/code); ``fields=...,health`` implies ``include_health``.
+    """
+    requested = parse_fields(fields, LIST_FIELDS, IDENTITY_FIELDS)
+    with_health = wants(requested, "health") if requested is not None else bool(include_health)
     db_project = map_url_project_to_db_project(project)
+    cache_key = f"list:{request.url.query}"
+    cached, slot = await response_cache.get(cluster, db_project, cache_key)
+    if cached is not None:
+        return _cached_reply(request, cached)
 
-    base_query = "SELECT * FROM idfs WHERE cluster = :cluster AND project = :project"
-    params = {"cluster": cluster, "project": db_project}
+    filters = "cluster = :cluster AND project = :project"
+    params: Dict[str, Any] = {"cluster": cluster, "project": db_project}
 
     if q:
-        base_query += " AND (code ILIKE :q OR title ILIKE :q OR site ILIKE :q OR room ILIKE :q)"
+        filters += f" AND {IDF_SEARCH_EXPRESSION} ILIKE :q"
         params["q"] = f"%{q}%"
 
-    base_query += " ORDER BY title OFFSET :skip LIMIT :limit"
-    params["skip"] = skip
-    params["limit"] = limit
+    by_relevance = bool(q) and order == "relevance" and search_capabilities["trigram"]
+    if by_relevance and cursor:
+        raise HTTPException(status_code=400, detail="Cursor pagination requires order=title")
+
+    keyset = ""
+    if cursor:
+        after_title, after_code = decode_cursor(cursor, 2)
+        if not isinstance(after_title, str) or not isinstance(after_code, str):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        keyset = " AND (title, code) > (:after_title, :after_code)"
+        params.update({"after_title": after_title, "after_code": after_code})
+
+        # Cursor pages skip the exact count so deep pages stay constant-time;
+        # the page's own ids make the ETag change when one of its rows is deleted
+        summary = await database.fetch_one(
+            f"""
+            SELECT MAX(updated_at) AS last_modified,
+                   string_agg(id::text, ',' ORDER BY title, code) AS page_ids
+              FROM (SELECT id, title, code, updated_at FROM idfs
+                     WHERE {filters}{keyset}
+                     ORDER BY title, code
+                     LIMIT :limit) AS page
+            """,
+            {**params, "limit": limit},
+        )
+        version = summary["page_ids"] if summary else None
+    else:
+        summary = await database.fetch_one(
+            f"SELECT MAX(updated_at) AS last_modified, COUNT(*) AS total FROM idfs WHERE {filters}",
+            params,
+        )
+        version = summary["total"] if summary else 0
+    total = None if cursor else version
+    last_modified = summary["last_modified"] if summary else None
+
+    headers = _validators(
+        make_etag(request.url.query, version, last_modified.isoformat() if last_modified else None),
+        last_modified,
+    )
+    if total is not None:
+        headers[TOTAL_COUNT_HEADER] = str(total or 0)
+    if is_not_modified(request, headers["ETag"], last_modified):
+        return not_modified(headers)
+
+    column_map = {
+        name: columns for name, columns in LIST_FIELD_COLUMNS.items() if name != "health" or with_health
+    }
+    page_query = f"SELECT {projection(requested, column_map, LIST_BASE_COLUMNS)} FROM idfs WHERE {filters}"
+    page_params = {**params, "limit": limit}
+    if by_relevance:
+        page_query += (
+            f" ORDER BY word_similarity(:q_raw, {IDF_SEARCH_EXPRESSION}) DESC, title, code"
+            " OFFSET :skip LIMIT :limit"
+        )
+        page_params.update({"q_raw": q, "skip": skip})
+    elif cursor:
+        page_query += f"{keyset} ORDER BY title, code LIMIT :limit"
+    else:
+        page_query += " ORDER BY title, code OFFSET :skip LIMIT :limit"
+        page_params["skip"] = skip
 
-    rows = await database.fetch_all(base_query, params)
+    rows = await database.fetch_all(page_query, page_params)
+
+    if len(rows) == limit and not by_relevance:
+        headers[NEXT_CURSOR_HEADER] = encode_cursor([rows[-1]["title"], rows[-1]["code"]])
 
     result = []
     for row in rows:
-        health = None
         idf_data = dict(row)
+        logo = canonical_media(idf_data).get("logo")
+        result.append(select_fields(idf_index_payload(
+            idf_data,
+            logo=_static_url(logo) if logo else None,
+            health=health_from_columns(idf_data) if with_health else None,
+        ), requested))
 
-        if include_health and idf_data.get("table_data"):
-            table_data = json.loads(idf_data["table_data"]) if isinstance(idf_data["table_data"], str) else idf_data["table_data"]
-            health = compute_health(table_data)
-
-        # Parse DFO data with URL cleaning
-        dfo_data = idf_data.get("dfo") # Changed from row.get("dfo") to idf_data.get("dfo")
-        if dfo_data:
-            try:
-                parsed_dfo = json.loads(dfo_data) if isinstance(dfo_data, str) else dfo_data
-                if isinstance(parsed_dfo, list) and len(parsed_dfo) > 0:
-                    # Clean up any malformed URLs in DFO data
-                    first_dfo = parsed_dfo[0]
-                    if isinstance(first_dfo, dict) and "url" in first_dfo:
-                        url = first_dfo["url"]
-                        # Clean malformed URLs that contain nested structures
-                        if "replit.dev" in url or "{'url':" in url:
-                            # Try to extract clean path from malformed URL
-                            import re
-                            match = re.search(r'/static/([^\'"}]+)', url)
-                            if match:
-                                clean_url = f"/static/{match.group(1)}"
-                                first_dfo["url"] = clean_url
-                        elif not url.startswith("/static/"):
-                            first_dfo["url"] = f"/static/{url}"
-                    idf_data["dfo"] = first_dfo # Changed from result["dfo"] to idf_data["dfo"]
-            except (json.JSONDecodeError, TypeError):
-                idf_data["dfo"] = None # Changed from result["dfo"] to idf_data["dfo"]
-        else:
-            idf_data["dfo"] = None # Changed from result["dfo"] to idf_data["dfo"]
-
-
-        # Check if IDF has content
-        content_exists = has_content(idf_data)
-
-        result.append(IdfIndex(
-            cluster=idf_data["cluster"],
-            project=idf_data["project"],
-            code=idf_data["code"],
-            title=idf_data.get("title", ""),
-            site=idf_data.get("site", ""),
-            room=idf_data.get("room", ""),
-            health=health,
-            logo=convert_relative_to_absolute(idf_data.get("logo"), single_value=True) if idf_data.get("logo") else None,
-            hasContent=content_exists
-        ))
-
-    return result
+    return await _cache_reply(slot, result, headers, last_modified)
 
 
 @router.get("/{cluster}/{project}/logo")
@@ -257,6 +300,9 @@ async def get_logo(
 ):
     """Get logo for cluster/project"""
     db_project = map_url_project_to_db_project(project)
+    cached, slot = await response_cache.get(cluster, db_project, "logo")
+    if cached is not None:
+        return Response(content=cached.body, media_type="application/json")
 
     # Check if there's any IDF with a logo in the database first
     idf_with_logo = await database.fetch_one(
@@ -269,7 +315,7 @@ async def get_logo(
         # Check if file exists
         full_path = Path(f"static/{logo_path}")
         if full_path.exists():
-            return {"url": f"/static/{logo_path}"}
+            return await _cache_reply(slot, {"url": f"/static/{logo_path}"})
 
     # Check if there's a specific IDF with media containing logo (legacy support)
     idf = await database.fetch_one(
@@ -283,7 +329,7 @@ async def get_logo(
             if media_data and "logo" in media_data and media_data["logo"]:
                 logo_url = media_data["logo"]["url"]
                 if logo_url:
-                    return {"url": logo_url}
+                    return await _cache_reply(slot, {"url": logo_url})
         except (json.JSONDecodeError, KeyError, TypeError):
             pass
 
@@ -292,147 +338,274 @@ async def get_logo(
     logo_path = Path(f"static/{cluster}/{project_path_str}/logo.png")
 
     if logo_path.exists():
-        return {"url": f"/static/{cluster}/{project_path_str}/logo.png"}
+        return await _cache_reply(
+            slot, {"url": f"/static/{cluster}/{project_path_str}/logo.png"}
+        )
 
     # Fallback to cluster logo
     cluster_logo_path = Path(f"static/{cluster}/logo.png")
     if cluster_logo_path.exists():
-        return {"url": f"/static/{cluster}/logo.png"}
+        return await _cache_reply(slot, {"url": f"/static/{cluster}/logo.png"})
 
     raise HTTPException(status_code=404, detail="Logo not found")
 
 
+def _idf_validators(row: Any, fields: Optional[FrozenSet[str]]) -> Dict[str, str]:
+    # Each fieldset is a different representation and gets its own ETag
+    etag = make_etag(row["id"], row["updated_at"].isoformat(), fields_key(fields))
+    return _validators(etag, row["updated_at"])
+
+
 @router.get("/{cluster}/{project}/idfs/{code}")
 async def get_idf(
+    request: Request,
     code: str,
     cluster: str = Depends(validate_cluster),
     project: str = "",
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
     _current_user: dict = Depends(get_current_user),
 ):
-    """Get a specific IDF by code"""
+    """Get a specific IDF by code.
+
+    ``ETag``/``Last-Modified`` come from ``updated_at``; a conditional request
+    for an unchanged IDF is answered with 304 after one indexed lookup.
+    The rendered body is kept in the shared response cache until the next
+    write to the project.
+
+    ``fields`` limits the body to the given ``IdfPublic`` keys (plus
+    cluster/project/code): only their columns are read, and the patch table
+    is only assembled when ``table`` is requested.
+    """
+    requested = parse_fields(fields, IDF_FIELDS, IDENTITY_FIELDS)
     db_project = map_url_project_to_db_project(project)
+    lookup = {"cluster": cluster, "project": db_project, "code": code}
+    cache_key = f"idf:{code}:{fields_key(requested)}"
+    cached, slot = await response_cache.get(cluster, db_project, cache_key)
+    if cached is not None:
+        return _cached_reply(request, cached)
+
+    version = await database.fetch_one(
+        "SELECT id, updated_at FROM idfs WHERE cluster = :cluster AND project = :project AND code = :code",
+        lookup,
+    )
+    if not version:
+        raise HTTPException(status_code=404, detail="IDF not found")
 
+    validators = _idf_validators(version, requested)
+    if is_not_modified(request, validators["ETag"], version["updated_at"]):
+        return not_modified(validators)
+
+    columns = "*" if requested is None else projection(requested, IDF_FIELD_COLUMNS, IDF_BASE_COLUMNS)
     idf = await database.fetch_one(
-        "SELECT * FROM idfs WHERE cluster = :cluster AND project = :project AND code = :code",
-        {"cluster": cluster, "project": db_project, "code": code}
+        f"SELECT {columns} FROM idfs WHERE cluster = :cluster AND project = :project AND code = :code",
+        lookup,
     )
 
     if not idf:
         raise HTTPException(status_code=404, detail="IDF not found")
 
     idf_dict = dict(idf)
+    # Validators of the row actually sent, in case it changed since the lookup
+    validators = _idf_validators(idf_dict, requested)
 
-    # Compute health if table exists
-    health = None
-    if idf_dict.get("table_data"):
-        table_data = json.loads(idf_dict["table_data"]) if isinstance(idf_dict["table_data"], str) else idf_dict["table_data"]
-        health = compute_health(table_data)
+    # Prefer the materialized health columns; compute for rows not yet backfilled
+    health = health_from_columns(idf_dict) if wants(requested, "health") else None
+    missing_health = wants(requested, "health") and health is None
 
-    # Parse table_data properly
+    # Column definitions from table_data, rows from idf_ports
     table_data = None
-    if idf_dict.get("table_data"):
-        try:
-            if isinstance(idf_dict["table_data"], str):
-                table_data = json.loads(idf_dict["table_data"])
-            else:
-                table_data = idf_dict["table_data"]
-
-            # Ensure table_data is either None or a proper dict with columns and rows
-            if isinstance(table_data, list):
-                table_data = None
-            elif isinstance(table_data, dict) and not table_data.get("columns"):
-                table_data = None
-        except (json.JSONDecodeError, TypeError):
+    if wants(requested, "table") or missing_health:
+        table_data = await load_table(idf_dict)
+        if table_data is not None and not table_data.get("columns"):
             table_data = None
+    if missing_health and table_data:
+        health = compute_health(table_data)
+
+    # Stored in canonical form; only rows not yet migrated are normalized here
+    media = canonical_media(idf_dict)
+    logo = media.get("logo")
+    media["logo"] = _static_url(logo) if logo else None
 
-    # Helper function to parse JSON fields safely
-    def parse_asset_field(field_data):
-        if field_data is None:
-            return []
-        if isinstance(field_data, list):
-            return field_data
-        if isinstance(field_data, str):
-            if not field_data.strip():
-                return []
-            try:
-                parsed = json.loads(field_data)
-                return parsed if isinstance(parsed, list) else [parsed] if parsed else []
-            except (json.JSONDecodeError, TypeError):
-                return [field_data] if field_data.strip() else []
-        return field_data
-
-    # This section was modified to correctly handle the location field
-    location_item = None
-    if idf_dict.get("location"):
-        location_value = idf_dict["location"]
-        if isinstance(location_value, str):
-            try:
-                # Try to parse as JSON first (new format)
-                location_data = json.loads(location_value)
-                if isinstance(location_data, str):
-                    # It's a JSON string containing the path
-                    # Ensure the path has /static/ prefix
-                    clean_path = location_data
-                    if not clean_path.startswith("/static/"):
-                        clean_path = f"/static/{clean_path}"
-                    location_item = MediaItem(
-                        url=clean_path,
-                        name="Location Image",
-                        kind="image"
-                    )
-            except json.JSONDecodeError:
-                # Fallback to old format (direct string path)
-                clean_path = location_value
-                if not clean_path.startswith("/static/"):
-                    clean_path = f"/static/{clean_path}"
-                location_item = MediaItem(
-                    url=clean_path,
-                    name="Location Image",
-                    kind="image"
-                )
-        elif isinstance(location_value, dict):
-            # Already a dict format
-            location_item = MediaItem(**location_value)
-
-    # Process documents with proper structure preservation
-    documents_data = parse_asset_field(idf_dict.get("documents", []))
-    processed_documents = []
-    for doc in documents_data:
-        if isinstance(doc, dict):
-            # Preserve all fields and fix URL
-            url = doc.get("url", "")
-            if not url.startswith("/static/"):
-                url = f"/static/{url}"
-            processed_documents.append({
-                "url": url,
-                "title": doc.get("title", ""),
-                "name": doc.get("name", ""),
-                "kind": doc.get("kind", "document")
-            })
-        elif isinstance(doc, str):
-            # String format - create basic structure
-            url = doc if doc.startswith("/static/") else f"/static/{doc}"
-            processed_documents.append({
-                "url": url,
-                "title": "",
-                "name": "",
-                "kind": "document"
-            })
-
-    return IdfPublic(
-        cluster=idf_dict["cluster"],
-        project=idf_dict["project"],
-        code=idf_dict["code"],
-        title=idf_dict.get("title", ""),
-        description=idf_dict.get("description"),
-        site=idf_dict.get("site", ""),
-        room=idf_dict.get("room", ""),
-        images=convert_relative_to_absolute(parse_asset_field(idf_dict.get("images", []))),
-        documents=processed_documents,
-        diagrams=convert_relative_to_absolute(parse_asset_field(idf_dict.get("diagrams", []))),
-        location=location_item.url if location_item else None,
-        dfo=convert_relative_to_absolute(parse_asset_field(idf_dict.get("dfo", []))),
-        logo=convert_relative_to_absolute(parse_asset_field(idf_dict.get("logo")), single_value=True) if idf_dict.get("logo") else None,
-        table=table_data,
-        health=health
-    )
\ No newline at end of file
+    # Same body as IdfPublic, built without re-validating the stored table
+    payload = select_fields(idf_public_payload(idf_dict, media, table_data, health), requested)
+    return await _cache_reply(slot, payload, validators, idf_dict["updated_at"])
+
+
+@router.get("/{cluster}/{project}/idfs/{code}/rows", response_model=IdfTablePage)
+async def list_idf_rows(
+    response: Response,
+    code: str,
+    cluster: str = Depends(validate_cluster),
+    project: str = "",
+    status: Optional[str] = Query(None, description="Comma-separated statuses"),
+    q: Optional[str] = Query(None, description="Search in every cell"),
+    sort: Optional[str] = Query(None, description="Column key to sort by"),
+    direction: str = Query("asc", pattern="^(asc|desc)$"),
+    limit: int = Query(100, ge=1, le=1000),
+    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor"),
+    _current_user: dict = Depends(get_current_user),
+):
+    """Get one page of an IDF's patch table rows.
+
+    Filtering, sorting and paging run in SQL against ``idf_ports``. Without
+    ``sort`` rows keep table order and ``X-Next-Cursor`` can be passed back as
+    ``cursor``; sorted pages use ``skip``. ``X-Total-Count`` and ``total`` are
+    only computed for pages requested without ``cursor`` (``total`` is null on
+    cursor pages). ``row`` in each result is the index
+    used by the table PATCH endpoint. Tables whose rows have not been moved
+    to ``idf_ports`` yet answer 409.
+    """
+    db_project = map_url_project_to_db_project(project)
+
+    idf = await database.fetch_one(
+        "SELECT id, table_data FROM idfs WHERE cluster = :cluster AND project = :project AND code = :code",
+        {"cluster": cluster, "project": db_project, "code": code}
+    )
+    if not idf:
+        raise HTTPException(status_code=404, detail="IDF not found")
+
+    table_data = json.loads(idf["table_data"]) if isinstance(idf["table_data"], str) else idf["table_data"]
+    if not isinstance(table_data, dict):
+        response.headers[TOTAL_COUNT_HEADER] = "0"
+        return IdfTablePage(columns=[], rows=[], total=0)
+    if "rows" in table_data:
+        # Moved to idf_ports by the startup migration; a GET never writes
+        raise HTTPException(status_code=409, detail="Patch table is still being migrated")
+
+    columns = [column for column in table_data.get("columns") or [] if isinstance(column, dict)]
+    column_types = {column.get("key"): column.get("type") for column in columns}
+
+    filters = "idf_id = :idf_id"
+    params: Dict[str, Any] = {"idf_id": idf["id"]}
+    if status:
+        filters += " AND lower(status) = ANY(:statuses)"
+        params["statuses"] = [value.strip().lower() for value in status.split(",") if value.strip()]
+    if q:
+        filters += f" AND {PORT_SEARCH_EXPRESSION} ILIKE :q"
+        params["q"] = f"%{q}%"
+
+    if sort and sort not in column_types and sort not in PORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Unknown sort column: {sort}")
+    if sort and cursor:
+        raise HTTPException(status_code=400, detail="Cursor pagination requires table order")
+
+    total = None
+    if not cursor:
+        total = await database.fetch_val(f"SELECT COUNT(*) FROM idf_ports WHERE {filters}", params)
+
+    page_query = f"SELECT position, tray, panel, port, status, extra FROM idf_ports WHERE {filters}"
+    page_params = {**params, "limit": limit}
+    if sort:
+        page_query += f" {order_by_column(sort, column_types.get(sort), direction == 'desc')}"
+        page_query += " OFFSET :skip LIMIT :limit"
+        page_params["skip"] = skip
+        if sort not in PORT_FIELDS:
+            page_params["sort_key"] = sort
+    elif cursor:
+        (after_position,) = decode_cursor(cursor, 1)
+        if not isinstance(after_position, int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        page_query += " AND position > :after_position ORDER BY position LIMIT :limit"
+        page_params["after_position"] = after_position
+    else:
+        page_query += " ORDER BY position OFFSET :skip LIMIT :limit"
+        page_params["skip"] = skip
+
+    records = await database.fetch_all(page_query, page_params)
+
+    if total is not None:
+        response.headers[TOTAL_COUNT_HEADER] = str(total or 0)
+    if len(records) == limit and not sort:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([records[-1]["position"]])
+
+    return IdfTablePage(
+        columns=columns,
+        rows=[
+            TableRow(row=record["position"], values=join_row(record, column_types))
+            for record in records
+        ],
+        total=total,
+    )
+
+
+@router.get("/{cluster}/{project}/ports", response_model=List[PortMatch])
+async def search_ports(
+    response: Response,
+    cluster: str = Depends(validate_cluster),
+    project: str = "",
+    status: Optional[str] = Query(None, description="Comma-separated statuses"),
+    panel: Optional[str] = Query(None),
+    tray: Optional[str] = Query(None),
+    q: Optional[str] = Query(None, description="Search in every cell"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor"),
+    _current_user: dict = Depends(get_current_user),
+):
+    """Search patch-table rows across every IDF of a cluster/project.
+
+    Results are ordered by IDF code and row; pass ``X-Next-Cursor`` back as
+    ``cursor`` for the next page; ``X-Total-Count`` is only sent on the first
+    page. ``row`` addresses the row in the table PATCH
+    endpoint of that IDF.
+    """
+    db_project = map_url_project_to_db_project(project)
+
+    filters = "i.cluster = :cluster AND i.project = :project"
+    params: Dict[str, Any] = {"cluster": cluster, "project": db_project}
+    if status:
+        filters += " AND lower(p.status) = ANY(:statuses)"
+        params["statuses"] = [value.strip().lower() for value in status.split(",") if value.strip()]
+    if panel:
+        filters += " AND p.panel = :panel"
+        params["panel"] = panel
+    if tray:
+        filters += " AND p.tray = :tray"
+        params["tray"] = tray
+    if q:
+        filters += f" AND {PORT_SEARCH_EXPRESSION} ILIKE :q"
+        params["q"] = f"%{q}%"
+
+    joined = f"FROM idf_ports p JOIN idfs i ON i.id = p.idf_id WHERE {filters}"
+
+    page_query = (
+        "SELECT i.code, i.title, i.table_data->'columns' AS columns, "
+        f"p.position, p.tray, p.panel, p.port, p.status, p.extra {joined}"
+    )
+    page_params = {**params, "limit": limit}
+    if cursor:
+        after_code, after_position = decode_cursor(cursor, 2)
+        if (
+            not isinstance(after_code, str)
+            or not isinstance(after_position, int)
+            or isinstance(after_position, bool)
+        ):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        page_query += " AND (i.code, p.position) > (:after_code, :after_position)"
+        page_params.update({"after_code": after_code, "after_position": after_position})
+    records = await database.fetch_all(page_query + " ORDER BY i.code, p.position LIMIT :limit", page_params)
+
+    if not cursor:
+        total = await database.fetch_val(f"SELECT COUNT(*) {joined}", params)
+        response.headers[TOTAL_COUNT_HEADER] = str(total or 0)
+    if len(records) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            [records[-1]["code"], records[-1]["position"]]
+        )
+
+    column_types: Dict[str, Dict[str, str]] = {}
+    matches = []
+    for record in records:
+        if record["code"] not in column_types:
+            columns = record["columns"]
+            columns = json.loads(columns) if isinstance(columns, str) else columns or []
+            column_types[record["code"]] = {
+                column.get("key"): column.get("type") for column in columns if isinstance(column, dict)
+            }
+        matches.append(PortMatch(
+            code=record["code"],
+            title=record["title"] or "",
+            row=record["position"],
+            values=join_row(record, column_types[record["code"]]),
+        ))
+    return matches
@@ -1,14 +1,36 @@
-import io
-import qrcode
-from fastapi import APIRouter, Depends, HTTPException, Request, Response
+import asyncio
+import hashlib
+import math
+import os
+import tempfile
+from pathlib import Path
+from typing import AsyncIterator, List, Optional, Tuple
 
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.core.http_cache import etag_matches, not_modified
+from app.core.qr_render import QR_MEDIA_TYPES, assemble_pdf, render_label_page, render_qr
+from app.core.workers import run_in_process
+from app.core.zipstream import stream_zip
 from app.db.database import database
 from app.routers.auth import get_current_user
+from app.routers.public_idfs import map_url_project_to_db_project, validate_cluster
 
 
 router = APIRouter(tags=["qr"])
 
+QR_CACHE_DIR = Path(settings.QR_CACHE_DIR)
+
+# Rendered images keyed by target URL + render options; the same key names the
+# on-disk copy, so a restarted worker serves from disk instead of re-rendering.
+# Only URLs under PUBLIC_BASE_URL are written to disk: a URL inferred from the
+# Host header is client-controlled and stays in the bounded memory cache.
+qr_cache = TTLCache(maxsize=settings.QR_CACHE_MAX_ENTRIES, ttl=settings.QR_CACHE_TTL_SECONDS)
+
 
 def _absolute_frontend_url(request: Request, cluster: str, project: str, code: str) -> str:
     """
@@ -19,46 +41,260 @@ def _absolute_frontend_url(request: Request, cluster: str, project: str, code: s
     if not base:
         # Ej: http://host:port  (sin path)
         base = str(request.base_url).rstrip("/")
-    
+
     # Map project name for URL - handle both old and new format
     project_mapping = {
         "Sabinas Project": "sabinas",
-        "Sabinas": "sabinas", 
+        "Sabinas": "sabinas",
         "Monclova Project": "monclova",
         "Monclova": "monclova",
         "Trinity": "trinity",
         "trinity": "trinity"
     }
     url_project = project_mapping.get(project, project.lower().replace(" ", ""))
-    
+
     # Front SPA route (without hash):
     return f"{base}/{cluster}/{url_project}/idf/{code}"
 
 
-@router.get("/{cluster}/{project}/idfs/{code}/qr.png")
-async def get_idf_qr_png(
+def _qr_cache_key(url: str, fmt: str, box_size: int, border: int) -> str:
+    return hashlib.sha256(f"{fmt}|{box_size}|{border}|{url}".encode("utf-8")).hexdigest()
+
+
+def _read_cached_file(path: Path) -> Optional[bytes]:
+    try:
+        return path.read_bytes()
+    except OSError:
+        return None
+
+
+def _write_cached_file(path: Path, content: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=".qr-", delete=False) as handle:
+        handle.write(content)
+    os.replace(handle.name, path)
+    _prune_cached_files(path.parent, settings.QR_CACHE_MAX_FILES)
+
+
+def _prune_cached_files(directory: Path, max_files: int) -> None:
+    """Remove the oldest cached files beyond ``max_files``."""
+    files = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file() and not entry.name.startswith("."):
+                try:
+                    files.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    continue
+    if len(files) <= max_files:
+        return
+    files.sort()
+    for _, path in files[:len(files) - max_files]:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def _is_canonical_url(url: str) -> bool:
+    base = settings.PUBLIC_BASE_URL
+    return bool(base) and url.startswith(base.rstrip("/") + "/")
+
+
+async def get_rendered_qr(url: str, fmt: str, box_size: int = 10, border: int = 4) -> bytes:
+    """Return the QR image for ``url``, rendering it in the worker pool on a miss."""
+    key = _qr_cache_key(url, fmt, box_size, border)
+    content = qr_cache.get(key)
+    if content is not None:
+        return content
+
+    if _is_canonical_url(url):
+        cached_path = QR_CACHE_DIR / f"{key}.{fmt}"
+        content = await run_in_threadpool(_read_cached_file, cached_path)
+        if content is None:
+            content = await run_in_process(render_qr, url, fmt, box_size, border)
+            await run_in_threadpool(_write_cached_file, cached_path, content)
+    else:
+        content = await run_in_process(render_qr, url, fmt, box_size, border)
+
+    qr_cache.set(key, content)
+    return content
+
+
+async def _qr_response(
+    request: Request,
     cluster: str,
     project: str,
     code: str,
-    request: Request,
-    _current_user: dict = Depends(get_current_user),
-):
+    fmt: str,
+    box_size: int,
+    border: int,
+) -> Response:
     # verifica existencia
     doc = await database.fetch_one(
-        "SELECT * FROM idfs WHERE cluster = :cluster AND project = :project AND code = :code",
+        "SELECT 1 FROM idfs WHERE cluster = :cluster AND project = :project AND code = :code",
         {"cluster": cluster, "project": project, "code": code}
     )
     if not doc:
         raise HTTPException(status_code=404, detail="IDF no encontrado")
 
     url = _absolute_frontend_url(request, cluster, project, code)
+    etag = f'"{_qr_cache_key(url, fmt, box_size, border)[:32]}"'
+    headers = {
+        "ETag": etag,
+        # Authenticated endpoint: browser cache only, revalidated after max-age
+        "Cache-Control": f"private, max-age={settings.QR_CACHE_MAX_AGE}",
+    }
+    if etag_matches(request, etag):
+        return not_modified(headers)
+
+    content = await get_rendered_qr(url, fmt, box_size, border)
+    return Response(content=content, media_type=QR_MEDIA_TYPES[fmt], headers=headers)
+
+
+@router.get("/{cluster}/{project}/idfs/{code}/qr.png")
+async def get_idf_qr_png(
+    cluster: str,
+    project: str,
+    code: str,
+    request: Request,
+    box_size: int = Query(10, ge=1, le=40),
+    border: int = Query(4, ge=0, le=16),
+    _current_user: dict = Depends(get_current_user),
+):
+    return await _qr_response(request, cluster, project, code, "png", box_size, border)
 
-    qr = qrcode.QRCode(version=1, box_size=10, border=4)
-    qr.add_data(url)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
 
-    buf = io.BytesIO()
-    img.save(buf, format="PNG")
-    buf.seek(0)
-    return Response(content=buf.read(), media_type="image/png")
+@router.get("/{cluster}/{project}/idfs/{code}/qr.svg")
+async def get_idf_qr_svg(
+    cluster: str,
+    project: str,
+    code: str,
+    request: Request,
+    box_size: int = Query(10, ge=1, le=40),
+    border: int = Query(4, ge=0, le=16),
+    _current_user: dict = Depends(get_current_user),
+):
+    return await _qr_response(request, cluster, project, code, "svg", box_size, border)
+
+
+# ---------------------------------------------------------------------------
+# Bulk label generation
+# ---------------------------------------------------------------------------
+
+# QR codes rendered concurrently per batch when building a ZIP
+LABEL_BATCH_SIZE = 32
+
+
+async def _label_targets(
+    request: Request, cluster: str, project: str, codes: Optional[str]
+) -> List[Tuple[str, str]]:
+    """``(code, url)`` for every IDF in the project, or only the listed codes."""
+    db_project = map_url_project_to_db_project(project)
+    query = "SELECT code FROM idfs WHERE cluster = :cluster AND project = :project"
+    params = {"cluster": cluster, "project": db_project}
+
+    if codes:
+        wanted = [code.strip() for code in codes.split(",") if code.strip()]
+        query += " AND code = ANY(:codes)"
+        params["codes"] = wanted
+
+    rows = await database.fetch_all(query + " ORDER BY code", params)
+    if not rows:
+        raise HTTPException(status_code=404, detail="No IDFs found for labels")
+
+    return [
+        (row["code"], _absolute_frontend_url(request, cluster, db_project, row["code"]))
+        for row in rows
+    ]
+
+
+async def _render_pages(
+    targets: List[Tuple[str, str]], columns: int, rows: int
+) -> List[bytes]:
+    per_page = columns * rows
+    pages = [targets[start:start + per_page] for start in range(0, len(targets), per_page)]
+    # One worker job per page so large sites render across all processes
+    return await asyncio.gather(*[
+        run_in_process(render_label_page, [(url, code) for code, url in page], columns, rows)
+        for page in pages
+    ])
+
+
+@router.get("/{cluster}/{project}/qr/labels.zip")
+async def get_qr_labels_zip(
+    request: Request,
+    cluster: str = Depends(validate_cluster),
+    project: str = "",
+    codes: Optional[str] = Query(None, description="Comma-separated IDF codes"),
+    fmt: str = Query("png", alias="format", pattern="^(png|svg)$"),
+    _current_user: dict = Depends(get_current_user),
+):
+    """ZIP with one QR image per IDF, named after its code"""
+    targets = await _label_targets(request, cluster, project, codes)
+
+    async def entries() -> AsyncIterator[Tuple[str, bytes]]:
+        for start in range(0, len(targets), LABEL_BATCH_SIZE):
+            batch = targets[start:start + LABEL_BATCH_SIZE]
+            images = await asyncio.gather(*[get_rendered_qr(url, fmt) for _, url in batch])
+            for (code, _), content in zip(batch, images):
+                yield f"{code}.{fmt}", content
+
+    return StreamingResponse(
+        stream_zip(entries()),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{cluster}-{project}-qr.zip"'},
+    )
+
+
+@router.get("/{cluster}/{project}/qr/labels.pdf")
+async def get_qr_labels_pdf(
+    request: Request,
+    cluster: str = Depends(validate_cluster),
+    project: str = "",
+    codes: Optional[str] = Query(None, description="Comma-separated IDF codes"),
+    columns: int = Query(4, ge=1, le=8),
+    rows: int = Query(6, ge=1, le=12),
+    _current_user: dict = Depends(get_current_user),
+):
+    """Print-ready A4 label sheets with code captions, one PDF page per sheet"""
+    targets = await _label_targets(request, cluster, project, codes)
+    pages = await _render_pages(targets, columns, rows)
+    content = await run_in_process(assemble_pdf, pages)
+    return Response(
+        content=content,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'inline; filename="{cluster}-{project}-qr.pdf"'},
+    )
+
+
+@router.get("/{cluster}/{project}/qr/labels.png")
+async def get_qr_labels_png(
+    request: Request,
+    cluster: str = Depends(validate_cluster),
+    project: str = "",
+    codes: Optional[str] = Query(None, description="Comma-separated IDF codes"),
+    columns: int = Query(4, ge=1, le=8),
+    rows: int = Query(6, ge=1, le=12),
+    page: int = Query(1, ge=1),
+    _current_user: dict = Depends(get_current_user),
+):
+    """A single label sheet as PNG; X-Total-Pages tells how many exist"""
+    targets = await _label_targets(request, cluster, project, codes)
+    per_page = columns * rows
+    total_pages = math.ceil(len(targets) / per_page)
+    if page > total_pages:
+        raise HTTPException(status_code=404, detail="Page not found")
+
+    start = (page - 1) * per_page
+    content = await run_in_process(
+        render_label_page,
+        [(url, code) for code, url in targets[start:start + per_page]],
+        columns,
+        rows,
+    )
+    return Response(
+        content=content,
+        media_type="image/png",
+        headers={"X-Total-Pages": str(total_pages)},
+    )
@@ -0,0 +1,104 @@
+"""Time the get_idf response body for a large patch table.
+
+Compares the model path (IdfPublic + jsonable_encoder + JSONResponse) with the
+dict path used by the public handlers, rendered with the stdlib json and, when
+installed, orjson. Run from the repository root:
+
+    PYTHONPATH=. python scripts/benchmarks/idf_response_serialization.py
+"""
+import argparse
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.core import serialization
+from app.core.media import normalize_media_fields
+from app.models.idf_models import IdfPublic
+
+STATUSES = ("ok", "revision", "falla", "libre", "reservado")
+
+
+def build_idf(rows: int):
+    row = {
+        "cluster": "Trinity",
+        "project": "Sabinas Project",
+        "code": "IDF-BENCH",
+        "title": "Benchmark IDF",
+        "description": "Synthetic IDF",
+        "site": "Plant",
+        "room": "Room 1",
+        "images": [f"Trinity/sabinas/IDF-BENCH/images/{index}.jpg" for index in range(10)],
+        "documents": ["Trinity/sabinas/IDF-BENCH/documents/manual.pdf"],
+        "diagrams": [],
+        "location": "Trinity/sabinas/IDF-BENCH/location.png",
+        "dfo": [],
+        "logo": "Trinity/sabinas/logo.png",
+    }
+    table = {
+        "columns": [
+            {"key": "tray", "label": "Tray", "type": "text"},
+            {"key": "panel", "label": "Panel", "type": "text"},
+            {"key": "port", "label": "Port", "type": "number"},
+            {"key": "status", "label": "Status", "type": "status", "options": list(STATUSES)},
+            {"key": "destination", "label": "Destination", "type": "text"},
+            {"key": "notes", "label": "Notes", "type": "text"},
+        ],
+        "rows": [
+            {
+                "tray": f"T{index // 48 + 1}",
+                "panel": f"P{index // 24 + 1}",
+                "port": index % 24 + 1,
+                "status": STATUSES[index % len(STATUSES)],
+                "destination": f"Switch {index // 48 + 1} / Gi1/0/{index % 48 + 1}",
+                "notes": "",
+            }
+            for index in range(rows)
+        ],
+    }
+    health = {"level": "yellow", "counts": {status: rows // len(STATUSES) for status in STATUSES}}
+    return row, normalize_media_fields(row), table, health
+
+
+def model_path(row, media, table, health) -> bytes:
+    model = IdfPublic(**{**row, **media, "table": table, "health": health})
+    return JSONResponse(content=jsonable_encoder(model)).body
+
+
+def dict_path(row, media, table, health) -> bytes:
+    return serialization.dumps(serialization.idf_public_payload(row, media, table, health))
+
+
+def best_of(function, args, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    idf = build_idf(args.rows)
+    print(f"IDF with {args.rows} table rows, best of {args.repeat} (ms)")
+
+    serialization.settings.ORJSON_RESPONSES = False
+    baseline = best_of(model_path, idf, args.repeat)
+    print(f"  IdfPublic + jsonable_encoder + json  : {baseline:8.2f}")
+    print(f"  dict + json                          : {best_of(dict_path, idf, args.repeat):8.2f}")
+
+    if serialization.orjson is not None:
+        serialization.settings.ORJSON_RESPONSES = True
+        print(f"  dict + orjson                        : {best_of(dict_path, idf, args.repeat):8.2f}")
+    else:
+        print("  dict + orjson                        : orjson is not installed")
+    print(f"  body size: {len(model_path(*idf)) / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import asyncio
+
+from app.core.health import health_columns_for_table
+from app.db.database import database, init_database, close_database
+from app.db.ports import load_table
+
+BATCH_SIZE = 200
+
+
+async def backfill_idf_health():
+    """Populate the materialized health_* columns for every IDF"""
+    await init_database()
+
+    try:
+        last_id = 0
+        updated = 0
+
+        while True:
+            # Walk the table in id order so only one batch of table_data is in memory
+            rows = await database.fetch_all(
+                """
+                SELECT id, code, table_data FROM idfs
+                 WHERE id > :last_id
+                 ORDER BY id
+                 LIMIT :limit
+                """,
+                {"last_id": last_id, "limit": BATCH_SIZE},
+            )
+            if not rows:
+                break
+
+            for row in rows:
+                # Rows come from idf_ports once the patch table has been migrated
+                table_data = await load_table(row)
+                columns = health_columns_for_table(table_data)
+                await database.execute(
+                    """
+                    UPDATE idfs
+                       SET health_level = :health_level,
+                           health_ok = :health_ok,
+                           health_revision = :health_revision,
+                           health_falla = :health_falla,
+                           health_libre = :health_libre,
+                           health_reservado = :health_reservado
+                     WHERE id = :id
+                    """,
+                    {"id": row["id"], **columns},
+                )
+                updated += 1
+                print(f"  ✅ {row['code']}: {columns['health_level'] or 'no table'}")
+
+            last_id = rows[-1]["id"]
+
+        print(f"✅ Backfilled health for {updated} IDFs")
+
+    except Exception as e:
+        print(f"❌ Error backfilling health: {e}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        await close_database()
+
+
+if __name__ == "__main__":
+    asyncio.run(backfill_idf_health())
@@ -0,0 +1,27 @@
+import asyncio
+
+from app.db.database import database, init_database, close_database
+from app.db.ports import migrate_table_data_to_ports
+
+BATCH_SIZE = 200
+
+
+async def migrate_ports():
+    """Move patch-table rows from idfs.table_data into idf_ports"""
+    await init_database()
+
+    try:
+        migrated = await migrate_table_data_to_ports(BATCH_SIZE)
+        ports = await database.fetch_val("SELECT COUNT(*) FROM idf_ports")
+        print(f"✅ Migrated {migrated} IDF tables ({ports} ports in idf_ports)")
+
+    except Exception as e:
+        print(f"❌ Error migrating patch tables: {e}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        await close_database()
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate_ports())
@@ -0,0 +1,30 @@
+import asyncio
+
+from app.core.media import MEDIA_VERSION
+from app.db.database import database, init_database, close_database
+from app.db.media import migrate_media_fields
+
+BATCH_SIZE = 200
+
+
+async def normalize_media():
+    """Rewrite legacy media columns of every IDF into the canonical JSONB form"""
+    await init_database()
+
+    try:
+        migrated = await migrate_media_fields(BATCH_SIZE)
+        remaining = await database.fetch_val(
+            "SELECT COUNT(*) FROM idfs WHERE media_version < :version", {"version": MEDIA_VERSION}
+        )
+        print(f"✅ Normalized media of {migrated} IDFs ({remaining} still pending)")
+
+    except Exception as e:
+        print(f"❌ Error normalizing media fields: {e}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        await close_database()
+
+
+if __name__ == "__main__":
+    asyncio.run(normalize_media())
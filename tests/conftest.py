@@ -0,0 +1,47 @@
+import sys
+import types
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+bcrypt_stub = types.SimpleNamespace()
+
+def _hashpw(password: bytes, _salt: bytes) -> bytes:
+    return password + b"-hashed"
+
+
+def _gensalt() -> bytes:
+    return b"salt"
+
+
+def _checkpw(password: bytes, hashed: bytes) -> bool:
+    return hashed == password + b"-hashed"
+
+
+bcrypt_stub.hashpw = _hashpw
+bcrypt_stub.gensalt = _gensalt
+bcrypt_stub.checkpw = _checkpw
+
+sys.modules.setdefault("bcrypt", bcrypt_stub)
+
+import pydantic.networks
+
+pydantic.networks.import_email_validator = lambda: None
+pydantic.networks.validate_email = lambda value, *args, **kwargs: (value, value)
+
+jwt_stub = types.SimpleNamespace()
+
+jwt_stub.encode = lambda data, secret, algorithm=None: "token"
+
+
+def _decode(_token: str, _secret: str, algorithms=None):
+    return {"sub": "1"}
+
+
+jwt_stub.decode = _decode
+jwt_stub.ExpiredSignatureError = Exception
+jwt_stub.InvalidTokenError = Exception
+
+sys.modules.setdefault("jwt", jwt_stub)
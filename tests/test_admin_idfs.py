@@ -1,57 +1,36 @@
-import sys
-import types
 import asyncio
-from pathlib import Path
+import json
+from contextlib import asynccontextmanager
 
 import pytest
 from fastapi import HTTPException
 
-ROOT = Path(__file__).resolve().parents[1]
-if str(ROOT) not in sys.path:
-    sys.path.insert(0, str(ROOT))
+from app.core.media import MEDIA_LIST_FIELDS, MEDIA_VERSION, canonical_media, media_bind_values
+from app.core.serialization import idf_public_payload
+from app.models.idf_models import IdfCreate, IdfUpsert
+from app.routers.admin_idfs import _prepare_common_values, create_idf
 
-bcrypt_stub = types.SimpleNamespace()
 
-def _hashpw(password: bytes, _salt: bytes) -> bytes:
-    return password + b"-hashed"
+@pytest.fixture(autouse=True)
+def fake_ports(monkeypatch):
+    """Record idf_ports writes issued inside the create transaction."""
+    written = []
 
+    @asynccontextmanager
+    async def fake_transaction():
+        yield
 
-def _gensalt() -> bytes:
-    return b"salt"
+    async def fake_execute(query, values=None):
+        assert query.startswith("DELETE FROM idf_ports")
 
+    async def fake_execute_many(query, values):
+        assert "INSERT INTO idf_ports" in query
+        written.extend(values)
 
-def _checkpw(password: bytes, hashed: bytes) -> bool:
-    return hashed == password + b"-hashed"
-
-
-bcrypt_stub.hashpw = _hashpw
-bcrypt_stub.gensalt = _gensalt
-bcrypt_stub.checkpw = _checkpw
-
-sys.modules.setdefault("bcrypt", bcrypt_stub)
-
-import pydantic.networks
-
-pydantic.networks.import_email_validator = lambda: None
-pydantic.networks.validate_email = lambda value, *args, **kwargs: (value, value)
-
-jwt_stub = types.SimpleNamespace()
-
-jwt_stub.encode = lambda data, secret, algorithm=None: "token"
-
-
-def _decode(_token: str, _secret: str, algorithms=None):
-    return {"sub": "1"}
-
-
-jwt_stub.decode = _decode
-jwt_stub.ExpiredSignatureError = Exception
-jwt_stub.InvalidTokenError = Exception
-
-sys.modules.setdefault("jwt", jwt_stub)
-
-from app.models.idf_models import IdfCreate
-from app.routers.admin_idfs import create_idf
+    monkeypatch.setattr("app.routers.admin_idfs.database.transaction", fake_transaction)
+    monkeypatch.setattr("app.db.ports.database.execute", fake_execute)
+    monkeypatch.setattr("app.db.ports.database.execute_many", fake_execute_many)
+    return written
 
 
 def test_create_idf_success(monkeypatch):
@@ -61,6 +40,7 @@ def test_create_idf_success(monkeypatch):
         if "RETURNING *" in query:
             assert values is not None
             return {
+                "id": 1,
                 "cluster": values["cluster"],
                 "project": values["project"],
                 "code": values["code"],
@@ -89,6 +69,33 @@ def test_create_idf_success(monkeypatch):
     assert result.site == "Site"
 
 
+def test_fetched_idf_round_trips_through_upsert():
+    row = {
+        "cluster": "Trinity",
+        "project": "Sabinas Project",
+        "code": "IDF-1",
+        "title": "Rack room",
+        "description": None,
+        "site": "North",
+        "room": "B2",
+        "images": [{"url": "/static/a.jpg", "name": "a.jpg", "kind": "image"}],
+        "documents": [],
+        "diagrams": [],
+        "location": {"url": "/static/maps/1.png", "name": "1.png", "kind": "image"},
+        "dfo": [],
+        "logo": "logos/sabinas.png",
+        "media_version": MEDIA_VERSION,
+    }
+    media = canonical_media(row)
+    fetched = json.loads(json.dumps(idf_public_payload(row, media, None, None)))
+
+    upsert = IdfUpsert.model_validate(fetched)
+    values = _prepare_common_values(upsert)
+
+    assert {field: values[field] for field in media} == media_bind_values(media)
+    assert values["title"] == "Rack room"
+
+
 def test_create_idf_duplicate(monkeypatch):
     async def fake_fetch_one(query, values=None):
         if "SELECT 1 FROM idfs" in query:
@@ -104,3 +111,101 @@ def test_create_idf_duplicate(monkeypatch):
 
     assert exc_info.value.status_code == 409
     assert exc_info.value.detail == "IDF already exists"
+
+
+def test_create_idf_materializes_health(monkeypatch, fake_ports):
+    captured = {}
+
+    async def fake_fetch_one(query, values=None):
+        if "SELECT 1 FROM idfs" in query:
+            return None
+        if "RETURNING *" in query:
+            captured.update(values)
+            # JSONB columns come back decoded
+            return {**values, **{field: json.loads(values[field]) for field in MEDIA_LIST_FIELDS}, "id": 7}
+        raise AssertionError(f"Unexpected query: {query}")
+
+    monkeypatch.setattr("app.routers.admin_idfs.database.fetch_one", fake_fetch_one)
+
+    payload = IdfCreate(
+        code="IDF2",
+        title="Title",
+        table={
+            "columns": [{"key": "status", "label": "Estado", "type": "status"}],
+            "rows": [{"status": "OK"}, {"status": "Falla"}, {"status": "Libre"}],
+        },
+    )
+
+    result = asyncio.run(create_idf(payload, cluster="trk", project="proj", _admin={"role": "admin"}))
+
+    assert captured["health_level"] == "red"
+    assert captured["health_ok"] == 1
+    assert captured["health_falla"] == 1
+    assert captured["health_libre"] == 1
+    assert result.health.level == "red"
+
+    # Rows go to idf_ports; table_data keeps only the column definitions
+    assert "rows" not in captured["table_data"]
+    assert [(port["idf_id"], port["position"], port["status"]) for port in fake_ports] == [
+        (7, 0, "OK"), (7, 1, "Falla"), (7, 2, "Libre"),
+    ]
+    assert [row["status"] for row in result.table.rows] == ["OK", "Falla", "Libre"]
+
+
+def test_patch_idf_table_applies_operations_in_order(monkeypatch):
+    from app.models.idf_models import TablePatch
+    from app.routers import admin_idfs
+
+    calls = []
+
+    async def fake_fetch_one(query, values=None):
+        assert "FOR UPDATE" in query
+        return {"id": 3, "table_data": '{"columns": [], "rows": [{"status": "OK"}]}'}
+
+    async def fake_migrate(ids):
+        calls.append(("migrate", ids))
+
+    async def fake_update(idf_id, row, values):
+        calls.append(("set", row, values))
+        return True
+
+    async def fake_insert(idf_id, row, values):
+        calls.append(("insert", row, values))
+        return 1
+
+    async def fake_delete(idf_id, row):
+        calls.append(("delete", row))
+        return row == 0
+
+    async def fake_refresh(idf_id):
+        return {"level": "red", "counts": {"ok": 0, "revision": 0, "falla": 1, "libre": 1, "reservado": 0}}
+
+    monkeypatch.setattr(admin_idfs.database, "fetch_one", fake_fetch_one)
+    monkeypatch.setattr(admin_idfs, "migrate_idf_ports", fake_migrate)
+    monkeypatch.setattr(admin_idfs, "update_port", fake_update)
+    monkeypatch.setattr(admin_idfs, "insert_port", fake_insert)
+    monkeypatch.setattr(admin_idfs, "delete_port", fake_delete)
+    monkeypatch.setattr(admin_idfs, "refresh_health", fake_refresh)
+
+    patch = TablePatch(operations=[
+        {"op": "set", "row": 0, "values": {"status": "Falla"}},
+        {"op": "insert", "values": {"status": "Libre"}},
+        {"op": "delete", "row": 0},
+    ])
+    health = asyncio.run(admin_idfs.patch_idf_table(patch, "trk", "proj", "IDF1", {}))
+
+    assert health["level"] == "red"
+    assert calls == [
+        ("migrate", [3]),
+        ("set", 0, {"status": "Falla"}),
+        ("insert", None, {"status": "Libre"}),
+        ("delete", 0),
+    ]
+
+    missing = TablePatch(operations=[{"op": "delete", "row": 9}])
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(admin_idfs.patch_idf_table(missing, "trk", "proj", "IDF1", {}))
+    assert exc_info.value.status_code == 404
+
+    with pytest.raises(ValueError):
+        TablePatch(operations=[{"op": "set", "values": {"status": "OK"}}])
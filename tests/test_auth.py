@@ -0,0 +1,37 @@
+import asyncio
+
+from app.routers import auth
+
+
+def test_get_current_user_from_token_caches_lookup(monkeypatch):
+    calls = []
+
+    async def fake_fetch_one(query, values=None):
+        calls.append(values)
+        return {"id": 1, "email": "a@example.com", "role": "visitor", "is_active": True}
+
+    monkeypatch.setattr("app.routers.auth.database.fetch_one", fake_fetch_one)
+    auth.invalidate_cached_user()
+
+    first = asyncio.run(auth.get_current_user_from_token("token"))
+    second = asyncio.run(auth.get_current_user_from_token("token"))
+
+    assert first == second
+    assert len(calls) == 1
+
+    auth.invalidate_cached_user(1)
+    asyncio.run(auth.get_current_user_from_token("token"))
+    assert len(calls) == 2
+
+
+def test_password_helpers_run_on_pool():
+    from app.core.security import hash_password_async, password_pool_stats, verify_password_async
+
+    async def scenario():
+        hashed = await hash_password_async("secret")
+        return await verify_password_async("secret", hashed)
+
+    assert asyncio.run(scenario()) is True
+    stats = password_pool_stats()
+    assert stats["in_flight"] == 0
+    assert stats["completed"] >= 2
@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+from app.core.response_cache import CachedResponse, MemoryBackend, invalidate_responses, response_cache
+from app.db import cache_events
+from app.routers import auth
+
+
+def test_publish_sends_pg_notify(monkeypatch):
+    sent = []
+
+    async def fake_execute(query, values=None):
+        sent.append((query, values))
+
+    monkeypatch.setattr("app.db.cache_events.database.execute", fake_execute)
+    monkeypatch.setattr(response_cache, "backend", MemoryBackend(maxsize=8, ttl=60))
+
+    asyncio.run(invalidate_responses("Trinity", "Sabinas Project"))
+
+    query, values = sent[0]
+    assert "pg_notify" in query
+    assert values["channel"] == cache_events.CACHE_EVENTS_CHANNEL
+    payload = json.loads(values["payload"])
+    assert payload == {"origin": cache_events.WORKER_ID, "kind": "idfs", "key": ["Trinity", "Sabinas Project"]}
+
+
+def test_events_from_other_workers_evict_local_entries(monkeypatch):
+    monkeypatch.setattr(response_cache, "backend", MemoryBackend(maxsize=8, ttl=60))
+    auth.user_cache.set(7, {"id": 7})
+
+    async def scenario():
+        _, slot = await response_cache.get("Trinity", "Sabinas Project", "idf:IDF-1")
+        await response_cache.set(slot, CachedResponse(body="{}"))
+
+        # Our own events were already applied by the writer
+        cache_events._dispatch(json.dumps({"origin": cache_events.WORKER_ID, "kind": "users", "key": 7}))
+        await asyncio.sleep(0)
+        assert 7 in auth.user_cache
+
+        cache_events._dispatch(json.dumps({"origin": "other", "kind": "users", "key": 7}))
+        cache_events._dispatch(
+            json.dumps({"origin": "other", "kind": "idfs", "key": ["Trinity", "Sabinas Project"]})
+        )
+        await asyncio.gather(*cache_events._pending)
+
+        assert 7 not in auth.user_cache
+        cached, _ = await response_cache.get("Trinity", "Sabinas Project", "idf:IDF-1")
+        assert cached is None
+
+    asyncio.run(scenario())
+
+
+def test_handler_failures_are_logged_with_traceback(monkeypatch, caplog):
+    def broken(key):
+        raise RuntimeError("boom")
+
+    monkeypatch.setitem(cache_events._handlers, "broken", [broken])
+
+    with caplog.at_level("WARNING", logger="app.db.cache_events"):
+        asyncio.run(cache_events._run_handlers("broken", 1))
+
+    assert "Cache event handler for 'broken' failed" in caplog.text
+    assert caplog.records[-1].exc_info[0] is RuntimeError
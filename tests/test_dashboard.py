@@ -0,0 +1,59 @@
+import asyncio
+
+from app.db import rollup
+from app.routers import dashboard
+
+
+def _row(project, site, idfs, red, falla):
+    return {
+        "project": project, "site": site, "idfs": idfs,
+        "green": idfs - red, "yellow": 0, "red": red, "gray": 0,
+        "ok": 10, "revision": 0, "falla": falla, "libre": 2, "reservado": 0,
+    }
+
+
+def test_health_rollup_groups_sites_by_project(monkeypatch):
+    captured = {}
+
+    async def fake_fetch_all(query, values=None):
+        captured["query"], captured["values"] = query, values
+        return [
+            _row("Sabinas Project", "", 1, 0, 0),
+            _row("Sabinas Project", "TrinityRail HQ", 3, 1, 4),
+            _row("Trinity", "Plant", 2, 2, 1),
+        ]
+
+    monkeypatch.setattr("app.routers.dashboard.database.fetch_all", fake_fetch_all)
+
+    projects = asyncio.run(dashboard.get_health_rollup("Trinity", None, {}))
+
+    assert "FROM idf_health_rollup" in captured["query"]
+    sabinas = projects[0]
+    assert sabinas.project == "Sabinas Project"
+    assert [site.site for site in sabinas.sites] == ["", "TrinityRail HQ"]
+    assert sabinas.idfs == 4 and sabinas.levels.red == 1 and sabinas.levels.green == 3
+    assert sabinas.ports.ok == 20 and sabinas.ports.falla == 4
+    assert projects[1].ports.falla == 1
+
+    asyncio.run(dashboard.get_health_rollup("Trinity", "sabinas", {}))
+    assert captured["values"]["project"] == "Sabinas Project"
+
+
+def test_rollup_refresh_coalesces_writes(monkeypatch):
+    refreshes = []
+
+    async def fake_execute(query, values=None):
+        refreshes.append(query)
+
+    monkeypatch.setattr("app.db.rollup.database.execute", fake_execute)
+    monkeypatch.setattr(rollup.settings, "HEALTH_ROLLUP_REFRESH_DELAY", 0.01)
+
+    async def burst():
+        for _ in range(5):
+            rollup.schedule_rollup_refresh()
+        await asyncio.sleep(0.05)
+        rollup.schedule_rollup_refresh()
+        await asyncio.sleep(0.05)
+
+    asyncio.run(burst())
+    assert refreshes == [rollup.REFRESH_ROLLUP_QUERY] * 2
@@ -0,0 +1,183 @@
+import asyncio
+import io
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from asyncpg.exceptions import UniqueViolationError
+
+from app.routers import devices
+
+
+class FakeCopyConnection:
+    """Stands in for the asyncpg connection behind ``databases``."""
+
+    def __init__(self, state):
+        self.state = state
+
+    async def copy_records_to_table(self, table, records, columns):
+        rows = [dict(zip(columns, record)) for record in records]
+        taken = {row.get("serial") for row in self.state["pending"]}
+        for row in rows:
+            if row["serial"] and row["serial"] in taken:
+                exc = UniqueViolationError("duplicate key value violates unique constraint")
+                exc.detail = f"Key (cluster, serial)=({row['cluster']}, {row['serial']}) already exists."
+                raise exc
+        self.state["pending"].extend(rows)
+        self.state["copies"] += 1
+
+
+class FakeDeviceDatabase:
+    def __init__(self, rows):
+        self.state = {"rows": list(rows), "pending": None, "copies": 0}
+
+    async def fetch_one(self, query, values=None):
+        return {"?column?": 1}
+
+    @asynccontextmanager
+    async def connection(self):
+        yield self
+
+    @property
+    def raw_connection(self):
+        return FakeCopyConnection(self.state)
+
+    @asynccontextmanager
+    async def transaction(self):
+        self.state["pending"] = list(self.state["rows"])
+        try:
+            yield
+        except BaseException:
+            self.state["pending"] = None
+            raise
+        self.state["rows"], self.state["pending"] = self.state["pending"], None
+
+    async def fetch_all(self, query, values=None):
+        assert "serial = ANY" in query
+        removed = [
+            row
+            for row in self.state["pending"]
+            if row.get("project") == values["project"] and row.get("serial") in values["serials"]
+        ]
+        self.state["pending"] = [row for row in self.state["pending"] if row not in removed]
+        return [{"serial": row["serial"]} for row in removed]
+
+    async def execute(self, query, values=None):
+        assert query.startswith("DELETE FROM devices")
+        self.state["pending"] = [
+            row for row in self.state["pending"] if row["idf_code"] != values["idf_code"]
+        ]
+
+
+def _csv(text: str) -> UploadFile:
+    return UploadFile(file=io.BytesIO(text.encode("utf-8-sig")), filename="devices.csv")
+
+
+def _upload(db, monkeypatch, text):
+    monkeypatch.setattr(devices, "database", db)
+    return asyncio.run(
+        devices.upload_csv_devices(_csv(text), "IDF-1", "Trinity", "sabinas", {})
+    )
+
+
+def test_upload_csv_copies_in_batches(monkeypatch):
+    monkeypatch.setattr(devices.settings, "DEVICE_COPY_BATCH_SIZE", 2)
+    db = FakeDeviceDatabase([{"idf_code": "IDF-1", "name": "old"}, {"idf_code": "IDF-2", "name": "keep"}])
+
+    result = _upload(db, monkeypatch, "name,model,serial\nsw-1,C9300, S1 \nsw-2,,S2\nsw-3,C9200,S3\n")
+
+    assert result["message"] == "Uploaded 3 devices successfully"
+    assert db.state["copies"] == 2
+    names = [row["name"] for row in db.state["rows"]]
+    assert names == ["keep", "sw-1", "sw-2", "sw-3"]
+    loaded = db.state["rows"][1]
+    assert loaded["project"] == "Sabinas Project"
+    assert loaded["serial"] == "S1"
+    assert db.state["rows"][2]["model"] is None
+
+
+def test_upload_csv_reports_invalid_lines_and_keeps_devices(monkeypatch):
+    db = FakeDeviceDatabase([{"idf_code": "IDF-1", "name": "old"}])
+
+    with pytest.raises(HTTPException) as excinfo:
+        _upload(db, monkeypatch, "name,serial\nsw-1,S1\n,S2\nsw-3,S3,extra\n")
+
+    assert excinfo.value.status_code == 422
+    assert [(e["line"], e["field"]) for e in excinfo.value.detail["errors"]] == [(3, "name"), (4, None)]
+    assert db.state["rows"] == [{"idf_code": "IDF-1", "name": "old"}]
+
+
+def test_upload_csv_rejects_duplicate_serials(monkeypatch):
+    db = FakeDeviceDatabase([])
+
+    with pytest.raises(HTTPException) as excinfo:
+        _upload(db, monkeypatch, "name,serial\nsw-1,S1\nsw-2,S1\n")
+
+    assert excinfo.value.detail["errors"] == [
+        {"line": 3, "field": "serial", "error": "Duplicate of line 2"}
+    ]
+
+
+def test_upload_csv_moves_devices_between_idfs(monkeypatch):
+    db = FakeDeviceDatabase(
+        [{"project": "Sabinas Project", "idf_code": "IDF-2", "name": "sw-1", "serial": "S1"}]
+    )
+
+    result = _upload(db, monkeypatch, "name,serial\nsw-1,S1\nsw-2,S2\n")
+
+    assert result["moved"] == ["S1"]
+    assert [(row["idf_code"], row["serial"]) for row in db.state["rows"]] == [("IDF-1", "S1"), ("IDF-1", "S2")]
+
+
+def test_upload_csv_keeps_devices_of_other_projects(monkeypatch):
+    kept = {"project": "Monclova Project", "idf_code": "IDF-9", "name": "sw-1", "serial": "S1"}
+    db = FakeDeviceDatabase([kept])
+
+    with pytest.raises(HTTPException) as excinfo:
+        _upload(db, monkeypatch, "name,serial\nsw-0,S0\nsw-1,S1\n")
+
+    assert excinfo.value.status_code == 409
+    assert [error["line"] for error in excinfo.value.detail["errors"]] == [3]
+    assert db.state["rows"] == [kept]
+
+
+def test_duplicate_serial_points_at_csv_line():
+    exc = UniqueViolationError("duplicate key value violates unique constraint")
+    exc.detail = "Key (cluster, serial)=(Trinity, S2) already exists."
+
+    error = devices._duplicate_serial(exc, {"S1": 2, "S2": 3})
+
+    assert error.status_code == 409
+    assert error.detail["errors"] == [{"line": 3, "field": "serial", "error": exc.detail}]
+    assert devices._duplicate_serial(exc).detail == exc.detail
+
+
+def test_list_devices_uses_keyset_cursor(monkeypatch):
+    from fastapi import Response
+
+    captured = []
+
+    async def fake_fetch_all(query, values=None):
+        captured.append((query, values))
+        return [
+            {"id": 7 + i, "cluster": "Trinity", "project": "Sabinas Project", "idf_code": "IDF-1",
+             "name": f"sw-{i}", "model": "C9300", "serial": None, "rack": "R1", "site": None, "notes": None}
+            for i in range(2)
+        ]
+
+    monkeypatch.setattr("app.routers.devices.database.fetch_all", fake_fetch_all)
+
+    response = Response()
+    result = asyncio.run(
+        devices.list_devices(response, "Trinity", "sabinas", "IDF-1", "C9300", None, None, 2, None, {})
+    )
+    assert [device.id for device in result] == [7, 8]
+    cursor = response.headers["x-next-cursor"]
+
+    asyncio.run(
+        devices.list_devices(Response(), "Trinity", "sabinas", None, None, None, None, 2, cursor, {})
+    )
+    query, values = captured[-1]
+    assert "id > :after_id" in query and values["after_id"] == 8
+    assert "model" not in values
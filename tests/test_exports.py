@@ -0,0 +1,72 @@
+import asyncio
+import io
+import zipfile
+
+from app.routers import exports
+
+
+def _collect(response):
+    async def read():
+        return b"".join([chunk async for chunk in response.body_iterator])
+
+    return asyncio.run(read())
+
+
+def _device(i):
+    return {
+        "project": "Sabinas Project", "idf_code": "IDF-1", "name": f"sw-{i}", "model": "C9300",
+        "serial": f"S{i}", "rack": None, "site": "MDF", "notes": 'says "hi", <ok>',
+    }
+
+
+def test_device_csv_export_streams_rows(monkeypatch):
+    queries = []
+
+    async def fake_iterate(query, values=None):
+        queries.append((query, values))
+        for i in range(1200):
+            yield _device(i)
+
+    monkeypatch.setattr("app.routers.exports.database.iterate", fake_iterate)
+
+    response = asyncio.run(exports.export_project_devices("csv", "Trinity", "sabinas", "IDF-1", {}))
+    chunks = []
+
+    async def read():
+        async for chunk in response.body_iterator:
+            chunks.append(chunk)
+
+    asyncio.run(read())
+    lines = b"".join(chunks).decode("utf-8-sig").splitlines()
+
+    assert len(chunks) > 2
+    assert lines[0] == "project,idf_code,name,model,serial,rack,site,notes"
+    assert lines[1] == 'Sabinas Project,IDF-1,sw-0,C9300,S0,,MDF,"says ""hi"", <ok>"'
+    assert len(lines) == 1201
+    assert queries[0][1] == {"cluster": "Trinity", "project": "Sabinas Project", "idf_code": "IDF-1"}
+
+
+def test_patch_table_xlsx_export(monkeypatch):
+    async def fake_fetch_all(query, values=None):
+        return [
+            {"columns": '[{"key": "port", "label": "Port"}, {"key": "status", "label": "Status"}]'},
+            {"columns": [{"key": "port", "label": "Port"}, {"key": "vlan", "label": "VLAN"}]},
+        ]
+
+    async def fake_iterate(query, values=None):
+        assert "FROM idf_ports" in query
+        port = {"tray": None, "panel": None}
+        yield {**port, "code": "IDF-1", "title": "North", "port": "1", "status": "ok", "extra": "{}"}
+        yield {**port, "code": "IDF-2", "title": "South", "port": "2", "status": None, "extra": {"vlan": 30}}
+
+    monkeypatch.setattr("app.routers.exports.database.fetch_all", fake_fetch_all)
+    monkeypatch.setattr("app.routers.exports.database.iterate", fake_iterate)
+
+    response = asyncio.run(exports.export_patch_tables("xlsx", "Trinity", "sabinas", None, {}))
+    archive = zipfile.ZipFile(io.BytesIO(_collect(response)))
+
+    assert archive.testzip() is None
+    sheet = archive.read("xl/worksheets/sheet1.xml").decode("utf-8")
+    assert sheet.count("<row>") == 3
+    assert ">VLAN<" in sheet and "<v>30</v>" in sheet
+    assert "[Content_Types].xml" in archive.namelist()
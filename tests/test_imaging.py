@@ -0,0 +1,40 @@
+import asyncio
+
+from PIL import Image
+
+from app.core import imaging
+from app.core.workers import shutdown_process_pool
+
+
+def test_generate_variants_writes_webp_derivatives(monkeypatch, tmp_path):
+    monkeypatch.setattr(imaging.settings, "STATIC_DIR", str(tmp_path))
+    source = tmp_path / "cas" / "ab" / "cd" / "abcd.jpg"
+    source.parent.mkdir(parents=True)
+    Image.new("RGB", (2000, 1000), "red").save(source)
+
+    try:
+        variants = asyncio.run(imaging.generate_variants("cas/ab/cd/abcd.jpg"))
+    finally:
+        shutdown_process_pool()
+
+    assert variants == {
+        "thumb": "/static/cas/ab/cd/abcd.jpg.thumb.webp",
+        "medium": "/static/cas/ab/cd/abcd.jpg.medium.webp",
+    }
+    with Image.open(tmp_path / "cas" / "ab" / "cd" / "abcd.jpg.thumb.webp") as thumb:
+        assert thumb.format == "WEBP"
+        assert thumb.size == (320, 160)
+    assert sorted(path.name for path in source.parent.iterdir()) == [
+        "abcd.jpg", "abcd.jpg.medium.webp", "abcd.jpg.thumb.webp"
+    ]
+
+
+def test_variant_paths_keep_the_blob_extension():
+    assert imaging.variant_relative_path("cas/ab/cd/abcd.jpg", "thumb") != imaging.variant_relative_path(
+        "cas/ab/cd/abcd.jpeg", "thumb"
+    )
+
+
+def test_generate_variants_skips_documents(tmp_path):
+    assert asyncio.run(imaging.generate_variants("cas/ab/cd/abcd.pdf")) == {}
+
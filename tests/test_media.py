@@ -0,0 +1,107 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+from app.core.media import (
+    MEDIA_VERSION,
+    canonical_media,
+    media_bind_values,
+    normalize_location,
+    normalize_logo,
+    normalize_media_list,
+)
+from app.db.media import migrate_media_fields
+
+
+def test_normalize_media_list_repairs_legacy_encodings():
+    items = normalize_media_list(
+        [
+            "Trinity/sabinas/IDF-1/images/1.jpg",
+            "https://old-host.replit.dev/static/Trinity/sabinas/IDF-1/images/2.jpg",
+            json.dumps({"url": "/static/Trinity/sabinas/IDF-1/images/3.jpg", "name": "Rack"}),
+            "{'url': '/static/Trinity/sabinas/IDF-1/images/4.jpg', 'kind': 'image'}",
+            "https://host/static/{'url': '/static/Trinity/sabinas/IDF-1/images/5.jpg'}",
+            "",
+        ],
+        "images",
+    )
+
+    assert [item["url"] for item in items] == [
+        f"/static/Trinity/sabinas/IDF-1/images/{index}.jpg" for index in range(1, 6)
+    ]
+    assert items[0] == {
+        "url": "/static/Trinity/sabinas/IDF-1/images/1.jpg",
+        "name": "1.jpg",
+        "kind": "image",
+    }
+    assert items[2]["name"] == "Rack"
+
+
+def test_normalize_media_list_adds_srcset_and_document_title():
+    images = normalize_media_list(
+        json.dumps([
+            {
+                "url": "/static/cas/ab/cd/abcd.jpg",
+                "variants": {
+                    "thumb": "/static/cas/ab/cd/abcd.thumb.webp",
+                    "medium": "/static/cas/ab/cd/abcd.medium.webp",
+                },
+            }
+        ]),
+        "images",
+    )
+    documents = normalize_media_list(["cas/ef/gh/efgh.pdf"], "documents")
+
+    assert images[0]["srcset"] == (
+        "/static/cas/ab/cd/abcd.thumb.webp 320w, /static/cas/ab/cd/abcd.medium.webp 1024w"
+    )
+    assert documents == [
+        {"url": "/static/cas/ef/gh/efgh.pdf", "name": "efgh.pdf", "kind": "document", "title": ""}
+    ]
+
+
+def test_location_and_logo_shapes():
+    assert normalize_location('{"url": "/static/maps/1.png"}')["url"] == "/static/maps/1.png"
+    assert normalize_location(None) is None
+    assert normalize_logo("https://old-host.replit.dev/static/logos/sabinas.png") == "logos/sabinas.png"
+
+    values = media_bind_values({"images": None, "location": "", "logo": "logos/sabinas.png"})
+    assert values == {"images": "[]", "location": None, "logo": "logos/sabinas.png"}
+
+
+def test_canonical_media_passes_migrated_rows_through():
+    stored = [{"url": "/static/a.jpg", "name": "a.jpg", "kind": "image"}]
+    migrated = {"images": stored, "documents": None, "logo": "logos/a.png", "media_version": MEDIA_VERSION}
+    legacy = {"images": ["a.jpg"], "documents": None, "logo": "logos/a.png", "media_version": 0}
+
+    assert canonical_media(migrated) == {"images": stored, "documents": [], "logo": "logos/a.png"}
+    assert canonical_media(migrated)["images"] is stored
+    assert canonical_media(legacy)["images"] == stored
+
+
+def test_migrate_media_fields_locks_each_batch(monkeypatch):
+    events = []
+    batches = [[{"id": 7, "images": ["a.jpg"], "documents": None, "diagrams": None,
+                 "dfo": None, "location": None, "logo": None}], []]
+
+    @asynccontextmanager
+    async def fake_transaction():
+        events.append("begin")
+        yield
+        events.append("commit")
+
+    async def fake_fetch_all(query, values=None):
+        assert "FOR UPDATE" in query
+        events.append("select")
+        return batches.pop(0)
+
+    async def fake_execute_many(query, values):
+        assert "media_version < :media_version" in query
+        events.append(("update", [value["id"] for value in values]))
+
+    monkeypatch.setattr("app.db.media.database.transaction", fake_transaction)
+    monkeypatch.setattr("app.db.media.database.fetch_all", fake_fetch_all)
+    monkeypatch.setattr("app.db.media.database.execute_many", fake_execute_many)
+
+    assert asyncio.run(migrate_media_fields(batch_size=1)) == 1
+    assert events == ["begin", "select", ("update", [7]), "commit", "begin", "select", "commit"]
@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+from app.db import ports
+
+
+def test_split_and_join_round_trip():
+    row = {"tray": "T-01", "panel": "PP-A1", "port": 1, "status": "OK", "destino": "Core"}
+
+    values = ports.split_row(3, row)
+    assert values["position"] == 3
+    assert values["port"] == "1"
+    assert json.loads(values["extra"]) == {"port": 1, "destino": "Core"}
+
+    rebuilt = ports.join_row(values, {"port": "number"})
+    assert rebuilt == row
+
+
+def test_round_trip_keeps_json_types_under_text_and_untyped_columns():
+    rows = [
+        {"tray": 7, "panel": True, "port": 3, "status": None},
+        {"tray": None, "panel": None, "port": 2.5, "status": False},
+        {"tray": "T-1", "port": "3", "status": "OK", "notes": None},
+    ]
+    for column_types in ({}, {key: "text" for key in ports.PORT_FIELDS}):
+        for row in rows:
+            # extra comes back from JSONB as a dict
+            values = ports.split_row(0, row)
+            record = {**values, "extra": json.loads(values["extra"])}
+            assert ports.join_row(record, column_types) == row
+
+
+def test_update_port_moves_typed_values_into_extra(monkeypatch):
+    captured = {}
+
+    async def fake_fetch_one(query, values=None):
+        captured.update(query=query, values=values)
+        return {"id": 1}
+
+    monkeypatch.setattr("app.db.ports.database.fetch_one", fake_fetch_one)
+
+    assert asyncio.run(ports.update_port(5, 0, {"port": 4, "status": "OK"}))
+    assert captured["values"]["port"] == "4"
+    assert captured["values"]["dropped"] == ["status"]
+    assert json.loads(captured["values"]["extra"]) == {"port": 4}
+
+
+def test_load_table_prefers_ports_and_keeps_legacy_rows(monkeypatch):
+    columns = [{"key": "port", "label": "Puerto", "type": "number"}]
+
+    async def fake_fetch_all(query, values=None):
+        assert values == {"idf_id": 5}
+        return [{"position": 0, "tray": None, "panel": "PP-1", "port": "24", "status": "Libre", "extra": "{}"}]
+
+    monkeypatch.setattr("app.db.ports.database.fetch_all", fake_fetch_all)
+
+    migrated = asyncio.run(ports.load_table({"id": 5, "table_data": json.dumps({"columns": columns})}))
+    assert migrated["rows"] == [{"panel": "PP-1", "port": 24, "status": "Libre"}]
+
+    legacy = {"columns": columns, "rows": [{"port": 1}]}
+    assert asyncio.run(ports.load_table({"id": 6, "table_data": legacy})) == legacy
+    assert asyncio.run(ports.load_table({"id": 7, "table_data": None})) is None
+    assert ports.table_definition(legacy) == json.dumps({"columns": columns})
@@ -0,0 +1,576 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException, Response
+from starlette.requests import Request
+
+from app.core.pagination import encode_cursor
+from app.core.response_cache import MemoryBackend, invalidate_responses, response_cache
+from app.routers.public_idfs import get_idf, list_idfs
+
+UPDATED_AT = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+
+
+def _request(headers=None, query=""):
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "scheme": "http",
+        "server": ("testserver", 80),
+        "query_string": query.encode(),
+    }
+    return Request(scope)
+
+
+@pytest.fixture(autouse=True)
+def fresh_response_cache(monkeypatch):
+    monkeypatch.setattr(response_cache, "backend", MemoryBackend(maxsize=64, ttl=60))
+
+
+def test_list_idfs_uses_projection(monkeypatch):
+    captured = {}
+
+    async def fake_fetch_all(query, values=None):
+        captured["query"] = query
+        return [
+            {
+                "cluster": "Trinity",
+                "project": "Sabinas Project",
+                "code": "IDF-1001",
+                "title": "Main",
+                "site": "HQ",
+                "room": "Rack A",
+                "logo": "Trinity/sabinas/IDF-1001/logo/logo.png",
+                "health_level": "yellow",
+                "health_ok": 3,
+                "health_revision": 1,
+                "health_falla": 0,
+                "health_libre": 2,
+                "health_reservado": 0,
+                "has_content": True,
+            }
+        ]
+
+    async def fake_fetch_one(query, values=None):
+        return {"total": 1, "last_modified": UPDATED_AT}
+
+    monkeypatch.setattr("app.routers.public_idfs.database.fetch_all", fake_fetch_all)
+    monkeypatch.setattr("app.routers.public_idfs.database.fetch_one", fake_fetch_one)
+
+    reply = asyncio.run(
+        list_idfs(
+            _request(),
+            cluster="Trinity",
+            project="sabinas",
+            q=None,
+            limit=50,
+            skip=0,
+            cursor=None,
+            order="title",
+            include_health=1,
+            fields=None,
+            _current_user={"id": 1},
+        )
+    )
+
+    assert "SELECT *" not in captured["query"]
+    assert "table_data," not in captured["query"]
+    result = json.loads(reply.body)
+    assert result[0]["hasContent"] is True
+    assert result[0]["logo"] == "/static/Trinity/sabinas/IDF-1001/logo/logo.png"
+    assert result[0]["health"]["level"] == "yellow"
+    assert result[0]["health"]["counts"]["libre"] == 2
+
+
+def test_list_idfs_keyset_cursor(monkeypatch):
+    captured = {}
+
+    def make_row(code):
+        return {
+            "cluster": "Trinity",
+            "project": "Sabinas Project",
+            "code": code,
+            "title": "Same title",
+            "site": None,
+            "room": None,
+            "logo": None,
+            "health_level": None,
+            "has_content": False,
+        }
+
+    async def fake_fetch_all(query, values=None):
+        captured["query"] = query
+        captured["values"] = values
+        return [make_row("IDF-1"), make_row("IDF-2")]
+
+    async def fake_fetch_one(query, values=None):
+        captured["summary"] = query
+        if "page_ids" in query:
+            return {"page_ids": captured.get("page_ids", "3,4"), "last_modified": UPDATED_AT}
+        return {"total": 7, "last_modified": UPDATED_AT}
+
+    monkeypatch.setattr("app.routers.public_idfs.database.fetch_all", fake_fetch_all)
+    monkeypatch.setattr("app.routers.public_idfs.database.fetch_one", fake_fetch_one)
+
+    def call(cursor, headers=None):
+        return asyncio.run(
+            list_idfs(
+                _request(headers, query=f"cursor={cursor}" if cursor else ""),
+                cluster="Trinity",
+                project="sabinas",
+                q=None,
+                limit=2,
+                skip=0,
+                cursor=cursor,
+                order="title",
+                include_health=0,
+                fields=None,
+                _current_user={"id": 1},
+            )
+        )
+
+    first = call(None)
+    assert first.headers["X-Total-Count"] == "7"
+    next_cursor = first.headers["X-Next-Cursor"]
+
+    second = call(next_cursor)
+    assert "COUNT(*)" not in captured["summary"]
+    assert "X-Total-Count" not in second.headers
+    assert "(title, code) > (:after_title, :after_code)" in captured["query"]
+    assert "OFFSET" not in captured["query"]
+    assert captured["values"]["after_title"] == "Same title"
+    assert captured["values"]["after_code"] == "IDF-2"
+
+    # Deleting a row of the page changes the ETag, although MAX(updated_at) did not
+    response_cache.backend = MemoryBackend(maxsize=64, ttl=60)
+    assert call(next_cursor, {"If-None-Match": second.headers["ETag"]}).status_code == 304
+    captured["page_ids"] = "4,5"
+    response_cache.backend = MemoryBackend(maxsize=64, ttl=60)
+    assert call(next_cursor, {"If-None-Match": second.headers["ETag"]}).status_code == 200
+
+    for bad_cursor in ("not-a-cursor", encode_cursor([1, {}])):
+        with pytest.raises(HTTPException) as exc_info:
+            call(bad_cursor)
+        assert exc_info.value.status_code == 400
+
+
+def test_list_idfs_revalidates_with_etag(monkeypatch):
+    calls = []
+
+    async def fake_fetch_all(query, values=None):
+        calls.append(query)
+        return []
+
+    async def fake_fetch_one(query, values=None):
+        assert "MAX(updated_at)" in query
+        return {"total": 3, "last_modified": UPDATED_AT}
+
+    monkeypatch.setattr("app.routers.public_idfs.database.fetch_all", fake_fetch_all)
+    monkeypatch.setattr("app.routers.public_idfs.database.fetch_one", fake_fetch_one)
+
+    def call(headers=None, query="limit=50"):
+        return asyncio.run(
+            list_idfs(
+                _request(headers, query),
+                cluster="Trinity",
+                project="sabinas",
+                q=None,
+                limit=50,
+                skip=0,
+                cursor=None,
+                order="title",
+                include_health=0,
+                fields=None,
+                _current_user={"id": 1},
+            )
+        )
+
+    response = call()
+    etag = response.headers["ETag"]
+    assert response.headers["Last-Modified"] == "Wed, 01 May 2024 12:30:00 GMT"
+    assert len(calls) == 1
+
+    result = call({"If-None-Match": etag})
+    assert result.status_code == 304
+    assert result.headers["X-Total-Count"] == "3"
+    assert len(calls) == 1
+
+    result = call({"If-None-Match": etag}, query="limit=50&q=core")
+    assert result.status_code == 200
+    assert len(calls) == 2
+
+
+def test_get_idf_not_modified_skips_full_fetch(monkeypatch):
+    queries = []
+
+    async def fake_fetch_one(query, values=None):
+        queries.append(query)
+        return {"id": 4, "updated_at": UPDATED_AT}
+
+    monkeypatch.setattr("app.routers.public_idfs.database.fetch_one", fake_fetch_one)
+
+    def call(headers):
+        return asyncio.run(
+            get_idf(
+                _request(headers),
+                "IDF-1",
+                cluster="Trinity",
+                project="sabinas",
+                fields=None,
+                _current_user={"id": 1},
+            )
+        )
+
+    result = call({"If-Modified-Since": "Wed, 01 May 2024 12:30:00 GMT"})
+    assert result.status_code == 304
+    etag = result.headers["ETag"]
+    assert len(queries) == 1 and queries[0].startswith("SELECT id, updated_at FROM idfs")
+
+    result = call({"If-None-Match": etag, "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT"})
+    assert result.status_code == 304
+    assert len(queries) == 2
+
+
+def test_list_idf_rows_filters_and_sorts_in_sql(monkeypatch):
+    from app.routers.public_idfs import list_idf_rows
+
+    captured = {}
+    table = {
+        "columns": [
+            {"key": "port", "label": "Puerto", "type": "number"},
+            {"key": "destino", "label": "Destino", "type": "text"},
+        ]
+    }
+
+    async def fake_fetch_one(query, values=None):
+        return {"id": 4, "table_data": table}
+
+    async def fake_fetch_val(query, values=None):
+        captured["count"] = (query, values)
+        return 12
+
+    async def fake_fetch_all(query, values=None):
+        captured["page"] = (query, values)
+        return [{"position": 5, "tray": None, "panel": "PP-1", "port": "10", "status": "Falla",
+                 "extra": '{"destino": "Core"}'}]
+
+    monkeypatch.setattr("app.routers.public_idfs.database.fetch_one", fake_fetch_one)
+    monkeypatch.setattr("app.routers.public_idfs.database.fetch_val", fake_fetch_val)
+    monkeypatch.setattr("app.routers.public_idfs.database.fetch_all", fake_fetch_all)
+
+    response = Response()
+    page = asyncio.run(list_idf_rows(
+        response, "IDF-1", cluster="Trinity", project="sabinas", status="Falla, revision",
+        q="core", sort="destino", direction="desc", limit=1, skip=2, cursor=None, _current_user={},
+    ))
+
+    count_query, count_values = captured["count"]
+    assert "lower(status) = ANY(:statuses)" in count_query
+    assert count_values["statuses"] == ["falla", "revision"]
+    # q matches cell values, not the JSON keys of extra
+    assert "jsonb_path_query_array(extra, 'strict $.*')" in count_query
+    assert "extra::text" not in count_query
+    page_query, page_values = captured["page"]
+    assert "ORDER BY (extra->>:sort_key) DESC NULLS LAST, position" in page_query
+    assert page_values["sort_key"] == "destino" and page_values["skip"] == 2
+    assert "X-Next-Cursor" not in response.headers
+    assert response.headers["X-Total-Count"] == "12"
+    assert page.rows[0].row == 5
+    assert page.rows[0].values == {"destino": "Core", "panel": "PP-1", "port": 10, "status": "Falla"}
+
+    with pytest.raises(HTTPException):
+        asyncio.run(list_idf_rows(
+            Response(), "IDF-1", cluster="Trinity", project="sabinas", status=None, q=None,
+            sort="unknown", direction="asc", limit=1, skip=0, cursor=None, _current_user={},
+        ))
+
+
+def test_list_idf_rows_never_migrates_on_read(monkeypatch):
+    from app.routers.public_idfs import list_idf_rows
+
+    async def fake_fetch_one(query, values=None):
+        return {"id": 4, "table_data": {"columns": [], "rows": [{"port": 1}]}}
+
+    async def fail_write(*args, **kwargs):
+        raise AssertionError("GET must not write")
+
+    monkeypatch.setattr("app.routers.public_idfs.database.fetch_one", fake_fetch_one)
+    monkeypatch.setattr("app.routers.public_idfs.database.execute", fail_write)
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(list_idf_rows(
+            Response(), "IDF-1", cluster="Trinity", project="sabinas", status=None, q=None,
+            sort=None, direction="asc", limit=1, skip=0, cursor=None, _current_user={},
+        ))
+    assert exc_info.value.status_code == 409
+
+
+def test_search_ports_across_idfs(monkeypatch):
+    from app.routers.public_idfs import search_ports
+
+    captured = {}
+
+    async def fake_fetch_val(query, values=None):
+        return 3
+
+    async def fake_fetch_all(query, values=None):
+        captured["page"] = (query, values)
+        port = {"tray": "T-1", "panel": "PP-A", "extra": "{}", "status": "Falla"}
+        return [
+            {**port, "code": "IDF-1", "title": "North", "position": 4, "port": "7",
+             "columns": '[{"key": "port", "type": "number"}]'},
+            {**port, "code": "IDF-2", "title": None, "position": 0, "port": "x", "columns": None},
+        ]
+
+    monkeypatch.setattr("app.routers.public_idfs.database.fetch_val", fake_fetch_val)
+    monkeypatch.setattr("app.routers.public_idfs.database.fetch_all", fake_fetch_all)
+
+    response = Response()
+    matches = asyncio.run(search_ports(
+        response, cluster="Trinity", project="sabinas", status="falla", panel="PP-A",
+        tray=None, q=None, limit=2, cursor=None, _current_user={},
+    ))
+
+    query, values = captured["page"]
+    assert "lower(p.status) = ANY(:statuses)" in query and "p.panel = :panel" in query
+    assert values["project"] == "Sabinas Project"
+    assert [(m.code, m.row, m.values["port"]) for m in matches] == [("IDF-1", 4, 7), ("IDF-2", 0, "x")]
+    assert response.headers["X-Total-Count"] == "3"
+
+    async def fail_count(query, values=None):
+        raise AssertionError("cursor pages must not count")
+
+    monkeypatch.setattr("app.routers.public_idfs.database.fetch_val", fail_count)
+    next_page = Response()
+    asyncio.run(search_ports(
+        next_page, cluster="Trinity", project="sabinas", status=None, panel=None,
+        tray=None, q=None, limit=2, cursor=response.headers["X-Next-Cursor"], _current_user={},
+    ))
+    assert "X-Total-Count" not in next_page.headers
+    query, values = captured["page"]
+    assert "(i.code, p.position) > (:after_code, :after_position)" in query
+    assert (values["after_code"], values["after_position"]) == ("IDF-2", 0)
+
+    for bad_cursor in (encode_cursor(["IDF-2", "0"]), encode_cursor([1, 0]), encode_cursor(["IDF-2", True])):
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(search_ports(
+                Response(), cluster="Trinity", project="sabinas", status=None, panel=None,
+                tray=None, q=None, limit=2, cursor=bad_cursor, _current_user={},
+            ))
+        assert exc_info.value.status_code == 400
+
+
+def test_get_idf_served_from_response_cache_until_invalidated(monkeypatch):
+    queries = []
+    row = {
+        "id": 4,
+        "updated_at": UPDATED_AT,
+        "cluster": "Trinity",
+        "project": "Sabinas Project",
+        "code": "IDF-1",
+        "title": "Main",
+        "description": None,
+        "site": "HQ",
+        "room": None,
+        "images": None,
+        "documents": None,
+        "diagrams": None,
+        "location": None,
+        "dfo": None,
+        "logo": None,
+        "table_data": None,
+        "health_level": None,
+    }
+
+    async def fake_fetch_one(query, values=None):
+        queries.append(query)
+        return row
+
+    monkeypatch.setattr("app.routers.public_idfs.database.fetch_one", fake_fetch_one)
+
+    def call(headers=None):
+        return asyncio.run(
+            get_idf(_request(headers), "IDF-1", cluster="Trinity", project="sabinas", fields=None, _current_user={"id": 1})
+        )
+
+    first = call()
+    assert json.loads(first.body)["title"] == "Main"
+    assert len(queries) == 2
+
+    cached = call()
+    assert cached.body == first.body
+    assert cached.headers["ETag"] == first.headers["ETag"]
+    assert call({"If-None-Match": first.headers["ETag"]}).status_code == 304
+    assert len(queries) == 2
+
+    row["title"] = "Renamed"
+    asyncio.run(invalidate_responses("Trinity", "Sabinas Project"))
+    assert json.loads(call().body)["title"] == "Renamed"
+    assert len(queries) == 4
+
+
+def test_get_idf_sparse_fields_narrow_projection(monkeypatch):
+    queries = []
+
+    async def fake_fetch_one(query, values=None):
+        queries.append(query)
+        return {
+            "id": 4,
+            "updated_at": UPDATED_AT,
+            "cluster": "Trinity",
+            "project": "Sabinas Project",
+            "code": "IDF-1",
+            "title": "Main",
+            "logo": "Trinity/sabinas/logo.png",
+            "media_version": 1,
+        }
+
+    async def fail_load_table(row):
+        raise AssertionError("table requested without fields=table")
+
+    monkeypatch.setattr("app.routers.public_idfs.database.fetch_one", fake_fetch_one)
+    monkeypatch.setattr("app.routers.public_idfs.load_table", fail_load_table)
+
+    reply = asyncio.run(
+        get_idf(
+            _request(query="fields=title,logo"),
+            "IDF-1",
+            cluster="Trinity",
+            project="sabinas",
+            fields="title,logo",
+            _current_user={"id": 1},
+        )
+    )
+
+    projection = queries[-1].split(" FROM ")[0]
+    assert projection == "SELECT id, updated_at, cluster, project, code, title, logo, media_version"
+    assert json.loads(reply.body) == {
+        "cluster": "Trinity",
+        "project": "Sabinas Project",
+        "code": "IDF-1",
+        "title": "Main",
+        "logo": "/static/Trinity/sabinas/logo.png",
+    }
+
+
+def test_list_idfs_sparse_fields_skip_content_and_health(monkeypatch):
+    captured = {}
+
+    async def fake_fetch_all(query, values=None):
+        captured["query"] = query
+        return [{"cluster": "Trinity", "project": "Sabinas Project", "code": "IDF-1", "title": "Main"}]
+
+    async def fake_fetch_one(query, values=None):
+        return {"total": 1, "last_modified": UPDATED_AT}
+
+    monkeypatch.setattr("app.routers.public_idfs.database.fetch_all", fake_fetch_all)
+    monkeypatch.setattr("app.routers.public_idfs.database.fetch_one", fake_fetch_one)
+
+    reply = asyncio.run(
+        list_idfs(
+            _request(query="fields=title"),
+            cluster="Trinity",
+            project="sabinas",
+            q=None,
+            limit=50,
+            skip=0,
+            cursor=None,
+            order="title",
+            include_health=1,
+            fields="title",
+            _current_user={"id": 1},
+        )
+    )
+
+    assert "has_content" not in captured["query"]
+    assert "health_level" not in captured["query"]
+    assert json.loads(reply.body) == [
+        {"cluster": "Trinity", "project": "Sabinas Project", "code": "IDF-1", "title": "Main"}
+    ]
+
+
+def test_unknown_fields_are_rejected():
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(
+            get_idf(
+                _request(query="fields=title,secret"),
+                "IDF-1",
+                cluster="Trinity",
+                project="sabinas",
+                fields="title,secret",
+                _current_user={"id": 1},
+            )
+        )
+    assert exc_info.value.status_code == 400
+    assert "secret" in exc_info.value.detail
+
+
+def test_get_idf_rendered_during_invalidation_is_not_served(monkeypatch):
+    row = {
+        "id": 4,
+        "updated_at": UPDATED_AT,
+        "cluster": "Trinity",
+        "project": "Sabinas Project",
+        "code": "IDF-1",
+        "title": "Old",
+        "table_data": None,
+        "health_level": None,
+    }
+
+    async def fake_fetch_one(query, values=None):
+        snapshot = dict(row)
+        if query.startswith("SELECT *"):
+            # A writer commits and invalidates after this reader missed
+            row["title"] = "New"
+            await invalidate_responses("Trinity", "Sabinas Project")
+        return snapshot
+
+    monkeypatch.setattr("app.routers.public_idfs.database.fetch_one", fake_fetch_one)
+
+    def call():
+        reply = asyncio.run(
+            get_idf(_request(), "IDF-1", cluster="Trinity", project="sabinas", fields=None, _current_user={"id": 1})
+        )
+        return json.loads(reply.body)["title"]
+
+    assert call() == "Old"
+    assert call() == "New"
+
+
+def test_get_idf_etag_depends_on_fields(monkeypatch):
+    async def fake_fetch_one(query, values=None):
+        return {
+            "id": 4,
+            "updated_at": UPDATED_AT,
+            "cluster": "Trinity",
+            "project": "Sabinas Project",
+            "code": "IDF-1",
+            "title": "Main",
+            "health_level": "green",
+        }
+
+    monkeypatch.setattr("app.routers.public_idfs.database.fetch_one", fake_fetch_one)
+
+    def etag(fields, headers=None):
+        reply = asyncio.run(
+            get_idf(
+                _request(headers, query=f"fields={fields}" if fields else ""),
+                "IDF-1",
+                cluster="Trinity",
+                project="sabinas",
+                fields=fields,
+                _current_user={"id": 1},
+            )
+        )
+        return reply.status_code, reply.headers["ETag"]
+
+    status, sparse = etag("title")
+    assert status == 200
+    # A validator of ?fields=title must not validate the full body
+    status, full = etag(None, {"If-None-Match": sparse})
+    assert status == 200 and full != sparse
+    assert etag("title", {"If-None-Match": sparse})[0] == 304
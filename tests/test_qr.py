@@ -0,0 +1,134 @@
+import asyncio
+import os
+
+from starlette.requests import Request
+
+from app.core.workers import shutdown_process_pool
+from app.routers import qr
+
+
+def _request(headers=None):
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "scheme": "http",
+        "server": ("testserver", 80),
+        "query_string": b"",
+    }
+    return Request(scope)
+
+
+def test_qr_png_is_cached_and_revalidated(monkeypatch, tmp_path):
+    monkeypatch.setattr(qr, "QR_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(qr.settings, "PUBLIC_BASE_URL", "https://qartha.example.com/")
+    qr.qr_cache.clear()
+    renders = []
+
+    async def fake_run_in_process(func, *args):
+        renders.append(args)
+        return func(*args)
+
+    async def fake_fetch_one(query, values=None):
+        return {"?column?": 1}
+
+    monkeypatch.setattr(qr, "run_in_process", fake_run_in_process)
+    monkeypatch.setattr("app.routers.qr.database.fetch_one", fake_fetch_one)
+
+    def call(headers=None):
+        return asyncio.run(
+            qr.get_idf_qr_png("Trinity", "Sabinas Project", "IDF-1", _request(headers), 10, 4, {})
+        )
+
+    first = call()
+    assert first.status_code == 200
+    assert first.body.startswith(b"\x89PNG")
+    assert first.headers["cache-control"].startswith("private, max-age=")
+    assert "immutable" not in first.headers["cache-control"]
+    assert len(list(tmp_path.iterdir())) == 1
+
+    second = call()
+    assert second.body == first.body
+    assert len(renders) == 1
+
+    revalidated = call({"If-None-Match": first.headers["etag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.body == b""
+
+
+def test_qr_host_derived_urls_are_not_written_to_disk(monkeypatch, tmp_path):
+    monkeypatch.setattr(qr, "QR_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(qr.settings, "PUBLIC_BASE_URL", None)
+    qr.qr_cache.clear()
+
+    async def fake_run_in_process(func, *args):
+        return b"qr:" + args[0].encode()
+
+    async def fake_fetch_one(query, values=None):
+        return {"?column?": 1}
+
+    monkeypatch.setattr(qr, "run_in_process", fake_run_in_process)
+    monkeypatch.setattr("app.routers.qr.database.fetch_one", fake_fetch_one)
+
+    reply = asyncio.run(
+        qr.get_idf_qr_png("Trinity", "Sabinas Project", "IDF-1", _request({"Host": "evil.test"}), 10, 4, {})
+    )
+
+    assert reply.body == b"qr:http://evil.test/Trinity/sabinas/idf/IDF-1"
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_qr_cache_dir_is_pruned_to_max_files(monkeypatch, tmp_path):
+    monkeypatch.setattr(qr.settings, "QR_CACHE_MAX_FILES", 2)
+    for index in range(4):
+        path = tmp_path / f"{index}.png"
+        path.write_bytes(b"x")
+        os.utime(path, (index, index))
+
+    qr._write_cached_file(tmp_path / "new.png", b"qr")
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["3.png", "new.png"]
+
+
+def test_qr_svg_variant(monkeypatch, tmp_path):
+    monkeypatch.setattr(qr, "QR_CACHE_DIR", tmp_path)
+    qr.qr_cache.clear()
+    try:
+        content = asyncio.run(qr.get_rendered_qr("https://example.com/Trinity/sabinas/idf/IDF-1", "svg"))
+    finally:
+        shutdown_process_pool()
+    assert content.startswith(b"<svg")
+
+
+def test_label_zip_and_sheet(monkeypatch, tmp_path):
+    import io
+    import zipfile
+
+    monkeypatch.setattr(qr, "QR_CACHE_DIR", tmp_path)
+    qr.qr_cache.clear()
+    queries = []
+
+    async def fake_run_in_process(func, *args):
+        return func(*args)
+
+    async def fake_fetch_all(query, values=None):
+        queries.append((query, values))
+        return [{"code": "IDF-1"}, {"code": "IDF-2"}, {"code": "IDF-3"}]
+
+    monkeypatch.setattr(qr, "run_in_process", fake_run_in_process)
+    monkeypatch.setattr("app.routers.qr.database.fetch_all", fake_fetch_all)
+
+    async def collect_zip():
+        response = await qr.get_qr_labels_zip(_request(), "Trinity", "sabinas", "IDF-1,IDF-2,IDF-3", "png", {})
+        return b"".join([chunk async for chunk in response.body_iterator])
+
+    archive = zipfile.ZipFile(io.BytesIO(asyncio.run(collect_zip())))
+    assert archive.namelist() == ["IDF-1.png", "IDF-2.png", "IDF-3.png"]
+    assert archive.read("IDF-2.png").startswith(b"\x89PNG")
+    assert queries[0][1]["project"] == "Sabinas Project"
+    assert queries[0][1]["codes"] == ["IDF-1", "IDF-2", "IDF-3"]
+
+    sheet = asyncio.run(qr.get_qr_labels_png(_request(), "Trinity", "sabinas", None, 2, 1, 2, {}))
+    assert sheet.headers["x-total-pages"] == "2"
+    assert sheet.body.startswith(b"\x89PNG")
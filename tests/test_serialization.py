@@ -0,0 +1,52 @@
+import json
+from datetime import datetime
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+
+from app.core import serialization
+from app.core.media import normalize_media_fields
+from app.models.idf_models import IdfPublic
+
+ROW = {
+    "cluster": "Trinity",
+    "project": "Sabinas Project",
+    "code": "IDF-1",
+    "title": "Main IDF",
+    "description": None,
+    "site": "Plant",
+    "room": None,
+    "images": [
+        "Trinity/sabinas/IDF-1/images/1.jpg",
+        {"url": "/static/cas/ab/cd/abcd.jpg", "variants": {"thumb": "/static/cas/ab/cd/abcd.thumb.webp"}},
+    ],
+    "documents": ["cas/ef/gh/efgh.pdf"],
+    "diagrams": [],
+    "location": "maps/1.png",
+    "dfo": None,
+    "logo": None,
+}
+TABLE = {
+    "columns": [{"key": "port", "label": "Port", "type": "number"}],
+    "rows": [{"port": 1, "status": "ok", "checked": datetime(2024, 1, 2, 3, 4, 5)}],
+}
+HEALTH = {"level": "green", "counts": {"ok": 1, "revision": 0, "falla": 0, "libre": 0, "reservado": 0}}
+
+
+def test_idf_public_payload_matches_model_output():
+    media = normalize_media_fields(ROW)
+    payload = serialization.idf_public_payload(ROW, media, TABLE, HEALTH)
+    model = IdfPublic(**{**ROW, **media, "table": TABLE, "health": HEALTH})
+
+    assert json.loads(serialization.dumps(payload)) == jsonable_encoder(model)
+
+
+@pytest.mark.skipif(serialization.orjson is None, reason="orjson is not installed")
+def test_orjson_renders_the_same_body(monkeypatch):
+    media = normalize_media_fields(ROW)
+    payload = serialization.idf_public_payload(ROW, media, TABLE, HEALTH)
+    stdlib = serialization.dumps(payload)
+
+    monkeypatch.setattr(serialization.settings, "ORJSON_RESPONSES", True)
+    assert serialization.json_response_class() is serialization.FastJSONResponse
+    assert serialization.dumps(payload) == stdlib
@@ -0,0 +1,129 @@
+import asyncio
+import io
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.core import storage
+
+
+class FakeBlobDatabase:
+    """Just enough of ``databases.Database`` to back the asset_blobs table."""
+
+    def __init__(self):
+        self.ref_counts = {}
+        self.fail_commit = False
+
+    @asynccontextmanager
+    async def transaction(self):
+        snapshot = dict(self.ref_counts)
+        yield
+        if self.fail_commit:
+            self.ref_counts = snapshot
+            raise ConnectionError("commit failed")
+
+    async def execute(self, query, values=None):
+        if "pg_advisory_xact_lock" in query:
+            return None
+        if "INSERT INTO asset_blobs" in query:
+            self.ref_counts[values["path"]] = self.ref_counts.get(values["path"], 0) + 1
+            return None
+        if "DELETE FROM asset_blobs" in query:
+            del self.ref_counts[values["path"]]
+            return None
+        raise AssertionError(f"Unexpected query: {query}")
+
+    async def fetch_one(self, query, values=None):
+        if "SELECT 1 FROM asset_blobs" in query:
+            return {"?column?": 1} if values["path"] in self.ref_counts else None
+        if "ref_count = ref_count - 1" in query:
+            if values["path"] not in self.ref_counts:
+                return None
+            self.ref_counts[values["path"]] -= 1
+            return {"ref_count": self.ref_counts[values["path"]]}
+        raise AssertionError(f"Unexpected query: {query}")
+
+
+def _upload(data: bytes, filename: str = "plan.pdf") -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), filename=filename)
+
+
+@pytest.fixture
+def fake_store(monkeypatch, tmp_path):
+    db = FakeBlobDatabase()
+    monkeypatch.setattr(storage, "database", db)
+    monkeypatch.setattr(storage, "STATIC_ROOT", tmp_path)
+    monkeypatch.setattr(storage.settings, "UPLOAD_CHUNK_SIZE", 4)
+    return db
+
+
+def test_store_upload_deduplicates_content(fake_store, tmp_path):
+    first = asyncio.run(storage.store_upload(_upload(b"0123456789"), ".PDF"))
+    second = asyncio.run(storage.store_upload(_upload(b"0123456789"), ".pdf"))
+
+    assert first == second
+    assert first.startswith("cas/") and first.endswith(".pdf")
+    assert (tmp_path / first).read_bytes() == b"0123456789"
+    assert fake_store.ref_counts[first] == 2
+    assert list((tmp_path / "cas" / ".tmp").iterdir()) == []
+
+
+def test_release_asset_unlinks_on_last_reference(fake_store, tmp_path):
+    path = asyncio.run(storage.store_upload(_upload(b"logo"), ".png"))
+    asyncio.run(storage.store_upload(_upload(b"logo"), ".png"))
+
+    assert asyncio.run(storage.release_asset(path)) is False
+    assert (tmp_path / path).exists()
+
+    assert asyncio.run(storage.release_asset(path)) is True
+    assert not (tmp_path / path).exists()
+    assert path not in fake_store.ref_counts
+
+
+def test_release_asset_keeps_file_when_commit_fails(fake_store, tmp_path):
+    path = asyncio.run(storage.store_upload(_upload(b"logo"), ".png"))
+    fake_store.fail_commit = True
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(storage.release_asset(path))
+
+    assert fake_store.ref_counts[path] == 1
+    assert (tmp_path / path).exists()
+
+
+def test_release_asset_keeps_untracked_and_outside_paths(fake_store, tmp_path):
+    legacy = tmp_path / "Trinity" / "sabinas" / "IDF-1" / "images" / "1.jpg"
+    legacy.parent.mkdir(parents=True)
+    legacy.write_bytes(b"shared")
+    outside = tmp_path.parent / "main.py"
+    outside.write_text("keep")
+    fake_store.ref_counts["../main.py"] = 1
+
+    assert asyncio.run(storage.release_asset("Trinity/sabinas/IDF-1/images/1.jpg")) is False
+    assert legacy.exists()
+    assert asyncio.run(storage.release_asset("../main.py")) is False
+    assert outside.exists()
+    assert fake_store.ref_counts["../main.py"] == 1
+
+
+def test_store_upload_rejects_oversized_files(fake_store, monkeypatch, tmp_path):
+    monkeypatch.setattr(storage.settings, "MAX_UPLOAD_BYTES", 8)
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(storage.store_upload(_upload(b"0123456789"), ".pdf"))
+
+    assert exc_info.value.status_code == 413
+    assert list((tmp_path / "cas" / ".tmp").iterdir()) == []
+    assert fake_store.ref_counts == {}
+
+
+def test_media_paths_handles_legacy_formats():
+    assert storage.media_paths('["a/b.png", {"url": "/static/cas/x.png"}]') == ["a/b.png", "cas/x.png"]
+    assert storage.media_paths('"Trinity/sabinas/IDF-1/location/location.png"') == [
+        "Trinity/sabinas/IDF-1/location/location.png"
+    ]
+    assert storage.media_paths(
+        [{"url": "https://x.replit.dev/{'url': '/static/cas/ab/cd/f.pdf'}"}]
+    ) == ["cas/ab/cd/f.pdf"]
+    assert storage.media_paths(None) == []